@@ -12,7 +12,7 @@ from keras.layers import Input
 from PIL import Image, ImageFont, ImageDraw
 
 from Car_Detection_TF.yolo3.model import yolo_eval, yolo_body, tiny_yolo_body
-from Car_Detection_TF.yolo3.utils import letterbox_image
+from Car_Detection_TF.yolo3.utils import letterbox_array
 import os
 from keras.utils import multi_gpu_model
 
@@ -25,6 +25,7 @@ class YOLO(object):
         "iou": 0.45,
         "model_image_size": (416, 416),
         "gpu_num": 1,
+        "max_batch_size": 8,
     }
 
     @classmethod
@@ -38,9 +39,11 @@ class YOLO(object):
         self.__dict__.update(self._defaults) # set up default values
         self.__dict__.update(kwargs) # and update with user overrides
         self.class_names = self._get_class()
+        self.vehicle_classes = {i for i, name in enumerate(self.class_names) if name in ('car', 'truck', 'bus')}
         self.anchors = self._get_anchors()
         self.sess = K.get_session()
         self.boxes, self.scores, self.classes = self.generate()
+        self.batch_outputs = self.generate_batch()
 
     def _get_class(self):
         classes_path = os.path.expanduser(self.classes_path)
@@ -97,78 +100,142 @@ class YOLO(object):
                 score_threshold=self.score, iou_threshold=self.iou)
         return boxes, scores, classes
 
-    def intersection_over_union(self, boxA, boxB, threshold=0.5):
-        if boxA[0] >= boxB[0] and boxA[1] >= boxB[1] and boxA[2] <= boxB[2] and boxA[3] <= boxB[3]:
-            # print('dfdgh', boxA, boxB)
-            # time.sleep(555)
-            return True
-        if boxB[0] >= boxA[0] and boxB[1] >= boxA[1] and boxB[2] <= boxA[2] and boxB[3] <= boxA[3]:
-            # print('1fdgh', boxA, boxB)
-            # time.sleep(555)
-            return True
-
-
-        xA = max(boxA[1], boxB[1])
-        yA = max(boxA[0], boxB[0])
-        xB = min(boxA[3], boxB[3])
-        yB = min(boxA[2], boxB[2])
-
-        print(xA, xB, yA, yB)
-        # print(abs(xB-xA))
-        # compute the area of intersection rectangle
-        interArea = max(xB - xA, 0) * max((yB - yA), 0)
-        # interArea = abs(max((xA - xB, 0)) * max((yA - yB), 0))
-        if interArea == 0:
-            return False
-        # compute the area of both the prediction and ground-truth
-        # rectangles
-        boxAArea = (boxA[3] - boxA[1]) * (boxA[2] - boxA[0])
-        boxBArea = (boxB[3] - boxB[1]) * (boxB[2] - boxB[0])
-
-        # compute the intersection over union by taking the intersection
-        # area and dividing it by the sum of prediction + ground-truth
-        # areas - the interesection area
-        iou = interArea / float(boxAArea + boxBArea - interArea)
-        print('****************************', iou)
-        if iou >= threshold:
-            return True
-        # return the intersection over union value
-        return False
-
-    def filterBoxes(self, t, c, out_boxes, out_classes, out_scores, same=False):
-        index = []
-        # print('-----------------------', t, c)
-        for i, Truck in enumerate(t):
-            for j, Car in enumerate(c):
-                if same and i == j:
-                    continue
-                if self.intersection_over_union(Truck[0], Car[0]):
-                    if Truck[1] > Car[1]:
-                        index.append(Car[2])
-
-                    else:
-                        index.append(Truck[2])
-                    break
-
-        out_classes = np.delete(out_classes, index, 0)
-        out_boxes = np.delete(out_boxes, index, 0)
-        out_scores = np.delete(out_scores, index, 0)
-        return out_boxes, out_classes, out_scores
+    def generate_batch(self):
+        """Build one filtered-boxes output per image of a batch, so a single run serves several cameras"""
+        self.batch_image_shape = K.placeholder(shape=(self.max_batch_size, 2))
+        outputs = []
+        for b in range(self.max_batch_size):
+            image_outputs = [output[b:b + 1] for output in self.yolo_model.output]
+            outputs.append(yolo_eval(image_outputs, self.anchors,
+                    len(self.class_names), self.batch_image_shape[b],
+                    score_threshold=self.score, iou_threshold=self.iou))
+        return outputs
+
+    def overlapMatrix(self, out_boxes, threshold=0.5):
+        """
+        Pairwise overlap of [top, left, bottom, right] boxes, computed at once
+
+        Two boxes overlap when one contains the other or when their
+        intersection over union reaches the threshold.
+        """
+        top, left, bottom, right = np.asarray(out_boxes, dtype='float64').reshape(-1, 4).T
+
+        inside = ((top[:, None] >= top[None, :]) & (left[:, None] >= left[None, :]) &
+                  (bottom[:, None] <= bottom[None, :]) & (right[:, None] <= right[None, :]))
+
+        inter_width = np.minimum(right[:, None], right[None, :]) - np.maximum(left[:, None], left[None, :])
+        inter_height = np.minimum(bottom[:, None], bottom[None, :]) - np.maximum(top[:, None], top[None, :])
+        inter_area = np.maximum(inter_width, 0) * np.maximum(inter_height, 0)
+        area = (right - left) * (bottom - top)
+        union = area[:, None] + area[None, :] - inter_area
+        with np.errstate(divide='ignore', invalid='ignore'):
+            iou = np.where(inter_area > 0, inter_area / union, 0)
+
+        return inside | inside.T | ((inter_area > 0) & (iou >= threshold))
+
+    def filterVehicles(self, out_boxes, out_classes, out_scores):
+        """
+        Drop boxes covering most of the frame and overlapping car/truck/bus duplicates
+
+        Trucks are checked against cars, trucks against buses, buses against
+        cars and cars against cars. Each box of the first class is resolved
+        against the first box of the second class it overlaps, and the one
+        with the lower score is dropped (the first one on a tie).
+        """
+        out_scores = np.asarray(out_scores)
+        out_classes = np.asarray(out_classes)
+        out_boxes = np.asarray(out_boxes).reshape(-1, 4)
+
+        area = (out_boxes[:, 2] - out_boxes[:, 0]) * (out_boxes[:, 3] - out_boxes[:, 1])
+        removed = area > 0.75*480*360
+        overlap = self.overlapMatrix(out_boxes)
+
+        # detections are resolved from the last one to the first
+        order = np.arange(len(out_classes))[::-1]
+        names = np.array(self.class_names)[out_classes[order]] if len(order) else np.array([])
+        cars = order[names == 'car']
+        trucks = order[names == 'truck']
+        buses = order[names == 'bus']
+
+        for outer, inner, same in ((trucks, cars, False), (trucks, buses, False), (buses, cars, False), (cars, cars, True)):
+            if len(outer) == 0 or len(inner) == 0:
+                continue
+            pairs = overlap[np.ix_(outer, inner)]
+            if same:
+                np.fill_diagonal(pairs, False)
+            matched = pairs.any(axis=1)
+            first = pairs.argmax(axis=1)[matched]
+            outer_matched = outer[matched]
+            inner_matched = inner[first]
+            losers = np.where(out_scores[outer_matched] > out_scores[inner_matched], inner_matched, outer_matched)
+            removed[losers] = True
+
+        keep = ~removed
+        return out_boxes[keep], out_classes[keep], out_scores[keep]
+
+    def vehicleArray(self, out_boxes, out_classes, out_scores):
+        """Detections as a float32 array of [class_id, left, right, top, bottom, score] rows, vehicles only"""
+        rows = []
+        for i, c in reversed(list(enumerate(out_classes))):
+            if c not in self.vehicle_classes:
+                continue
+            top, left, bottom, right = out_boxes[i]
+            rows.append([c, left, right, top, bottom, out_scores[i]])
+        return np.array(rows, dtype='float32').reshape(-1, 6)
+
+    def detect_batch(self, frames):
+        """
+        Detect vehicles in the frames of several cameras with a single run of the model
+
+        Args:
+            frames: List of at most max_batch_size ndarrays, fed to the model as they are like detect_image does
+
+        Returns:
+            List with the detect_array result of every frame
+        """
+        assert len(frames) <= self.max_batch_size, 'Batch larger than max_batch_size'
+        assert self.model_image_size[0]%32 == 0, 'Multiples of 32 required'
+        assert self.model_image_size[1]%32 == 0, 'Multiples of 32 required'
+
+        image_data = np.empty((len(frames),) + tuple(self.model_image_size) + (3,), dtype='float32')
+        image_shapes = np.zeros((self.max_batch_size, 2), dtype='float32')
+        for i, frame in enumerate(frames):
+            image_data[i] = letterbox_array(frame, tuple(reversed(self.model_image_size)))
+            image_shapes[i] = frame.shape[:2]
+        image_data /= 255.
 
-    def detect_image(self, image):
-        start = timer()
+        results = self.sess.run(
+            self.batch_outputs[:len(frames)],
+            feed_dict={
+                self.yolo_model.input: image_data,
+                self.batch_image_shape: image_shapes,
+                K.learning_phase(): 0
+            })
+
+        rets = []
+        for out_boxes, out_scores, out_classes in results:
+            out_boxes, out_classes, out_scores = self.filterVehicles(out_boxes, out_classes, out_scores)
+            rets.append(self.vehicleArray(out_boxes, out_classes, out_scores))
+        return rets
+
+    def detect_array(self, frame):
+        """
+        Inference only: no drawing, no font loading and no printing
 
+        Args:
+            frame: HxWx3 ndarray, fed to the model as it is like detect_image does
+
+        Returns:
+            float32 array with one [class_id, left, right, top, bottom, score] row per vehicle
+        """
         if self.model_image_size != (None, None):
             assert self.model_image_size[0]%32 == 0, 'Multiples of 32 required'
             assert self.model_image_size[1]%32 == 0, 'Multiples of 32 required'
-            boxed_image = letterbox_image(image, tuple(reversed(self.model_image_size)))
+            boxed_size = tuple(reversed(self.model_image_size))
         else:
-            new_image_size = (image.width - (image.width % 32),
-                              image.height - (image.height % 32))
-            boxed_image = letterbox_image(image, new_image_size)
-        image_data = np.array(boxed_image, dtype='float32')
-
-        print(image_data.shape)
+            boxed_size = (frame.shape[1] - (frame.shape[1] % 32),
+                          frame.shape[0] - (frame.shape[0] % 32))
+        image_data = letterbox_array(frame, boxed_size).astype('float32')
         image_data /= 255.
         image_data = np.expand_dims(image_data, 0)  # Add batch dimension.
 
@@ -176,63 +243,32 @@ class YOLO(object):
             [self.boxes, self.scores, self.classes],
             feed_dict={
                 self.yolo_model.input: image_data,
-                self.input_image_shape: [image.size[1], image.size[0]],
+                self.input_image_shape: frame.shape[:2],
                 K.learning_phase(): 0
             })
 
-        print('Found {} boxes for {}'.format(len(out_boxes), 'img'))
-
-        font = ImageFont.truetype(font='Car_Detection_TF/font/FiraMono-Medium.otf',
-                    size=np.floor(3e-2 * image.size[1] + 0.5).astype('int32'))
-        thickness = (image.size[0] + image.size[1]) // 300
-        ret = []
-        cc = []
-        t = []
-        b = []
-        ind = []
-        for i, c in reversed(list(enumerate(out_classes))):
-            if (out_boxes[i][2]-out_boxes[i][0])*(out_boxes[i][3]-out_boxes[i][1]) > 0.75*480*360:
-                ind.append(i)
-
-            if self.class_names[c] == 'car':
-                cc.append([out_boxes[i], out_scores[i], i])
-            elif self.class_names[c] == 'truck':
-                t.append([out_boxes[i], out_scores[i], i])
-            elif self.class_names[c] == 'bus':
-                b.append([out_boxes[i], out_scores[i], i])
-
-        out_classes = np.delete(out_classes, ind, 0)
-        out_boxes = np.delete(out_boxes, ind, 0)
-        out_scores = np.delete(out_scores, ind, 0)
-
-        out_boxes, out_classes, out_scores = self.filterBoxes(t, cc, out_boxes, out_classes, out_scores)
-        out_boxes, out_classes, out_scores = self.filterBoxes(t, b, out_boxes, out_classes, out_scores)
-        out_boxes, out_classes, out_scores =self.filterBoxes(b, cc, out_boxes, out_classes, out_scores)
-        out_boxes, out_classes, out_scores =self.filterBoxes(cc, cc, out_boxes, out_classes, out_scores, same=True)
-        print(out_boxes)
+        out_boxes, out_classes, out_scores = self.filterVehicles(out_boxes, out_classes, out_scores)
+        return self.vehicleArray(out_boxes, out_classes, out_scores)
 
-        for i, c in reversed(list(enumerate(out_classes))):
-            # if i != len(list(out_classes)) - 1 and self.intersection_over_union(out_boxes[i], out_boxes[i+1]):
-            #     continue
+    def detectionRows(self, detections):
+        """Detections as [class, left, right, top, bottom, score] rows with class names, like the boxes files"""
+        return [[self.class_names[int(d[0])], d[1], d[2], d[3], d[4], d[5]] for d in detections]
 
-            predicted_class = self.class_names[c]
-            box = out_boxes[i]
-            score = out_scores[i]
-
-            if predicted_class != 'car'and predicted_class != 'truck' and predicted_class != 'bus':
-                continue
+    def draw_detections(self, image, detections):
+        """Draw detect_array results with their labels onto a PIL image"""
+        font = self.get_font(np.floor(3e-2 * image.size[1] + 0.5).astype('int32'))
+        thickness = (image.size[0] + image.size[1]) // 300
+        draw = ImageDraw.Draw(image)
 
-            label = '{} {:.2f}'.format(predicted_class, score)
-            draw = ImageDraw.Draw(image)
+        for class_id, left, right, top, bottom, score in detections:
+            c = int(class_id)
+            label = '{} {:.2f}'.format(self.class_names[c], score)
             label_size = draw.textsize(label, font)
 
-            top, left, bottom, right = box
-            ret.append([predicted_class, left, right, top, bottom, score])
             top = max(0, np.floor(top + 0.5).astype('int32'))
             left = max(0, np.floor(left + 0.5).astype('int32'))
             bottom = min(image.size[1], np.floor(bottom + 0.5).astype('int32'))
             right = min(image.size[0], np.floor(right + 0.5).astype('int32'))
-            print(label, (left, top), (right, bottom))
 
             if top - label_size[1] >= 0:
                 text_origin = np.array([left, top - label_size[1]])
@@ -248,11 +284,21 @@ class YOLO(object):
                 [tuple(text_origin), tuple(text_origin + label_size)],
                 fill=self.colors[c])
             draw.text(text_origin, label, fill=(0, 0, 0), font=font)
-            del draw
+        del draw
+        return image
 
-        end = timer()
-        print(end - start)
-        return image, ret
+    def get_font(self, size):
+        """Load the label font once per size instead of on every image"""
+        if not hasattr(self, 'fonts'):
+            self.fonts = {}
+        if size not in self.fonts:
+            self.fonts[size] = ImageFont.truetype(font='Car_Detection_TF/font/FiraMono-Medium.otf', size=size)
+        return self.fonts[size]
+
+    def detect_image(self, image):
+        detections = self.detect_array(np.asarray(image))
+        self.draw_detections(image, detections)
+        return image, self.detectionRows(detections)
 
     def close_session(self):
         self.sess.close()
@@ -3,6 +3,7 @@
 from functools import reduce
 
 from PIL import Image
+import cv2
 import numpy as np
 from matplotlib.colors import rgb_to_hsv, hsv_to_rgb
 
@@ -30,6 +31,20 @@ def letterbox_image(image, size):
     new_image.paste(image, ((w-nw)//2, (h-nh)//2))
     return new_image
 
+def letterbox_array(image, size):
+    '''letterbox_image for an HxWx3 ndarray, using cv2 instead of PIL'''
+    ih, iw = image.shape[:2]
+    w, h = size
+    scale = min(w/iw, h/ih)
+    nw = int(iw*scale)
+    nh = int(ih*scale)
+
+    new_image = np.full((h, w, 3), 128, dtype=np.uint8)
+    dx = (w-nw)//2
+    dy = (h-nh)//2
+    cv2.resize(image, (nw,nh), dst=new_image[dy:dy+nh, dx:dx+nw], interpolation=cv2.INTER_CUBIC)
+    return new_image
+
 def rand(a=0, b=1):
     return np.random.rand()*(b-a) + a
 
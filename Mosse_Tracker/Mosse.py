@@ -7,7 +7,7 @@ import cv2
 
 
 class MOSSE:
-    def __init__(self, frame, cut_size,num_of_traning_imgs = 10,learning_rate = 0.225,psrGoodness = 10):
+    def __init__(self, frame, cut_size,num_of_traning_imgs = 10,learning_rate = 0.225,psrGoodness = 10,size_step = 1):
         #get the xmin,ymin, xmax ,ymax for all the corners in the cut_Size
         xmin, ymin, xmax, ymax = cut_size
         xmin -= 0
@@ -25,6 +25,9 @@ class MOSSE:
         #get width and height of the cut_size
         #cv2.getoptimaldftsize faster the tracker according to the opencv document
         self.width, self.height = map(cv2.getOptimalDFTSize, [xmax - xmin, ymax - ymin])
+        #rounding the size up to a multiple of size_step lets trackers of similar cars share a size,
+        #so MosseEngine updates them together
+        self.width, self.height = [-(-size // size_step) * size_step for size in (self.width, self.height)]
         # self.width = xmax - xmin
         # self.height = ymax - ymin
         self.area = self.width * self.height
@@ -0,0 +1,234 @@
+import numpy as np
+import cv2
+
+BLUR_CHANNELS = 128 # most images cv2 takes as channels of one array
+MIN_GROUP_SIZE = 4 # trackers of a size stacked together, fewer are updated one by one
+
+
+def complexView(array):
+    """(..., 2) float32 array in the layout of cv2.dft as a complex64 array sharing its memory"""
+    return array.view(np.complex64)[..., 0]
+
+
+def dft(images, spectra):
+    """Spectra of a (k, height, width) float32 stack, cv2 transforms a small image faster than a batched numpy FFT"""
+    for i in range(len(images)):
+        cv2.dft(images[i], spectra[i], flags=cv2.DFT_COMPLEX_OUTPUT)
+    return complexView(spectra)
+
+
+def idft(spectra):
+    """Real inverses of a (k, height, width, 2) stack of spectra"""
+    images = np.empty(spectra.shape[:3], np.float32)
+    for i in range(len(spectra)):
+        cv2.idft(spectra[i], images[i], flags=cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT)
+    return images
+
+
+class MosseGroup:
+    """
+    Filters of the MOSSE trackers of one size and learning rate, stacked
+
+    H1, H2 and H are (k, height, width, 2) float32 stacks in the layout of
+    cv2.dft, and each tracker's own H1, H2 and H are views into them, so the
+    trackers stay usable on their own.
+    """
+
+    def __init__(self, trackers):
+        self.trackers = trackers
+        self.width, self.height = trackers[0].size
+        self.learning_rate = trackers[0].learning_rate
+        self.win = trackers[0].win
+        self.G = complexView(trackers[0].G)
+        self.H1 = np.stack([tracker.H1 for tracker in trackers]).astype(np.float32, copy=False)
+        self.H2 = np.stack([tracker.H2 for tracker in trackers]).astype(np.float32, copy=False)
+        self.H = np.stack([tracker.H for tracker in trackers]).astype(np.float32, copy=False)
+        for i, tracker in enumerate(trackers):
+            tracker.H1, tracker.H2, tracker.H = self.H1[i], self.H2[i], self.H[i]
+
+        # the whole group is worked on in place, temporaries of its size are slow to allocate
+        self.spectra = np.empty_like(self.H)
+        self.work = np.empty(self.H.shape[:3], np.complex64)
+
+    def isGroupOf(self, trackers):
+        return len(trackers) == len(self.trackers) and all(a is b for a, b in zip(trackers, self.trackers))
+
+    def cutImages(self, frame, trackers):
+        """(height, width, k) stack of the images at the trackers' centers"""
+        images = np.empty((self.height, self.width, len(trackers)), np.uint8)
+        for i, tracker in enumerate(trackers):
+            images[:, :, i] = cv2.getRectSubPix(frame, (self.width, self.height), tracker.center)
+        return images
+
+    def blur(self, images):
+        # cv2 blurs every channel alike, so a call blurs BLUR_CHANNELS images of the stack
+        blurred = np.empty_like(images)
+        for i in range(0, images.shape[2], BLUR_CHANNELS):
+            part = images[:, :, i:i + BLUR_CHANNELS]
+            blurred[:, :, i:i + BLUR_CHANNELS] = cv2.GaussianBlur(part, (3, 3), 3).reshape(part.shape)
+        return blurred
+
+    def preprocess(self, images):
+        """MOSSE.preprocess of a (height, width, k) stack, returned as (k, height, width)"""
+        images = images.transpose(2, 0, 1).astype(np.float32)
+        images += 1.0
+        np.log(images, out=images)
+        images -= images.mean(axis=(1, 2), keepdims=True)
+        images /= images.std(axis=(1, 2), keepdims=True) + 1e-5
+        images *= self.win
+        return images
+
+    def correlate(self, frame):
+        """
+        Correlate the filters with the frame around the trackers' centers
+
+        Returns:
+            dx, dy, psr, the responses and the images of the trackers
+        """
+        images = self.cutImages(frame, self.trackers)
+        F = dft(self.preprocess(self.blur(images)), self.spectra)
+        np.conjugate(complexView(self.H), out=self.work)
+        F *= self.work
+        responses = idft(self.spectra)
+
+        k, h, w = responses.shape
+        flat = responses.reshape(k, -1)
+        peaks = flat.argmax(axis=1)
+        my, mx = np.divmod(peaks, w)
+        max_peak_value = flat[np.arange(k), peaks]
+
+        # the peak's 11x11 neighbourhood is zeroed out of the side lobe
+        y = np.arange(h)[None, :, None]
+        x = np.arange(w)[None, None, :]
+        peak_area = (np.abs(y - my[:, None, None]) <= 5) & (np.abs(x - mx[:, None, None]) <= 5)
+        side_resp = np.where(peak_area, 0, responses)
+        mean = side_resp.mean(axis=(1, 2))
+        standard_deviation = side_resp.std(axis=(1, 2))
+        psr = (max_peak_value - mean) / (standard_deviation + 1e-5)
+
+        return mx - int(w / 2), my - int(h / 2), psr, responses, images
+
+    def train(self, rows, frame):
+        """Blend the images at the rows' new centers into their filters, like MOSSE.updateFilter"""
+        if len(rows) == len(self.trackers):
+            rows = slice(None)  # views of the stacks, updated in place
+        trackers = [self.trackers[i] for i in np.arange(len(self.trackers))[rows]]
+        images = self.cutImages(frame, trackers)
+        F = dft(self.preprocess(images), self.spectra[:len(trackers)])
+        work = self.work[:len(trackers)]
+
+        H1 = complexView(self.H1)[rows]
+        H1 *= 1.0 - self.learning_rate
+        np.conjugate(F, out=work)
+        work *= self.G
+        work *= self.learning_rate
+        H1 += work
+
+        H2 = complexView(self.H2)[rows]
+        H2 *= 1.0 - self.learning_rate
+        np.conjugate(F, out=work)
+        work *= F
+        work *= self.learning_rate
+        H2 += work
+
+        # H2 is real, so the filter is H1 scaled by it, then conjugated
+        H = self.H[rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(H1[..., None].view(np.float32), H2.real[..., None], out=H)
+        H[..., 1] *= -1
+
+        if not isinstance(rows, slice):
+            complexView(self.H1)[rows] = H1
+            complexView(self.H2)[rows] = H2
+            self.H[rows] = H
+        return images
+
+    def update(self, frame):
+        """Update every tracker of the group to the frame, like MOSSE.updateTracking"""
+        dx, dy, psr, responses, images = self.correlate(frame)
+
+        good_rows = []
+        for i, tracker in enumerate(self.trackers):
+            tracker.updated_last_time = True
+            tracker.psr = float(psr[i])
+            tracker.last_resp = responses[i]
+            tracker.last_img = images[:, :, i]
+            tracker.good = tracker.psr > tracker.psr_goodness
+            x, y = tracker.center
+            if not tracker.good:
+                if len(tracker.dx) == 0:
+                    tracker.dx.append(0)
+                    tracker.dy.append(0)
+                else:
+                    tracker.dx.append(tracker.dx[-1])
+                    tracker.dy.append(tracker.dy[-1])
+                tracker.center = x + tracker.dx[-1], y + tracker.dy[-1]
+            else:
+                tracker.dx.append(int(dx[i]))
+                tracker.dy.append(int(dy[i]))
+                tracker.center = x + int(dx[i]), y + int(dy[i])
+                good_rows.append(i)
+            tracker.centers.append(tracker.center)
+
+        if good_rows:
+            images = self.train(good_rows, frame)
+            for j, i in enumerate(good_rows):
+                self.trackers[i].last_img = images[:, :, j]
+
+        return [tracker.dx[-1] for tracker in self.trackers], [tracker.dy[-1] for tracker in self.trackers], psr
+
+
+class MosseEngine:
+    """
+    Updates all MOSSE trackers of a camera on a frame in one pass
+
+    Trackers of the same size and learning rate share a MosseGroup, whose
+    preprocessing, correlation and filter updates run over the whole stack
+    instead of once per tracker. The groups are kept while the same
+    trackers are updated together.
+    """
+
+    def __init__(self):
+        self.groups = {}  # (width, height, learning_rate) -> MosseGroup
+
+    def update(self, trackers, frame, stopped=None):
+        """
+        Update the trackers to the frame
+
+        Args:
+            trackers: MOSSE trackers
+            frame: gray frame
+            stopped: per tracker, whether it is stopped and only moves by its last moves
+
+        Returns:
+            dx, dy and psr arrays in the order of the trackers
+        """
+        n = len(trackers)
+        dx = np.zeros(n, np.float32)
+        dy = np.zeros(n, np.float32)
+        psr = np.zeros(n, np.float32)
+
+        by_key = {}
+        for i, tracker in enumerate(trackers):
+            if stopped is not None and stopped[i] and tracker.updated_last_time:
+                tracker.updateTracking(frame, True)
+                dx[i], dy[i], psr[i] = tracker.dx[-1], tracker.dy[-1], tracker.psr
+            else:
+                by_key.setdefault(tracker.size + (tracker.learning_rate,), []).append(i)
+
+        groups = {}
+        for key, indices in by_key.items():
+            if len(indices) < MIN_GROUP_SIZE:
+                # stacking doesn't pay off for a lone tracker
+                for i in indices:
+                    trackers[i].updateTracking(frame, False)
+                    dx[i], dy[i], psr[i] = trackers[i].dx[-1], trackers[i].dy[-1], trackers[i].psr
+                continue
+            members = [trackers[i] for i in indices]
+            group = self.groups.get(key)
+            if group is None or not group.isGroupOf(members):
+                group = MosseGroup(members)
+            groups[key] = group
+            dx[indices], dy[indices], psr[indices] = group.update(frame)
+        self.groups = groups
+        return dx, dy, psr
@@ -0,0 +1,150 @@
+import os
+
+import cv2
+import numpy as np
+
+from Mosse_Tracker.TrackerManager import TrackerType
+
+
+class TrackSet:
+    """
+    Tracks of one batch as columns, one row per tracker
+
+    Replaces the list of Tracker copies sent to the crash node: positions,
+    moves and predicted centers of every tracker are rows of a few numpy
+    arrays indexed by frame of the batch, so they pickle small and the
+    speeds and boxes of all tracks are computed at once.
+
+    Positions are kept as int16 and float32, whole and half pixels and the
+    MOSSE moves are exact in them, and are computed on in float64.
+    """
+
+    __slots__ = ('tracker_ids', 'tracker_type', 'boxes', 'centers', 'dx', 'dy', 'predicted',
+                 'areas', 'vehicle_widths', 'vehicle_heights', 'frame_width', 'frame_height', 'saved_clips')
+
+    def __init__(self, tracker_ids, tracker_type, boxes, centers, dx, dy, areas, vehicle_widths, vehicle_heights,
+                 frame_width, frame_height):
+        self.tracker_ids = tracker_ids  # (n,)
+        self.tracker_type = tracker_type
+        self.boxes = boxes  # (n, frames, 4) xmin, ymin, xmax, ymax
+        self.centers = centers  # (n, frames, 2)
+        self.dx = dx  # (n, moves), a dlib tracker has no move for the first frame
+        self.dy = dy
+        self.areas = areas  # (n,) tracker window areas, speeds are scaled by them
+        self.vehicle_widths = vehicle_widths  # (n,)
+        self.vehicle_heights = vehicle_heights
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.saved_clips = np.zeros(len(tracker_ids), dtype=np.int32)
+        self.predicted = self.futureCenters()
+
+    @classmethod
+    def fromTrackers(cls, trackers, no_of_frames=30):
+        """Columns of the last no_of_frames frames of the trackers, as if they were created on the first one"""
+        n = len(trackers)
+        tracker_type = trackers[0].tracker_type if n > 0 else TrackerType.MOSSE
+        moves = no_of_frames if tracker_type == TrackerType.MOSSE else no_of_frames - 1
+
+        boxes = np.zeros((n, no_of_frames, 4), dtype=np.int16)
+        centers = np.zeros((n, no_of_frames, 2), dtype=np.float32)
+        dx = np.zeros((n, moves), dtype=np.float32)
+        dy = np.zeros((n, moves), dtype=np.float32)
+        areas = np.zeros(n)
+        for row, tracker in enumerate(trackers):
+            boxes[row] = tracker.history[-no_of_frames:]
+            if tracker_type == TrackerType.MOSSE:
+                centers[row] = tracker.tracker.centers[-no_of_frames:]
+                dx[row] = tracker.tracker.dx[-moves:]
+                dy[row] = tracker.tracker.dy[-moves:]
+                areas[row] = tracker.tracker.area
+            else:
+                centers[row] = [tracker.get_position(position) for position in tracker.history[-no_of_frames:]]
+                dx[row] = tracker.dx[-moves:]
+                dy[row] = tracker.dy[-moves:]
+                areas[row] = tracker.width * tracker.height
+
+        return cls(np.array([tracker.tracker_id for tracker in trackers], dtype=np.int64), tracker_type,
+                   boxes, centers, dx, dy, areas,
+                   np.array([tracker.vehicle_width for tracker in trackers], dtype=np.float64),
+                   np.array([tracker.vehicle_height for tracker in trackers], dtype=np.float64),
+                   trackers[0].frame_width if n > 0 else 0, trackers[0].frame_height if n > 0 else 0)
+
+    def __reduce__(self):
+        # the predicted centers are mostly NaN, the receiver estimates them again
+        return (TrackSet, (self.tracker_ids, self.tracker_type, self.boxes, self.centers, self.dx, self.dy, self.areas,
+                           self.vehicle_widths, self.vehicle_heights, self.frame_width, self.frame_height))
+
+    def __len__(self):
+        return len(self.tracker_ids)
+
+    def futureCenters(self):
+        """
+        Centers Tracker.futureFramePosition predicts, by the frame they are predicted for
+
+        Returns:
+            (n, frames + 1, 2) array, NaN where nothing is predicted
+        """
+        n, frames = self.centers.shape[:2]
+        moves = self.dx.shape[1]
+        predicted = np.full((n, frames + 1, 2), np.nan)
+        centers = self.centers.astype(np.float64)
+        dx = self.dx.astype(np.float64)
+        dy = self.dy.astype(np.float64)
+
+        # after a tracker's count-th move, its center is moved on by its average move of the
+        # last (up to 10) moves, times that many moves, as the center 10 frames later
+        for count in range(5, min(moves, 20) + 1):
+            frame_no = count + frames - moves - 1
+            measure = min(count, 10)
+            predicted[:, count + 10, 0] = centers[:, frame_no, 0] + dx[:, count - measure:count].sum(axis=1)
+            predicted[:, count + 10, 1] = centers[:, frame_no, 1] + dy[:, count - measure:count].sum(axis=1)
+        return predicted
+
+    def avgSpeeds(self, from_frame_no, to_frame_no):
+        """Tracker.getAvgSpeed of every track over the moves from_frame_no:to_frame_no"""
+        x = self.dx[:, from_frame_no:to_frame_no].mean(axis=1, dtype=np.float64)
+        y = self.dy[:, from_frame_no:to_frame_no].mean(axis=1, dtype=np.float64)
+        return np.hypot(x, y) * (43200 / self.areas)
+
+    def isAboveSpeedLimit(self, from_frame_no, to_frame_no):
+        return self.avgSpeeds(from_frame_no, to_frame_no) > 50
+
+    def vehicleSizes(self):
+        """Quarter of the vehicles' diagonals, the distance under which they touch"""
+        return np.hypot(self.vehicle_heights, self.vehicle_widths) * .25
+
+    def trackedBoxes(self, last_no_of_frames=30):
+        """(n, 4) boxes around the tracks' last frames, inside the frame, like Tracker.getTrackedFramesBoxed"""
+        boxes = self.boxes[:, -last_no_of_frames:]
+        tracked = np.empty((len(self), 4), dtype=np.int64)
+        tracked[:, 0] = np.maximum(boxes[:, :, 0].min(axis=1), 0)
+        tracked[:, 1] = np.maximum(boxes[:, :, 1].min(axis=1), 0)
+        tracked[:, 2] = np.minimum(boxes[:, :, 2].max(axis=1), self.frame_width)
+        tracked[:, 3] = np.minimum(boxes[:, :, 3].max(axis=1), self.frame_height)
+        return tracked
+
+    def framesOfTracking(self, row, frames, last_no_of_frames=30):
+        """Tracker.getFramesOfTracking of one track"""
+        if self.boxes.shape[1] < last_no_of_frames:
+            return None, -1, -1, -1, -1, -1, -1
+
+        xmin, ymin, xmax, ymax = self.trackedBoxes(last_no_of_frames)[row].tolist()
+        size = len(frames)
+        new_frames = [frames[i][ymin:ymax, xmin:xmax] for i in range(size - last_no_of_frames, size)]
+        return new_frames, xmax - xmin, ymax - ymin, xmin, xmax, ymin, ymax
+
+    def saveTracking(self, row, frames):
+        """Save the frames of one track to a video file, like Tracker.saveTracking"""
+        new_frames, width, height, _, _, _, _ = self.framesOfTracking(row, frames)
+        if new_frames is None:
+            return
+
+        os.makedirs('./track_videos', exist_ok=True)
+        out = cv2.VideoWriter(f'./track_videos/{self.tracker_ids[row]}) {self.saved_clips[row]}.avi',
+                              cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'), 30, (width, height))
+
+        for frame in new_frames:
+            out.write(frame)
+
+        self.saved_clips[row] += 1
+        out.release()
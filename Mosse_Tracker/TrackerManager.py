@@ -11,7 +11,7 @@ from Mosse_Tracker.Mosse import MOSSE
 from Mosse_Tracker.utils import draw_str
 from Mosse_Tracker.utils import RectSelector
 
-from System.Data.CONSTANTS import Work_Tracker_Interpolation
+from System.Data.CONSTANTS import Work_Tracker_Interpolation, Work_Tracker_Size_Step
 
 pi = 22/7
 
@@ -32,7 +32,7 @@ class Tracker:
         self.width, self.height = map(cv2.getOptimalDFTSize, [xmax - xmin, ymax - ymin])
 
         if tracker_type == TrackerType.MOSSE:
-            self.tracker = MOSSE(frame, cut_size, learning_rate=0.225, psrGoodness=5)
+            self.tracker = MOSSE(frame, cut_size, learning_rate=0.225, psrGoodness=5, size_step=Work_Tracker_Size_Step)
             self.addHistory(self.tracker.getCutFramePosition())
         else:
             xmin, ymin, xmax, ymax = cut_size
@@ -59,15 +59,16 @@ class Tracker:
         """Get history in [[xmin,ymin,xmax,ymax]] format"""
         return self.history
 
+    def isStopped(self):
+        """Whether a MOSSE tracker barely moved in its last frames, it's then moved by interpolation"""
+        if len(self.tracker.dx) >= 3 and Work_Tracker_Interpolation:
+            return self.getAvgSpeed(len(self.tracker.dx)-3, len(self.tracker.dx)) < 20
+        return False
+
     def update(self, frame):
         """Update the tracker to current frame and add the updated position to history"""
         if self.tracker_type == TrackerType.MOSSE:
-            is_stopped = False
-            if len(self.tracker.dx) >= 3 and Work_Tracker_Interpolation:
-                if self.getAvgSpeed(len(self.tracker.dx)-3, len(self.tracker.dx)) < 20:
-                    is_stopped = True
-
-            self.tracker.updateTracking(frame, is_stopped)
+            self.tracker.updateTracking(frame, self.isStopped())
             self.addHistory(self.tracker.getCutFramePosition())
 
         else:
@@ -85,6 +86,20 @@ class Tracker:
 
         return self.history[-1]
 
+    @staticmethod
+    def updateAll(trackers, frame, engine):
+        """Update the trackers to the same frame, the MOSSE ones together in one pass of the engine"""
+        mosse_trackers = [tracker for tracker in trackers if tracker.tracker_type == TrackerType.MOSSE]
+        if mosse_trackers:
+            engine.update([tracker.tracker for tracker in mosse_trackers], frame,
+                          [tracker.isStopped() for tracker in mosse_trackers])
+            for tracker in mosse_trackers:
+                tracker.addHistory(tracker.tracker.getCutFramePosition())
+
+        for tracker in trackers:
+            if tracker.tracker_type != TrackerType.MOSSE:
+                tracker.update(frame)
+
     def getTrackerPosition(self):
         """Get last tracker position"""
         return self.history[-1]
@@ -308,6 +323,17 @@ class Tracker:
             self.estimationFutureCenter[expectedPositionNo] = (x_new, y_new)
             return self.getCutFramePosition((x_new, y_new))
 
+    def trimHistory(self, no_of_frames=30):
+        """Forget all but the last frames, a tracker kept across batches would grow forever"""
+        self.history = self.history[-no_of_frames:]
+        if self.tracker_type == TrackerType.MOSSE:
+            self.tracker.dx = self.tracker.dx[-no_of_frames:]
+            self.tracker.dy = self.tracker.dy[-no_of_frames:]
+            self.tracker.centers = self.tracker.centers[-no_of_frames:]
+        else:
+            self.dx = self.dx[-no_of_frames:]
+            self.dy = self.dy[-no_of_frames:]
+
     def getFramesOfTracking(self, frames, last_no_of_frames=30):
         """Extract frames for crash detection analysis"""
         if len(self.history) < last_no_of_frames:
@@ -0,0 +1,9 @@
+import sys
+from System.Capture.CameraFleet import CameraFleet, loadManifest
+
+if __name__ == "__main__":
+    fleet = CameraFleet(loadManifest(sys.argv[1] if len(sys.argv) > 1 else "cameras.json"))
+    try:
+        fleet.run()
+    except KeyboardInterrupt:
+        fleet.stop()
@@ -1,11 +1,66 @@
-import copy
 from time import time
 import cv2
+import numpy as np
 import threading
+from System.Capture.CaptureReader import CaptureReader
+from System.Capture.Sources import openSource
+from System.Connections.SharedFrameRing import SharedFrameRing, isColocated
 from System.Controller.JsonEncoder import JsonEncoder
+from System.Data.CONSTANTS import Work_Shared_Memory, BATCH_SIZE, BATCH_STEP, CAMERA_RING_SEGMENTS
 from boxes.yoloFiles import loadFile
 
 
+class FrameRing:
+    """
+    Preallocated frames of a camera, handed out as overlapping batch views
+
+    Batches of BATCH_SIZE frames start every BATCH_STEP frames, so the ring
+    holds segments of BATCH_STEP frames. The first segment is mirrored after
+    the last one, which keeps every batch contiguous even when it wraps
+    around, and consecutive batches share their overlap instead of copying it.
+
+    The CaptureReader writes the frames into their slots ahead of the camera,
+    up to lookahead frames past the last batch without reaching into it.
+    """
+
+    def __init__(self, frame_width, frame_height, segments=CAMERA_RING_SEGMENTS):
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.capacity = segments * BATCH_STEP
+        self.buffer = np.empty((self.capacity + BATCH_SIZE - BATCH_STEP, frame_height, frame_width, 3), dtype=np.uint8)
+        self.count = 0
+        self.lookahead = self.capacity - BATCH_SIZE - 1
+
+    def write(self, index, frame):
+        """Resize the camera's index-th decoded frame straight into its slot"""
+        position = index % self.capacity
+        slot = self.buffer[position]
+        if frame.shape == slot.shape:
+            np.copyto(slot, frame)
+        else:
+            cv2.resize(frame, (self.frame_width, self.frame_height), dst=slot, interpolation=cv2.INTER_AREA)
+
+        if position < BATCH_SIZE - BATCH_STEP:
+            np.copyto(self.buffer[self.capacity + position], slot)
+        return slot
+
+    def slot(self, index):
+        """The index-th frame's slot"""
+        return self.buffer[index % self.capacity]
+
+    def push(self):
+        """Take in the next frame, written into its slot already"""
+        self.count += 1
+
+    def isBatchReady(self):
+        return self.count >= BATCH_SIZE and (self.count - BATCH_SIZE) % BATCH_STEP == 0
+
+    def lastBatch(self):
+        """View of the last BATCH_SIZE frames, valid until the ring wraps around onto them"""
+        start = (self.count - BATCH_SIZE) % self.capacity
+        return self.buffer[start:start + BATCH_SIZE]
+
+
 class CameraNode(threading.Thread):
     """
     Class that handles video input and feeds frames into the processing pipeline
@@ -17,8 +72,8 @@ class CameraNode(threading.Thread):
         
         Args:
             camera_id: Unique identifier for this camera
-            file_path: Path to video file to process
-            files: Whether to use file-based detection boxes
+            file_path: Video file, stream URL (rtsp://...), V4L device or fake:// camera to process
+            files: Whether to use file-based detection boxes (recorded video files only)
             city: City location of the camera
             district_no: District number within the city
         """
@@ -32,41 +87,63 @@ class CameraNode(threading.Thread):
         self.city = city
         self.district_no = district_no
         self.json_encoder = JsonEncoder()
+        self.ring = None
+        self.fps = 0.0
+        self.live = False
+        self.error = None
 
     def run(self):
         """Main thread method that processes the video"""
-        self.process_video_file()
+        try:
+            self.process_video_file()
+        except Exception as e:
+            self.error = e
+            print(f"Camera {self.camera_id} failed: {e}")
 
     def process_video_file(self):
-        """Process a video file and send frames to detection pipeline"""
+        """Process a video source and send frames to detection pipeline"""
         # Load pre-computed detection boxes if using file-based detection
         if self.read_file:
             fileBoxes = loadFile(self.file_path)
 
-        # Open video file
-        cap = cv2.VideoCapture(self.file_path)
-        frames = []
+        else:
+            fileBoxes = None
+
+        # Decode and resize ahead on the reader thread, into the frame ring
+        frames = FrameRing(self.frame_width, self.frame_height)
+        reader = CaptureReader(openSource(self.file_path), frames)
+        self.live = reader.source.live
+        reader.start()
+
+        try:
+            # Share the batches through memory when every node runs on this host
+            if Work_Shared_Memory and isColocated():
+                self.ring = SharedFrameRing.create(self.camera_id, BATCH_SIZE, self.frame_height, self.frame_width)
+
+            self.process_frames(reader, frames, fileBoxes)
+        finally:
+            # Release video resource
+            reader.stop()
+            if self.ring is not None:
+                self.ring.close()
+
+    def process_frames(self, reader, frames, fileBoxes):
+        """Batch the reader's frames and feed them until the source is over"""
         t = time()
 
         while True:
-            # Read next frame
-            ret, frame = cap.read()
-            if not ret:
+            # Read next frame, already resized
+            frame = reader.read()
+            if frame is None:
                 break
-                
-            # Resize to standard dimensions
-            frame = cv2.resize(frame, (self.frame_width, self.frame_height), interpolation=cv2.INTER_AREA)
-            frames.append(frame)
+
+            frames.push()
 
             self.no_of_frames += 1
             
-            # When we have 30 frames, process them as a batch
-            if len(frames) == 30:
-                # Create a deep copy for processing
-                new_frames_list = copy.deepcopy(frames)
-                
-                # Keep last 15 frames for next batch
-                frames = frames[15:]
+            # Every 15 frames, process the last 30 as a batch
+            if frames.isBatchReady():
+                new_frames_list = self.shareFrames(frames.lastBatch())
                 
                 # Get detection boxes for this batch
                 new_boxes = []
@@ -90,6 +167,19 @@ class CameraNode(threading.Thread):
             if self.no_of_frames % 30 == 0:
                 elapsed = time() - t
                 t = time()
+                self.fps = 30 / elapsed if elapsed > 0 else 0.0
+
+    def shareFrames(self, frames):
+        """
+        Prepare a batch view of the frame ring to be sent downstream
+
+        The batch is copied into a shared memory slot when available. Otherwise
+        the view itself is sent inline: feed waits for the Master's ack, so the
+        frames are on the wire before the ring wraps around onto them.
+        """
+        if self.ring is not None:
+            slot = self.ring.acquire()
+            if slot is not None:
+                return self.ring.write(slot, frames)
 
-        # Release video resource
-        cap.release()
\ No newline at end of file
+        return frames
\ No newline at end of file
@@ -0,0 +1,178 @@
+import json
+import multiprocessing
+import os
+import queue
+from time import time
+
+from System.Data.CONSTANTS import FLEET_REPORT_INTERVAL, FLEET_RESTART_DELAY, FLEET_RESTART_MAX_DELAY, FLEET_QUICK_FAILURE, \
+    FLEET_MAX_QUICK_FAILURES, Work_Detect_Files
+
+
+def loadManifest(path):
+    """
+    Read the cameras of a fleet
+
+    The manifest is a JSON list of cameras:
+        [{"camera_id": 1, "source": "videos/1.mp4", "city": "Cairo", "district": "District 4"},
+         {"camera_id": 2, "source": "rtsp://10.0.0.12/stream", "files": false}, ...]
+    "files" (use the recorded boxes of the video) defaults to Work_Detect_Files.
+    """
+    with open(path) as f:
+        cameras = json.load(f)
+
+    return [{"camera_id": camera["camera_id"],
+             "source": camera["source"],
+             "city": camera.get("city", "None"),
+             "district": camera.get("district", "None"),
+             "files": camera.get("files", Work_Detect_Files)} for camera in cameras]
+
+
+def startCamera(camera):
+    # imported here so the supervisor itself never loads the pipeline
+    from System.CameraNode import CameraNode
+
+    node = CameraNode(camera["camera_id"], camera["source"], files=camera["files"],
+                      city=camera["city"], district_no=camera["district"])
+    node.daemon = True
+    node.start()
+    return node
+
+
+def runShard(cameras, reports, stop):
+    """
+    Run some cameras in this process and report on them
+
+    A camera whose thread failed, or whose live stream ended, is started again
+    after FLEET_RESTART_DELAY seconds, doubled for every failure in a row
+    within FLEET_QUICK_FAILURE seconds of its start (up to
+    FLEET_RESTART_MAX_DELAY). After FLEET_MAX_QUICK_FAILURES of those, e.g. a
+    missing video or a bad URL, the camera is failed and left alone. A
+    recorded video that played to its end is done. Returns once every camera
+    is done or failed.
+    """
+    nodes = {camera["camera_id"]: startCamera(camera) for camera in cameras}
+    by_id = {camera["camera_id"]: camera for camera in cameras}
+    started_at = {camera_id: time() for camera_id in nodes}
+    restarts = {camera_id: 0 for camera_id in nodes}
+    quick_failures = {camera_id: 0 for camera_id in nodes}
+    restart_at = {}
+    done = set()
+    failed = set()
+    last_report = 0
+
+    while len(done) + len(failed) < len(cameras) and not stop.is_set():
+        stop.wait(1)
+        now = time()
+
+        for camera_id, node in nodes.items():
+            if camera_id in done or camera_id in failed or camera_id in restart_at or node.is_alive():
+                continue
+            if node.error is None and not node.live:
+                done.add(camera_id)
+                continue
+
+            if now - started_at[camera_id] < FLEET_QUICK_FAILURE:
+                quick_failures[camera_id] += 1
+            else:
+                quick_failures[camera_id] = 0
+            if quick_failures[camera_id] >= FLEET_MAX_QUICK_FAILURES:
+                print(f"Camera {camera_id} failed {quick_failures[camera_id]} times in a row, giving up: {node.error}")
+                failed.add(camera_id)
+                continue
+            delay = FLEET_RESTART_DELAY * 2 ** max(quick_failures[camera_id] - 1, 0)
+            restart_at[camera_id] = now + min(delay, FLEET_RESTART_MAX_DELAY)
+
+        for camera_id, start_time in list(restart_at.items()):
+            if now >= start_time:
+                del restart_at[camera_id]
+                restarts[camera_id] += 1
+                started_at[camera_id] = now
+                nodes[camera_id] = startCamera(by_id[camera_id])
+
+        if now - last_report >= FLEET_REPORT_INTERVAL or len(done) + len(failed) == len(cameras):
+            last_report = now
+            reports.put({camera_id: {"fps": node.fps,
+                                     "frames": node.no_of_frames,
+                                     "restarts": restarts[camera_id],
+                                     "state": stateOf(camera_id, node, done, failed, restart_at)}
+                         for camera_id, node in nodes.items()})
+
+
+def stateOf(camera_id, node, done, failed, restart_at):
+    if camera_id in done:
+        return "done"
+    if camera_id in failed:
+        return "failed"
+    if camera_id in restart_at:
+        return "restarting"
+    return "running"
+
+
+class CameraFleet:
+    """
+    Runs many cameras spread over a pool of processes
+
+    CameraNode threads of one process share its GIL for decoding and resizing,
+    so the cameras are sharded over one process per core. The supervisor
+    restarts a shard process that dies and prints every camera's fps.
+    """
+
+    def __init__(self, cameras, processes=None):
+        self.cameras = cameras
+        self.processes = max(1, min(processes or os.cpu_count() or 1, len(cameras)))
+        # spawn: the shards start clean instead of inheriting this process' threads and sockets
+        self.context = multiprocessing.get_context("spawn")
+        self.reports = self.context.Queue()
+        self.stop_event = self.context.Event()
+        self.shards = []  # [(process, cameras)]
+        self.stats = {}
+
+    def start(self):
+        for i in range(self.processes):
+            self.startShard(self.cameras[i::self.processes])
+
+    def startShard(self, cameras):
+        process = self.context.Process(target=runShard, args=(cameras, self.reports, self.stop_event), daemon=True)
+        process.start()
+        self.shards.append((process, cameras))
+
+    def run(self):
+        """Start the shards and supervise them until every camera is done"""
+        self.start()
+        last_print = time()
+
+        while self.shards:
+            try:
+                self.stats.update(self.reports.get(timeout=1))
+            except queue.Empty:
+                pass
+
+            for process, cameras in list(self.shards):
+                if process.is_alive():
+                    continue
+                process.join()
+                self.shards.remove((process, cameras))
+                remaining = [camera for camera in cameras
+                             if self.stats.get(camera["camera_id"], {}).get("state") not in ("done", "failed")]
+                if process.exitcode != 0 and remaining and not self.stop_event.is_set():
+                    print(f"Camera shard {process.pid} exited with {process.exitcode}, restarting it")
+                    self.startShard(remaining)
+
+            if time() - last_print >= FLEET_REPORT_INTERVAL:
+                last_print = time()
+                self.printStats()
+
+        self.printStats()
+
+    def printStats(self):
+        for camera_id, stats in sorted(self.stats.items(), key=lambda item: str(item[0])):
+            print(f"Camera {camera_id}: {stats['fps']:.1f} fps, {stats['frames']} frames, "
+                  f"{stats['restarts']} restarts, {stats['state']}")
+
+    def stop(self):
+        self.stop_event.set()
+        for process, _ in self.shards:
+            process.join(timeout=FLEET_RESTART_DELAY)
+            if process.is_alive():
+                process.terminate()
+        self.shards = []
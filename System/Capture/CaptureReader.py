@@ -0,0 +1,79 @@
+import queue
+import threading
+
+from System.Data.CONSTANTS import CAPTURE_QUEUE_SIZE
+
+
+class CaptureReader(threading.Thread):
+    """
+    Decodes and resizes a source's frames ahead of the camera, on its own thread
+
+    Frames are resized straight into the camera's FrameRing, the queue only
+    holds the indices of the frames written. The reader stays at most
+    queue_size frames ahead, which the ring keeps clear of the batch being
+    sent. A file source blocks when the queue is full; a live source drops
+    the oldest frame queued for the newest one, so a slow consumer sees
+    frames at most queue_size old rather than an ever-growing delay.
+    """
+
+    def __init__(self, source, ring, queue_size=CAPTURE_QUEUE_SIZE):
+        threading.Thread.__init__(self, daemon=True)
+        self.source = source
+        self.ring = ring
+        self.frames = queue.Queue(maxsize=min(queue_size, ring.lookahead))
+        self.stopped = threading.Event()
+        self.dropped = 0
+
+    def run(self):
+        index = 0
+        try:
+            while not self.stopped.is_set():
+                frame = self.source.read()
+                if frame is None:
+                    break
+
+                if self.source.live and self.replaceOldest(frame):
+                    self.dropped += 1
+                    continue
+
+                self.ring.write(index, frame)
+                self.frames.put(index)
+                index += 1
+        finally:
+            self.source.release()
+            self.frames.put(None)
+
+    def replaceOldest(self, frame):
+        """
+        Drop the oldest queued frame for this one if the queue is full
+
+        The ring must hold the frames the camera takes at consecutive
+        indices, so the queued frames move down one slot and this one takes
+        the newest slot, leaving the queued indices as they are.
+        """
+        with self.frames.mutex:
+            queued = self.frames.queue
+            if len(queued) < self.frames.maxsize:
+                return False
+
+            indices = list(queued)
+            for older, newer in zip(indices, indices[1:]):
+                self.ring.write(older, self.ring.slot(newer))
+            self.ring.write(indices[-1], frame)
+            return True
+
+    def read(self):
+        """
+        Next resized frame, already in its ring slot, or None at the end of the source
+        """
+        index = self.frames.get()
+        return None if index is None else self.ring.slot(index)
+
+    def stop(self):
+        self.stopped.set()
+        # unblock a producer waiting on a full queue
+        try:
+            while True:
+                self.frames.get_nowait()
+        except queue.Empty:
+            pass
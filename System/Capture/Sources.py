@@ -0,0 +1,122 @@
+from abc import ABC, abstractmethod
+from time import sleep, time
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+from System.Data.CONSTANTS import CAPTURE_RECONNECT_ATTEMPTS, CAPTURE_RECONNECT_DELAY
+
+
+LIVE_SCHEMES = ("rtsp", "rtsps", "rtmp", "http", "https", "udp", "tcp")
+
+
+class VideoSource(ABC):
+    """
+    Where a camera's frames come from
+
+    live: frames keep coming whether or not we read them, so a slow reader
+    should drop old frames instead of falling behind
+    """
+
+    live = False
+
+    @abstractmethod
+    def read(self):
+        """Return the next decoded frame, or None once the source is over"""
+
+    def release(self):
+        pass
+
+
+class FileSource(VideoSource):
+    """A recorded video file, decoded as fast as the pipeline takes it"""
+
+    def __init__(self, path):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+
+    def read(self):
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def release(self):
+        self.cap.release()
+
+
+class StreamSource(VideoSource):
+    """An RTSP/HTTP stream or a local V4L device, reopened when it drops"""
+
+    live = True
+
+    def __init__(self, url):
+        self.url = url
+        self.cap = cv2.VideoCapture(url)
+
+    def read(self):
+        ret, frame = self.cap.read()
+        attempts = 0
+        while not ret and attempts < CAPTURE_RECONNECT_ATTEMPTS:
+            attempts += 1
+            self.cap.release()
+            sleep(CAPTURE_RECONNECT_DELAY)
+            self.cap = cv2.VideoCapture(self.url)
+            ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def release(self):
+        self.cap.release()
+
+
+class FakeCameraSource(VideoSource):
+    """
+    Synthetic live camera for tests: boxes moving over a gray road at a fixed fps
+
+    fake://?frames=300&fps=30&width=480&height=360
+    """
+
+    live = True
+
+    def __init__(self, frames=300, fps=30, width=480, height=360):
+        self.frames = frames
+        self.interval = 1.0 / fps if fps > 0 else 0
+        self.width = width
+        self.height = height
+        self.index = 0
+        self.next_time = time()
+
+    @classmethod
+    def fromUrl(cls, url):
+        query = {key: int(values[0]) for key, values in parse_qs(urlparse(url).query).items()}
+        return cls(**query)
+
+    def read(self):
+        if self.index >= self.frames:
+            return None
+
+        # behave like a camera: a frame every interval, no faster
+        delay = self.next_time - time()
+        if delay > 0:
+            sleep(delay)
+        self.next_time = max(self.next_time, time() - self.interval) + self.interval
+
+        frame = np.full((self.height, self.width, 3), 96, dtype=np.uint8)
+        for lane in range(3):
+            x = (self.index * (4 + 2 * lane) + lane * 150) % self.width
+            y = self.height // 4 + lane * self.height // 4 - 20
+            cv2.rectangle(frame, (x, y), (x + 60, y + 40), (40 + 80 * lane, 200, 255 - 80 * lane), -1)
+        self.index += 1
+        return frame
+
+
+def openSource(path):
+    """Pick the source for a video file path, a stream URL, a V4L device (number or /dev/video*) or fake://"""
+    if isinstance(path, int) or str(path).isdigit():
+        return StreamSource(int(path))
+
+    scheme = urlparse(str(path)).scheme.lower()
+    if scheme == "fake":
+        return FakeCameraSource.fromUrl(path)
+    if scheme in LIVE_SCHEMES or str(path).startswith("/dev/video"):
+        return StreamSource(path)
+    return FileSource(path)
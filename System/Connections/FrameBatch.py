@@ -0,0 +1,80 @@
+import cv2
+import numpy as np
+
+
+def grayStack(frames, out=None):
+    """
+    Grayscale frames as one contiguous (N, height, width) uint8 array
+
+    A contiguous stack of BGR frames is converted by a single cvtColor call
+    over all of its rows.
+    """
+    if isinstance(frames, np.ndarray) and frames.ndim == 4 and frames.flags.c_contiguous:
+        count, height, width = frames.shape[:3]
+        if out is None:
+            out = np.empty((count, height, width), np.uint8)
+        cv2.cvtColor(frames.reshape(count * height, width, 3), cv2.COLOR_BGR2GRAY, out.reshape(count * height, width))
+        return out
+
+    if out is None:
+        out = np.empty((len(frames),) + frames[0].shape[:2], np.uint8)
+    for i, frame in enumerate(frames):
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, out[i])
+    return out
+
+
+class FrameBatch:
+    """
+    Frames of a batch with their grayscale stack, converted at most once
+
+    Tracking, Crashing and the ViF descriptor all work on gray frames. The
+    first stage that needs them converts the whole batch, and the stack goes
+    on with the messages (or stays in the shared memory slot) so the next
+    stages don't convert again. A batch may carry only the gray stack.
+    """
+
+    def __init__(self, frames=None, gray=None):
+        self.frames = frames  # BGR frames: list, array or SharedFrames, None for a gray-only batch
+        self.gray = gray
+
+    def __len__(self):
+        return len(self.frames) if self.frames is not None else len(self.gray)
+
+    def grayFrames(self):
+        """(N, height, width) uint8 stack of the gray frames"""
+        if self.gray is None:
+            if hasattr(self.frames, "grayFrames"):
+                self.gray = self.frames.grayFrames()
+            else:
+                self.gray = grayStack(self.frames)
+        return self.gray
+
+    def colorFrames(self):
+        """BGR frames, made from the gray ones for a gray-only batch"""
+        if self.frames is None:
+            return [cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR) for frame in self.gray]
+        return self.frames
+
+    def messageFrames(self, gray_only=False):
+        """
+        What the batch sends downstream
+
+        Returns:
+            frames, gray: the values of FRAMES and GRAY_FRAMES. Shared memory
+            frames keep their gray stack in their slot, so only the slot
+            reference is sent for them.
+        """
+        if hasattr(self.frames, "grayFrames"):
+            self.grayFrames()
+            return self.frames, None
+        return (None if gray_only else self.frames), self.gray
+
+    def check(self):
+        """Raise StaleFrames if the camera reused the shared memory slot while the batch was read"""
+        if hasattr(self.frames, "check"):
+            self.frames.check()
+
+    def release(self):
+        """Hand the shared memory slot back to the camera, called by the last stage"""
+        if hasattr(self.frames, "release"):
+            self.frames.release()
@@ -0,0 +1,108 @@
+import pickle
+
+import numpy as np
+
+from System.Connections.SharedFrameRing import SharedFrames, attachFrames
+from System.Data.CONSTANTS import FRAMES, GRAY_FRAMES
+
+
+# message keys whose values are lists or stacks of frames that travel as separate zmq parts
+BINARY_KEYS = (FRAMES, GRAY_FRAMES)
+
+
+def packMessage(msg):
+    """
+    Split a message into a small pickled header and one raw part per frame
+
+    Args:
+        msg: Message dictionary as built by JsonEncoder
+
+    Returns:
+        parts: List of zmq parts, the header first then the frame buffers
+    """
+    header = dict(msg)
+    buffers = []
+    layout = {}
+
+    for key in BINARY_KEYS:
+        items = header.get(key)
+        if items is None or isinstance(items, (str, bytes)):
+            continue
+
+        if isinstance(items, SharedFrames):
+            # frames already sit in shared memory, only send where to find them
+            layout[key] = items.describe()
+            header[key] = None
+            continue
+
+        if isinstance(items, np.ndarray):
+            # a stack of frames is a single part
+            items = np.ascontiguousarray(items)
+            layout[key] = {"dtype": items.dtype.str, "shape": items.shape}
+            header[key] = None
+            buffers.append(items)
+            continue
+
+        descriptors = []
+        for item in items:
+            if isinstance(item, np.ndarray):
+                item = np.ascontiguousarray(item)
+                descriptors.append((item.dtype.str, item.shape))
+            else:
+                descriptors.append(None)
+            buffers.append(item)
+
+        layout[key] = descriptors
+        header[key] = None
+
+    header = pickle.dumps((layout, header), protocol=pickle.HIGHEST_PROTOCOL)
+    return [header] + buffers
+
+
+def unpackMessage(parts):
+    """
+    Rebuild a message from the parts produced by packMessage
+
+    Frames are wrapped with np.frombuffer so they share memory with the
+    received zmq frames instead of being copied, so they may be read-only.
+
+    Args:
+        parts: List of zmq.Frame (or bytes) as returned by recv_multipart
+
+    Returns:
+        msg: Message dictionary with the frame lists restored
+    """
+    layout, msg = pickle.loads(_bufferOf(parts[0]))
+    index = 1
+
+    for key in BINARY_KEYS:
+        if key not in layout:
+            continue
+
+        if isinstance(layout[key], tuple):
+            msg[key] = attachFrames(layout[key])
+            continue
+
+        if isinstance(layout[key], dict):
+            stack = np.frombuffer(_bufferOf(parts[index]), dtype=layout[key]["dtype"])
+            msg[key] = stack.reshape(layout[key]["shape"])
+            index += 1
+            continue
+
+        items = []
+        for descriptor in layout[key]:
+            part = parts[index]
+            index += 1
+            if descriptor is None:
+                items.append(part.bytes if hasattr(part, "bytes") else bytes(part))
+            else:
+                dtype, shape = descriptor
+                items.append(np.frombuffer(_bufferOf(part), dtype=dtype).reshape(shape))
+        msg[key] = items
+
+    return msg
+
+
+def _bufferOf(part):
+    """Return a buffer over a zmq part without copying it"""
+    return part.buffer if hasattr(part, "buffer") else part
@@ -1,44 +1,169 @@
+import pickle
+import queue
 import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from time import time
+
 import zmq
+
+from System.Connections.FrameSerializer import unpackMessage
+from System.Connections.SharedFrameRing import SharedFrames
 from System.Controller.JsonDecoder import JsonDecoder
+from System.Data.CONSTANTS import *
+from System.Monitoring.Tracer import Tracer
+
+
+EMPTY_ACK = pickle.dumps("")  # what the REQ senders expect back through recv_pyobj
+BUSY_ACK = pickle.dumps(BUSY)  # the message was not taken, the sender keeps it and sends it again
+
+# decoder owned by each worker process when the receiver runs on a process pool
+worker_decoder = None
+
+
+def _initWorker(type, read_file, tf):
+    global worker_decoder
+    worker_decoder = JsonDecoder(type=type, read_file=read_file, tf=tf)
+    Tracer.getInstance().start(type.name if type is not None else "node")
+
+
+def _decodeInWorker(message):
+    worker_decoder.run(message)
+
+
+def carriesFrames(message):
+    """True if the message holds frame buffers itself, rather than a shared memory slot reference"""
+    frames = message.get(FRAMES)
+    return (frames is not None and not isinstance(frames, SharedFrames)) or message.get(GRAY_FRAMES) is not None
 
 
 #responsible for receiving all the messages
 class ReceiverController(threading.Thread):
     '''
     port: the port number that the thread will open on it
+    workers: size of the pool that decodes the messages
+    use_processes: decode on a process pool instead of a thread pool (for CPU-bound nodes).
+        Messages carrying their frames inline are still decoded on threads,
+        pickling them into a worker would copy every frame again.
     '''
-    def __init__(self,port,type=None,read_file = False,tf=False):
+    def __init__(self,port,type=None,read_file = False,tf=False,workers=RECEIVER_WORKERS,use_processes=False):
         threading.Thread.__init__(self)
         self.port = port
         self.type = type
         self.read_file = read_file
         self.tf = tf
+        self.workers = workers
+        self.use_processes = use_processes
+
+        self.running = {}  # camera_id -> number of messages being decoded
+        self.queued = {}  # camera_id -> acked messages waiting for a worker
+        self.parked = {}  # camera_id -> (identity, message, parked time) not acked yet, the sender blocks on them
+        self.finished = queue.Queue()  # camera_id of every message a worker is done with
+        self.pool = None
+        self.threads = None  # thread pool and decoder, of a process pool receiver only once needed
 
 
     def run(self):
         context = zmq.Context()
-        socket = context.socket(zmq.REP)
-        socket.bind("tcp://*:%s" % self.port)
+        self.socket = context.socket(zmq.ROUTER)
+        self.socket.bind("tcp://*:%s" % self.port)
+
+        if self.use_processes:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=_initWorker,
+                                            initargs=(self.type, self.read_file, self.tf))
+        else:
+            self.startThreads()
 
-        jsonDecoder = JsonDecoder(type=self.type,read_file = self.read_file,tf=self.tf)  # start the processing decoding method
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
 
         while True:
             #  Wait for next request from client
             try:
+                if poller.poll(RECEIVER_POLL_TIMEOUT):
+                    identity, _, *parts = self.socket.recv_multipart(copy=False)
+                    received = time()
+                    try:
+                        message = unpackMessage(parts) #receive a message json
+                    except Exception:
+                        self.ack(identity)  # never leave the sender waiting on a message we can't read
+                        raise
+                    message[RECEIVED_TIME] = received
+                    Tracer.getInstance().record("deserialize", message.get(CAMERA_ID),
+                                                message.get(STARTING_FRAME_ID), received, time())
+                    self.admit(identity, message)
 
-                message = socket.recv_pyobj() #receive a message json
-                socket.send_pyobj("")
-                # print("see")
-                # jsons = json.loads(message)
-                jsonDecoder.run(message)
-                # socket.close()
-                # socket.send_json({"func":"success"})
+                while not self.finished.empty():
+                    self.release(self.finished.get())
+                self.expire(time())
             except Exception as e:
                 print(e.__class__)
                 print(e)
-                # sleep(2)
                 pass
 
+    def admit(self, identity, message):
+        """Ack and queue a message, hold its ack while the camera's queue is full, or answer BUSY if too many are held"""
+        camera_id = message.get(CAMERA_ID)
+        waiting = self.queued.setdefault(camera_id, deque())
+        parked = self.parked.setdefault(camera_id, deque())
+
+        if parked or len(waiting) >= RECEIVER_QUEUE_PER_CAMERA:
+            if len(parked) >= RECEIVER_PARKED_PER_CAMERA:
+                self.busy(identity)
+            else:
+                parked.append((identity, message, time()))
+            return
+
+        self.accept(identity, message)
+
+    def accept(self, identity, message):
+        self.ack(identity)
+        self.queued[message.get(CAMERA_ID)].append(message)
+        self.dispatch(message.get(CAMERA_ID))
+
+    def release(self, camera_id):
+        """A worker finished a message of this camera, start the next one and unblock a sender"""
+        self.running[camera_id] -= 1
+        self.dispatch(camera_id)
+
+        parked = self.parked[camera_id]
+        while parked and len(self.queued[camera_id]) < RECEIVER_QUEUE_PER_CAMERA:
+            identity, message, _ = parked.popleft()
+            self.accept(identity, message)
+
+    def expire(self, now):
+        """Answer BUSY to messages held too long, while their senders still wait for an answer"""
+        for parked in self.parked.values():
+            while parked and now - parked[0][2] > RECEIVER_PARK_TIMEOUT:
+                identity, _, _ = parked.popleft()
+                self.busy(identity)
+
+    def dispatch(self, camera_id):
+        waiting = self.queued[camera_id]
+        while waiting and self.running.get(camera_id, 0) < RECEIVER_INFLIGHT_PER_CAMERA:
+            message = waiting.popleft()
+            self.running[camera_id] = self.running.get(camera_id, 0) + 1
+            if self.use_processes and not carriesFrames(message):
+                future = self.pool.submit(_decodeInWorker, message)
+            else:
+                if self.threads is None:
+                    self.startThreads()
+                future = self.threads.submit(self.jsonDecoder.run, message)
+            future.add_done_callback(lambda f, camera_id=camera_id: self.finish(f, camera_id))
+
+    def startThreads(self):
+        self.threads = ThreadPoolExecutor(self.workers)
+        self.jsonDecoder = JsonDecoder(type=self.type,read_file = self.read_file,tf=self.tf)  # start the processing decoding method
+
+    def finish(self, future, camera_id):
+        # runs on the worker side, the socket thread picks it up on its next poll
+        if future.exception() is not None:
+            print(future.exception().__class__)
+            print(future.exception())
+        self.finished.put(camera_id)
 
+    def ack(self, identity):
+        self.socket.send_multipart([identity, b"", EMPTY_ACK])
 
+    def busy(self, identity):
+        self.socket.send_multipart([identity, b"", BUSY_ACK])
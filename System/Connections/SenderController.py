@@ -1,32 +1,151 @@
+import os
+import queue
 import threading
-from time import time
+from time import sleep
 
 import zmq
 
+from System.Connections.FrameBatch import FrameBatch
+from System.Connections.FrameSerializer import packMessage
+from System.Data.CONSTANTS import BUSY, FRAMES, SENDER_ACK_TIMEOUT, SENDER_BUSY_DELAY, SENDER_BUSY_MAX_DELAY, SENDER_QUEUE_SIZE
+
 
 #to send all the messages jsons using ip and port
 class SenderController(threading.Thread):
+    """
+    Long-lived connection to one receiver, fed through a bounded outbound queue
+    """
 
-    def __init__(self,ip,port,msg):
-        threading.Thread.__init__(self)
-        self.ip =ip #ip of the receiver
+    def __init__(self, context, ip, port, queue_size=SENDER_QUEUE_SIZE):
+        threading.Thread.__init__(self, daemon=True)
+        self.context = context
+        self.ip = ip #ip of the receiver
         self.port = port #port of the receiver
-        self.msg = msg# the message itself
+        self.link = "tcp://" + self.ip + ":" + str(self.port)
+        self.outbound = queue.Queue(maxsize=queue_size)
+        self.socket = None
+
+    def put(self, msg, wait_ack=False):
+        """
+        Queue a message for this receiver
+
+        Args:
+            msg: The message itself
+            wait_ack: Block until the receiver acknowledged the message
+
+        Returns:
+            bool: False if waiting for the ack and it never came
+        """
+        if not wait_ack:
+            self.outbound.put((msg, None))
+            return True
+
+        ack = [threading.Event(), False]
+        self.outbound.put((msg, ack))
+        ack[0].wait()
+        return ack[1]
 
     def run(self):
-        try:
-            context = zmq.Context()
-            socket = context.socket(zmq.REQ)
-            link = "tcp://"+self.ip+":"+str(self.port)
-            socket.connect(link)
-            socket.RCVTIMEO =200000 #so it suspends if the receiver didn't send a message in the past  20 sec
-            socket.send_pyobj(self.msg)
-            jsons = socket.recv_pyobj()
-            # from Controller.JsonDecoder import JsonDecoder
-            # thread = JsonDecoder(jsons)
-            # thread.start()
-        except Exception as e:
-            print(e)
-            pass
+        while True:
+            msg, ack = self.outbound.get()
+            delivered = self.deliver(msg)
+            if ack is not None:
+                ack[1] = delivered
+                ack[0].set()
+
+    def deliver(self, msg):
+        """
+        Send one message over the persistent socket and wait until the receiver takes it
+
+        A receiver that can't take the camera's message yet answers BUSY
+        instead of the empty ack. The message is still ours then and goes
+        again after a growing delay, so backpressure holds the sender back
+        instead of losing batches. Without any answer the receiver may still
+        hold the message, so only a message that never left is dropped.
+        """
+        parts = packMessage(msg) #frames go as their own zero-copy parts
+        delay = SENDER_BUSY_DELAY
+        while True:
+            try:
+                if self.socket is None:
+                    self.connect()
+                self.socket.send_multipart(parts, copy=False)
+            except Exception as e:
+                print(e)
+                self.close()
+                # the message never left, the batch ends here: hand its shared memory slot back to the camera
+                FrameBatch(msg.get(FRAMES)).release()
+                return False
+
+            try:
+                reply = self.socket.recv_pyobj()
+            except Exception as e:
+                print(e)
+                # a REQ socket that missed its reply can't send again, start over on the next message
+                self.close()
+                return False
+
+            if reply != BUSY:
+                return True
+            sleep(delay)
+            delay = min(delay * 2, SENDER_BUSY_MAX_DELAY)
+
+    def connect(self):
+        self.socket = self.context.socket(zmq.REQ)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.setsockopt(zmq.IMMEDIATE, 1) #a send only leaves for a connected receiver, otherwise it times out
+        self.socket.RCVTIMEO = SENDER_ACK_TIMEOUT #so it suspends if the receiver didn't send a message in time
+        self.socket.SNDTIMEO = SENDER_ACK_TIMEOUT #nor waits forever for a receiver that never came up
+        self.socket.connect(self.link)
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+
+class ConnectionManager:
+    """
+    Process-wide owner of the zmq context and of one SenderController per (ip, port)
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.context = zmq.Context()
+        self.senders = {}
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    @classmethod
+    def getInstance(cls):
+        with cls._instance_lock:
+            # a forked worker must not reuse the parent's context and sockets
+            if cls._instance is None or cls._instance.pid != os.getpid():
+                cls._instance = ConnectionManager()
+            return cls._instance
+
+    def getSender(self, ip, port):
+        key = (ip, str(port))
+        with self.lock:
+            sender = self.senders.get(key)
+            if sender is None:
+                sender = SenderController(self.context, ip, port)
+                sender.start()
+                self.senders[key] = sender
+            return sender
+
+    def send(self, ip, port, msg, wait_ack=False):
+        """
+        Send a message to a receiver over its pooled connection
 
+        Args:
+            ip, port: Address of the receiver
+            msg: The message itself
+            wait_ack: False to send and forget, True to block until the receiver acknowledged it
 
+        Returns:
+            bool: Whether the message was queued (or acknowledged when wait_ack is set)
+        """
+        return self.getSender(ip, port).put(msg, wait_ack)
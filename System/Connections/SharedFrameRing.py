@@ -0,0 +1,213 @@
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from time import sleep, time
+
+import numpy as np
+
+from System.Connections.FrameBatch import grayStack
+from System.Data.CONSTANTS import *
+
+
+LOCAL_IPS = ("127.0.0.1", "localhost")
+
+
+class StaleFrames(Exception):
+    """The slot of a batch was reused by its camera while a stage was still reading it"""
+
+
+def isColocated():
+    """True when every pipeline node runs on this host, so frames can stay in shared memory"""
+    return all(ip in LOCAL_IPS for ip in (MASTERIP, DETECTIP, TRACKIP, CRASHIP))
+
+
+class SharedFrameRing:
+    """
+    Ring of batch slots in shared memory, one per camera
+
+    The camera writes each 30-frame batch into a free slot and the messages
+    between the nodes carry only the slot reference. The last stage that
+    reads the frames releases the slot so the camera can reuse it, as does
+    any stage the batch ends at early. Each slot also has room for the
+    grayscale frames, filled by the first stage that needs them and read
+    from there by the next ones.
+
+    Every acquire bumps the slot's generation, and a batch remembers the
+    generation it was written under: a late release of a batch whose slot
+    was reused frees nothing, and a reader can tell it read reused frames.
+    """
+
+    attached = {}  # name -> ring, rings opened by this process
+    attached_lock = threading.Lock()
+
+    def __init__(self, name, slots, batch_size, frame_height, frame_width, create=False):
+        self.name = name
+        self.slots = slots
+        self.batch_size = batch_size
+        self.frame_height = frame_height
+        self.frame_width = frame_width
+        self.owner = create
+
+        # per-slot state first, padded so the frames start on a cache line
+        header_size = (slots * 13 + 63) // 64 * 64
+        frames_size = slots * batch_size * frame_height * frame_width * 3
+        gray_size = slots * batch_size * frame_height * frame_width
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=header_size + frames_size + gray_size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # only the creator may unlink the block, don't let this process' tracker remove it on exit
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+
+        # 0 means free, otherwise the time the slot was taken
+        self.taken = np.ndarray((slots,), dtype=np.float64, buffer=self.shm.buf)
+        # bumped every time the slot is taken
+        self.generation = np.ndarray((slots,), dtype=np.uint32, buffer=self.shm.buf, offset=slots * 8)
+        # number of frames of the slot already converted to gray
+        self.gray_count = np.ndarray((slots,), dtype=np.uint8, buffer=self.shm.buf, offset=slots * 12)
+        self.frames = np.ndarray((slots, batch_size, frame_height, frame_width, 3), dtype=np.uint8,
+                                 buffer=self.shm.buf, offset=header_size)
+        self.gray = np.ndarray((slots, batch_size, frame_height, frame_width), dtype=np.uint8,
+                               buffer=self.shm.buf, offset=header_size + frames_size)
+        if create:
+            self.taken[:] = 0
+            self.generation[:] = 0
+            self.gray_count[:] = 0
+
+    @classmethod
+    def create(cls, camera_id, batch_size, frame_height, frame_width, slots=SHM_RING_SLOTS):
+        name = "argus_%s_%d" % (camera_id, int(time() * 1000))
+        return cls(name, slots, batch_size, frame_height, frame_width, create=True)
+
+    @classmethod
+    def attach(cls, name, slots, batch_size, frame_height, frame_width):
+        with cls.attached_lock:
+            ring = cls.attached.get(name)
+            if ring is None:
+                ring = cls(name, slots, batch_size, frame_height, frame_width)
+                cls.attached[name] = ring
+            return ring
+
+    def acquire(self, timeout=SHM_ACQUIRE_TIMEOUT):
+        """
+        Take a free slot, waiting up to timeout seconds for a stage to release one
+
+        Returns:
+            slot index, or None if every slot stayed busy
+        """
+        deadline = time() + timeout
+        while True:
+            now = time()
+            for slot in range(self.slots):
+                # a slot held longer than SHM_SLOT_STALE belongs to a batch some stage dropped
+                if self.taken[slot] == 0 or now - self.taken[slot] > SHM_SLOT_STALE:
+                    self.taken[slot] = now
+                    self.generation[slot] += 1
+                    self.gray_count[slot] = 0
+                    return slot
+            if now >= deadline:
+                return None
+            sleep(0.005)
+
+    def write(self, slot, frames):
+        """Copy a batch of frames into a slot and return the shared view of it"""
+        count = len(frames)
+        if isinstance(frames, np.ndarray):
+            self.frames[slot, :count] = frames
+        else:
+            for i in range(count):
+                self.frames[slot, i] = frames[i]
+        return self.batch(slot, count)
+
+    def batch(self, slot, count, generation=None):
+        return SharedFrames(self, slot, count, generation)
+
+    def release(self, slot, generation):
+        # the camera may have taken the slot again for a newer batch
+        if self.generation[slot] == generation:
+            self.taken[slot] = 0
+
+    def isIdle(self):
+        return not self.taken.any()
+
+    def describe(self):
+        return self.name, self.slots, self.batch_size, self.frame_height, self.frame_width
+
+    def close(self):
+        """Detach from the block, the creator also removes it once the stages are done with it"""
+        if self.owner:
+            deadline = time() + SHM_SLOT_STALE
+            while not self.isIdle() and time() < deadline:
+                sleep(0.05)
+        self.taken = None
+        self.generation = None
+        self.gray_count = None
+        self.frames = None
+        self.gray = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # a batch view is still referenced, the mapping goes away with it
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedFrames:
+    """
+    A batch of frames living in a SharedFrameRing slot
+
+    Behaves like the list of frames it replaces: len(), indexing and iteration
+    give views of the shared block without copying.
+    """
+
+    def __init__(self, ring, slot, count, generation=None):
+        self.ring = ring
+        self.slot = slot
+        self.count = count
+        self.generation = int(ring.generation[slot]) if generation is None else generation
+        self.array = ring.frames[slot, :count]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return self.array[index]
+
+    def __iter__(self):
+        return iter(self.array)
+
+    def grayFrames(self):
+        """(count, height, width) gray view of the batch, converted in place by the first caller"""
+        self.check()
+        gray = self.ring.gray[self.slot, :self.count]
+        if self.ring.gray_count[self.slot] < self.count:
+            grayStack(self.array, gray)
+            self.ring.gray_count[self.slot] = self.count
+        self.check()
+        return gray
+
+    def isCurrent(self):
+        return self.ring.generation is not None and self.ring.generation[self.slot] == self.generation
+
+    def check(self):
+        """Raise StaleFrames if the slot was reused, call it after reading the frames"""
+        if not self.isCurrent():
+            raise StaleFrames("slot %d of %s was reused" % (self.slot, self.ring.name))
+
+    def describe(self):
+        return self.ring.describe() + (self.slot, self.count, self.generation)
+
+    def release(self):
+        """Called by the last stage that reads the frames, or the one the batch ends at"""
+        if self.ring.generation is not None:
+            self.ring.release(self.slot, self.generation)
+
+    def __reduce__(self):
+        # pickled into a worker process: reattach to the block instead of copying the frames
+        return attachFrames, (self.describe(),)
+
+
+def attachFrames(description):
+    """Rebuild SharedFrames from SharedFrames.describe() in any process on this host"""
+    name, slots, batch_size, frame_height, frame_width, slot, count, generation = description
+    ring = SharedFrameRing.attach(name, slots, batch_size, frame_height, frame_width)
+    return ring.batch(slot, count, generation)
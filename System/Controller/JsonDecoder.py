@@ -1,12 +1,15 @@
 import threading
 from time import time
 
+from System.Connections.FrameBatch import FrameBatch
 from System.Controller.JsonEncoder import JsonEncoder
 from System.Data.CONSTANTS import *
 from System.Functions.Crashing import Crashing
 from System.Functions.Detection import Detection
+from System.Functions.DetectionBatcher import DetectionBatcher
 from System.Functions.Master import Master
 from System.Functions.Tracking import Tracking
+from System.Monitoring.Tracer import Tracer
 from System.NodeType import NodeType
 from VIF.vif import VIF
 
@@ -28,16 +31,17 @@ class JsonDecoder(threading.Thread):
         threading.Thread.__init__(self)
         self.sender_encode = JsonEncoder()
         self.yolo = None
+        self.batcher = None
         self.read_file = read_file
         self.tf = tf
         self.table = {}  # For performance tracking
+        self.tracer = Tracer.getInstance()
+        self.tracking = Tracking()  # keeps the cameras' trackers between batches
         
         # Initialize components based on node type
         if type == NodeType.Detetion and not read_file:
             if tf:
-                # Import here to avoid circular imports
-                from Car_Detection_TF.yolo import YOLO
-                self.yolo = YOLO()
+                self.initYolo()
         
         self.vif = None
         if NodeType.Crashing == type:
@@ -50,7 +54,15 @@ class JsonDecoder(threading.Thread):
         Args:
             message: Message to process
         """
-        self.decode(message)
+        if RECEIVED_TIME in message:
+            self.tracer.record("queue_wait", message.get(CAMERA_ID), message.get(STARTING_FRAME_ID),
+                               message[RECEIVED_TIME], time())
+        try:
+            self.decode(message)
+        except Exception:
+            # the batch ends here, hand its shared memory slot back to the camera
+            FrameBatch(message.get(FRAMES)).release()
+            raise
 
     def decode(self, msg):
         """
@@ -92,7 +104,7 @@ class JsonDecoder(threading.Thread):
         elif func == TRACK:  # 3rd step: track cars over frames
             camera_id = msg[CAMERA_ID]
             starting_frame_id = msg[STARTING_FRAME_ID]
-            frames = msg[FRAMES]
+            frames = FrameBatch(msg[FRAMES], msg.get(GRAY_FRAMES))
             frame_width = msg[FRAME_WIDTH]
             frame_height = msg[FRAME_HEIGHT]
             boxes = msg[BOXES]
@@ -107,7 +119,7 @@ class JsonDecoder(threading.Thread):
         elif func == CRASH:  # 4th step: check for crashes
             camera_id = msg[CAMERA_ID]
             starting_frame_id = msg[STARTING_FRAME_ID]
-            frames = msg[FRAMES]
+            frames = FrameBatch(msg[FRAMES], msg.get(GRAY_FRAMES))
             trackers = msg[TRACKERS]
             city = msg[CITY]
             district_no = msg[DISTRICT]
@@ -126,6 +138,7 @@ class JsonDecoder(threading.Thread):
             city = msg[CITY]
             district_no = msg[DISTRICT]
 
+            self.traceResult(msg)
             self.result(camera_id, starting_frame_id, crash_dimentions, city, district_no)
 
         elif func == SEARCH:  # Search for crash records
@@ -135,7 +148,9 @@ class JsonDecoder(threading.Thread):
             end_time = msg[END_TIME]
             city = msg[CITY]
             district = msg[DISTRICT]
-            self.query(start_date, end_date, start_time, end_time, city, district)
+            cursor = msg.get(CURSOR)
+            page_size = msg.get(PAGE_SIZE, QUERY_PAGE_SIZE)
+            self.query(start_date, end_date, start_time, end_time, city, district, cursor, page_size)
             
         elif func == REQ_VIDEO:  # Request crash video
             camera_id = msg[CAMERA_ID]
@@ -149,8 +164,10 @@ class JsonDecoder(threading.Thread):
         """
         Save frames and forward to detection step
         """
-        master = Master()
+        start_save_time = time()
+        master = Master.getInstance()
         master.saveFrames(camera_id, starting_frame_id, frames, frame_width, frame_height)
+        self.tracer.record("master_persist", camera_id, starting_frame_id, start_save_time, time())
         self.sender_encode.detect(camera_id, starting_frame_id, frames, frame_width, frame_height, 
                                   read_file, boxes_file, city, district_no)
 
@@ -162,31 +179,46 @@ class JsonDecoder(threading.Thread):
         
         # Initialize YOLO if needed
         if not read_file and self.yolo is None and self.tf:
-            from Car_Detection_TF.yolo import YOLO
-            self.yolo = YOLO()
+            self.initYolo()
 
         # Detect vehicles
-        detection = Detection(self.yolo)
+        detection = Detection(self.yolo, self.batcher)
         boxes = detection.detect(frames, frame_width, frame_height, read_file, 
                                 boxes_file, self.read_file, self.tf)
+        FrameBatch(frames).check()
 
         # Log performance and forward to tracking
+        self.tracer.record("detect", camera_id, starting_frame_id, start_detect_time, time())
         self.printLog("Detect", camera_id, start_detect_time, starting_frame_id+len(frames))
         self.sender_encode.track(camera_id, starting_frame_id, frames, boxes, 
                                 frame_width, frame_height, start_detect_time, city, district_no)
 
+    def initYolo(self):
+        """Load the model, and the batcher sharing it between cameras"""
+        # Import here to avoid circular imports
+        from Car_Detection_TF.yolo import YOLO
+        self.yolo = YOLO()
+        if Work_Detect_Batching:
+            self.batcher = DetectionBatcher(self.yolo)
+            self.batcher.start()
+
     def track(self, camera_id, starting_frame_id, frames, frame_width, frame_height, boxes, start_detect_time, end_detect_time, city, district_no):
         """
         Track vehicles across frames and forward to crash detection
         """
         start_track_time = time()
         
-        track = Tracking()
-        trackers = track.track(frames, boxes, frame_width, frame_height)
+        trackers = self.tracking.track(frames.grayFrames(), boxes, frame_width, frame_height, camera_id, starting_frame_id)
+        frames.check()
+        if len(trackers) < 2:
+            # no pair of vehicles to crash, the crash stage won't read the frames
+            frames.release()
         
+        self.tracer.record("track", camera_id, starting_frame_id, start_track_time, time())
         self.printLog("Track", camera_id, start_track_time, starting_frame_id+len(frames))
-        self.sender_encode.crash(camera_id, starting_frame_id, frames, trackers, 
-                                start_detect_time, end_detect_time, start_track_time, city, district_no)
+        color_frames, gray_frames = frames.messageFrames(Work_Crash_Gray_Only)
+        self.sender_encode.crash(camera_id, starting_frame_id, color_frames, trackers, 
+                                start_detect_time, end_detect_time, start_track_time, city, district_no, gray_frames)
 
     def crash(self, camera_id, starting_frame_id, frames, trackers, start_detect_time, end_detect_time, start_track_time, end_track_time, city, district_no):
         """
@@ -197,8 +229,16 @@ class JsonDecoder(threading.Thread):
 
         start_crash_time = time()
         crashing = Crashing(self.vif)
-        crash_dimentions = crashing.crash(frames, trackers)
+        try:
+            crash_dimentions = crashing.crash(frames, trackers)
+            if len(trackers) >= 2:
+                # with fewer the track stage already released the slot, and no frame was read
+                frames.check()
+        finally:
+            # last stage reading the frames, hand the shared memory slot back to the camera
+            frames.release()
         
+        self.tracer.record("crash", camera_id, starting_frame_id, start_crash_time, time())
         self.printLog("Crash", camera_id, start_crash_time, starting_frame_id+len(frames))
         self.sender_encode.result(camera_id, starting_frame_id, crash_dimentions, 
                                  start_detect_time, end_detect_time, start_track_time, 
@@ -208,22 +248,42 @@ class JsonDecoder(threading.Thread):
         """
         Process crash detection results
         """
-        master = Master()
+        start_result_time = time()
+        master = Master.getInstance()
         master.checkResult(camera_id, starting_frame_id, crash_dimentions, city, district_no)
+        self.tracer.record("master_result", camera_id, starting_frame_id, start_result_time, time())
+
+    def traceResult(self, msg):
+        """
+        Record the stage timings carried by a RESULT message, so the Master's
+        traces hold the whole pipeline of every batch
+        """
+        camera_id = msg[CAMERA_ID]
+        starting_frame_id = msg[STARTING_FRAME_ID]
+        stages = (("pipeline_detect", START_DETECT_TIME, END_DETECT_TIME),
+                  ("pipeline_detect_to_track", END_DETECT_TIME, START_TRACK_TIME),
+                  ("pipeline_track", START_TRACK_TIME, END_TRACK_TIME),
+                  ("pipeline_track_to_crash", END_TRACK_TIME, START_CRASH_TIME),
+                  ("pipeline_crash", START_CRASH_TIME, END_CRASH_TIME),
+                  ("pipeline_total", START_DETECT_TIME, END_CRASH_TIME))
+
+        for span, start_key, end_key in stages:
+            if msg.get(start_key) is not None and msg.get(end_key) is not None:
+                self.tracer.record(span, camera_id, starting_frame_id, msg[start_key], msg[end_key])
 
-    def query(self, start_date, end_date, start_time, end_time, city, district):
-        """Execute search query for crash records"""
-        master = Master()
-        master.executeQuery(start_date, end_date, start_time, end_time, city, district)
+    def query(self, start_date, end_date, start_time, end_time, city, district, cursor=None, page_size=QUERY_PAGE_SIZE):
+        """Execute search query for crash records, cursor continues a previous page"""
+        master = Master.getInstance()
+        master.executeQuery(start_date, end_date, start_time, end_time, city, district, cursor, page_size)
 
     def reqVideo(self, camera_id, starting_frame_id):
         """Request video for a specific crash"""
-        master = Master()
+        master = Master.getInstance()
         master.sendVideoToGUI(camera_id, starting_frame_id)
 
     def sendRecentCrashes(self):
         """Retrieve and send recent crash records"""
-        master = Master()
+        master = Master.getInstance()
         master.sendRecentCrashesToGUI()
 
     def printLog(self, Module, camera_id, starting_time, number_of_frames):
@@ -2,7 +2,7 @@ import json
 import pickle as pickle
 from time import time
 
-from System.Connections.SenderController import SenderController
+from System.Connections.SenderController import ConnectionManager
 from System.Data.CONSTANTS import *
 
 
@@ -13,11 +13,8 @@ class JsonEncoder:
 
 
     def send(self,ip,port,json,use_treading = True):
-        thread = SenderController(ip,port,json)
-        if use_treading:
-            thread.start()
-        else:
-            thread.run()
+        # use_treading sends and forgets, otherwise wait for the receiver's ack
+        return ConnectionManager.getInstance().send(ip,port,json,wait_ack=not use_treading)
 
     def feed(self,camera_id,starting_frame_id,frames,frame_width,frame_height,read_file,boxes,city,district_no):
         func = FEED
@@ -49,12 +46,13 @@ class JsonEncoder:
 
         self.send(DETECTIP, DETECTPORT, sendingMsg)
 
-    def track(self,camera_id, starting_frame_id, frames, boxes,frame_width,frame_height,start_detect_time,city,district_no):
+    def track(self,camera_id, starting_frame_id, frames, boxes,frame_width,frame_height,start_detect_time,city,district_no,gray_frames=None):
         func = TRACK
         sendingMsg = {FUNCTION: func,
                       CAMERA_ID: camera_id,
                       STARTING_FRAME_ID: starting_frame_id,
                       FRAMES: frames,
+                      GRAY_FRAMES: gray_frames,
                       BOXES: boxes,
                       CITY: city,
                       DISTRICT: district_no,
@@ -65,12 +63,13 @@ class JsonEncoder:
 
         self.send(TRACKIP, TRACKPORT, sendingMsg)
 
-    def crash(self,camera_id, starting_frame_id, frames, trackers,start_detect_time,end_detect_time,start_track_time,city,district_no):
+    def crash(self,camera_id, starting_frame_id, frames, trackers,start_detect_time,end_detect_time,start_track_time,city,district_no,gray_frames=None):
         func = CRASH
         sendingMsg = {FUNCTION: func,
                       CAMERA_ID: camera_id,
                       STARTING_FRAME_ID: starting_frame_id,
                       FRAMES: frames,
+                      GRAY_FRAMES: gray_frames,
                       TRACKERS: trackers,
                       CITY: city,
                       DISTRICT: district_no,
@@ -120,7 +119,7 @@ class JsonEncoder:
     #
     #     self.send(MASTERIP, MASTERPORT, sendingMsg)
 
-    def requestData(self, start_date, end_date, start_time, end_time, city, district):
+    def requestData(self, start_date, end_date, start_time, end_time, city, district, cursor=None, page_size=QUERY_PAGE_SIZE):
         func = SEARCH
         sendingMsg = {FUNCTION: func,
                       START_DATE: start_date,
@@ -128,14 +127,17 @@ class JsonEncoder:
                       START_TIME: start_time,
                       END_TIME: end_time,
                       CITY: city,
-                      DISTRICT: district}
+                      DISTRICT: district,
+                      CURSOR: cursor,
+                      PAGE_SIZE: page_size}
 
         self.send(MASTERIP, MASTERPORT, sendingMsg)
 
-    def replyQuery(self,list_of_crashes):
+    def replyQuery(self,list_of_crashes,next_cursor=None):
         func = REP_QUERY
         sendingMsg = {FUNCTION: func,
-                      LIST_OF_CRASHES: list_of_crashes}
+                      LIST_OF_CRASHES: list_of_crashes,
+                      NEXT_CURSOR: next_cursor}
 
         self.send(GUIIP, GUIPORT, sendingMsg) #change the address later
     def requestVideo(self, camera_id, starting_frame_id):
@@ -147,9 +149,14 @@ class JsonEncoder:
         self.send(MASTERIP, MASTERPORT, sendingMsg)
 
 
-    def replyVideo(self,frames):
+    def replyVideo(self,camera_id,starting_frame_id,chunk_no,frames,last_chunk):
+        # frames: JPEG bytes of one chunk of the video, each sent as its own message part
         func = REP_VIDEO
         sendingMsg = {FUNCTION:func,
+                      CAMERA_ID:camera_id,
+                      STARTING_FRAME_ID:starting_frame_id,
+                      CHUNK_NO:chunk_no,
+                      LAST_CHUNK:last_chunk,
                       FRAMES:frames}
 
         self.send(GUIIP,GUIPORT,sendingMsg)
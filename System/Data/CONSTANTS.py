@@ -24,6 +24,11 @@ START_DATE = "START_DATE"
 END_DATE = "END_DATE"
 START_TIME = "START_TIME"
 END_TIME = "END_TIME"
+CURSOR = "CURSOR"
+NEXT_CURSOR = "NEXT_CURSOR"
+PAGE_SIZE = "PAGE_SIZE"
+CHUNK_NO = "CHUNK_NO"
+LAST_CHUNK = "LAST_CHUNK"
 
 MASTERIP = "127.0.0.1"
 DETECTIP = "127.0.0.1" # di
@@ -38,10 +43,35 @@ TRACKPORT = "10004"
 CRASHPORT = "10008"
 GUIPORT = "10010"
 
+SENDER_QUEUE_SIZE = 8 # messages waiting per destination before send blocks
+SENDER_ACK_TIMEOUT = 10000 # ms to wait for any answer before reconnecting, only a dead receiver takes this long: a busy one answers BUSY
+SENDER_BUSY_DELAY = 0.05 # s before a message the receiver was too busy for is sent again, doubled every time
+SENDER_BUSY_MAX_DELAY = 1.0 # s the delay doubles up to
+BUSY = "BUSY" # what a receiver answers instead of the empty ack for a message it can't take yet
+RECEIVER_WORKERS = 4 # size of the pool decoding received messages
+RECEIVER_INFLIGHT_PER_CAMERA = 1 # batches of one camera decoded at the same time (1 keeps them in order)
+RECEIVER_QUEUE_PER_CAMERA = 2 # acked batches waiting per camera before senders are held back
+RECEIVER_POLL_TIMEOUT = 5 # ms between checks for finished work
+RECEIVER_PARKED_PER_CAMERA = 4 # unacked messages held per camera, more are answered BUSY at once
+RECEIVER_PARK_TIMEOUT = 5 # s a message is held unacked before it is answered BUSY, well under SENDER_ACK_TIMEOUT
+
+SHM_RING_SLOTS = 8 # batches per camera kept in shared memory
+SHM_ACQUIRE_TIMEOUT = 1.0 # s the camera waits for a free slot before sending the frames inline
+SHM_SLOT_STALE = 30 # s after which a slot nobody released is reused
+
+DETECT_BATCH_SIZE = 8 # camera frames detected in one model run
+DETECT_BATCH_WINDOW = 0.02 # s the batcher waits for other cameras after the first frame
+
+TRACE_DIR = "traces" # where every node writes its latency snapshot
+TRACE_EXPORT_INTERVAL = 10 # s between snapshots
+TRACE_RECENT_BATCHES = 1000 # batches whose individual spans are kept
+TRACE_HTTP_PORT_OFFSET = 1000 # metrics endpoint listens on the node port + this offset
+
 
 CAMERA_ID = "CAMERA_ID"
 STARTING_FRAME_ID = "STARTING_FRAME_ID"
 FRAMES = "FRAMES"
+GRAY_FRAMES = "GRAY_FRAMES"
 TRACKERS = "TRACKERS"
 FRAME_WIDTH = "FRAME_WIDTH"
 FRAME_HEIGHT = "FRAME_HEIGHT"
@@ -55,16 +85,59 @@ START_CRASH_TIME = "START_CRASH_TIME"
 END_DETECT_TIME = "END_DETECT_TIME"
 END_TRACK_TIME = "END_TRACK_TIME"
 END_CRASH_TIME = "END_CRASH_TIME"
+RECEIVED_TIME = "RECEIVED_TIME"
+
+BATCH_SIZE = 30 # frames sent through the pipeline together
+BATCH_STEP = 15 # a new batch starts every BATCH_STEP frames, overlapping the previous one
+CAMERA_RING_SEGMENTS = 4 # BATCH_STEP segments kept by a camera's frame ring
+TRACK_IOU_THRESHOLD = 0.3 # least IoU of a detection with a kept tracker to continue it in the next batch
+CAPTURE_QUEUE_SIZE = 8 # frames decoded ahead of the camera
+CAPTURE_RECONNECT_ATTEMPTS = 5 # times a dropped live stream is reopened before the camera stops
+CAPTURE_RECONNECT_DELAY = 2.0 # s between reopening attempts
+FLEET_REPORT_INTERVAL = 5 # s between the camera fleet's fps reports
+FLEET_RESTART_DELAY = 5 # s before a failed camera of the fleet is started again
+FLEET_RESTART_MAX_DELAY = 300 # s the restart delay doubles up to while a camera keeps failing right away
+FLEET_QUICK_FAILURE = 60 # s a camera must run for its failure not to count as failing right away
+FLEET_MAX_QUICK_FAILURES = 5 # failures right after starting before the camera is marked failed
+
+SEGMENT_DIR = "saved_frames_seg" # Master's archive of the cameras' frames
+SEGMENT_FRAMES = 1800 # frames per segment file, a minute of a 30 fps camera
+SEGMENT_RETENTION = 60 # segments kept per camera, the oldest is deleted first
+SEGMENT_ENCODING = "jpg" # "jpg" or "raw" frames in the segments
+SEGMENT_JPEG_QUALITY = 90
+CRASH_DB = "crash_records.db" # SQLite store of the crash records
+CRASH_RECORDS_JSON = "crash_records.json" # older crash records, imported into an empty CRASH_DB
+QUERY_PAGE_SIZE = 20 # crash records per query reply
+VIDEO_CHUNK_FRAMES = 15 # JPEG frames per message of a streamed crash video
+THUMBNAIL_CACHE_SIZE = 256 # crash thumbnails the Master keeps in memory
+THUMBNAIL_JPEG_QUALITY = 85
+NOTIFICATION_WINDOW = 30 # s during which more crashes of a camera are coalesced into its next alert
+NOTIFICATION_RATE = 1.0 # alerts per second the dispatcher sends at most
+NOTIFICATION_BURST = 5 # alerts that can be sent at once before the rate applies
+NOTIFICATION_MAX_RETRIES = 5 # attempts after a failed alert before it is dropped
+NOTIFICATION_RETRY_DELAY = 2.0 # s before the first retry, doubled for every next one
+NOTIFICATION_TIMEOUT = 10 # s before a webhook alert counts as failed
+WRITER_WORKERS = 4 # threads writing the Master's segments and crash clips, a camera always uses the same one
+WRITER_QUEUE_PER_CAMERA = 4 # background writes a camera may have waiting before the Master blocks on the next one
 
 PRE_FRAMES_NO = 2
 NEXT_FRAMES_NO = 2
 TOTAL_FRAMES_NO = PRE_FRAMES_NO + NEXT_FRAMES_NO + 1
+FRAME_CACHE_FRAMES = 300 # recent frames per camera the Master keeps in memory for crash clips, results lag the feed
+FRAME_CACHE_BYTES = 512 * 1024 * 1024 # memory budget of the Master's frame cache for all the cameras
 
 
 REQ_VIDEO = "REQ_VIDEO"
 RECENT_CRASHES = "RECENT_CRASHES"
 
 Work_Detect_Files = True # use files instead of yolo
+Work_Detect_Batching = True # run yolo on the frames of several cameras at once
 Work_Tracker_Type_Mosse = True # use Mosse tracker instead of Dlib taracker
 Work_Tracker_Interpolation = True #optimize performance by stop tracking stopped vehicles
+Work_Tracker_Batched = True # update the Mosse trackers of a frame together (MosseEngine)
+Work_Tracker_Size_Step = 1 # round Mosse windows up to multiples of this, e.g. 16, so more trackers share a size and are batched
 Work_Crash_Estimation_Only = False #without using crash detection module (ViF descriptor)
+Work_Crash_Gray_Only = True # send the crash node only the gray frames it works on, its saved tracking clips are then gray
+Work_Shared_Memory = True # keep frames in shared memory when all nodes run on one host
+Work_Crash_Process_Pool = True # decode crash messages on a process pool, Horn-Schunck is CPU-bound; only for shared memory batches, inline frames would be copied into the worker, so those stay on threads
+Work_Trace_Http = False # serve the latency snapshot over http besides writing it to TRACE_DIR
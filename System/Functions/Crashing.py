@@ -1,8 +1,48 @@
-import cv2
+from itertools import combinations
+
+import numpy as np
 
-from Mosse_Tracker.TrackerManager import TrackerType
 from System.Data.CONSTANTS import Work_Crash_Estimation_Only
 
+PROBE_FRAMES = (16, 19, 22, 25, 28) # frames of the batch where the trackers' predicted centers are compared
+
+
+def candidatePairs(boxes):
+    """
+    Pairs of overlapping boxes, found through a uniform grid instead of comparing all pairs
+
+    Args:
+        boxes: (n, 4) array of xmin, ymin, xmax, ymax
+
+    Returns:
+        ia, ib: indices of the overlapping boxes, ia < ib, sorted
+    """
+    if len(boxes) < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # cells about the size of a typical box, so most boxes fall in a few cells
+    extent = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+    cell = max(float(np.median(extent)), 1.0)
+    cells = np.floor(boxes / cell).astype(np.int64)
+
+    grid = {}
+    for index, (xmin, ymin, xmax, ymax) in enumerate(cells.tolist()):
+        for x in range(xmin, xmax + 1):
+            for y in range(ymin, ymax + 1):
+                grid.setdefault((x, y), []).append(index)
+
+    pairs = set()
+    for members in grid.values():
+        pairs.update(combinations(members, 2))
+    if not pairs:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    pairs = np.array(sorted(pairs), dtype=np.int64)
+    ia, ib = pairs[:, 0], pairs[:, 1]
+    overlap = ((boxes[ia, 0] <= boxes[ib, 2]) & (boxes[ib, 0] <= boxes[ia, 2]) &
+               (boxes[ia, 1] <= boxes[ib, 3]) & (boxes[ib, 1] <= boxes[ia, 3]))
+    return ia[overlap], ib[overlap]
+
 
 class Crashing:
     """
@@ -12,45 +52,26 @@ class Crashing:
     def __init__(self, vif):
         self.vif = vif
 
-    def crash(self, frames, trackers):
+    def crash(self, frames, tracks):
         """
         Main crash detection method that analyzes trackers for possible collisions
         
         Args:
-            frames: List of video frames
-            trackers: List of vehicle trackers
+            frames: FrameBatch of the video frames
+            tracks: TrackSet of the vehicle trackers
             
         Returns:
             crash_dimensions: Coordinates of crash area or empty list if no crash
         """
         crash_dimensions = []
 
-        # Check all tracker pairs for potential collisions
-        for i in range(len(trackers)):
-            for j in range(i + 1, len(trackers)):
-                if i == j:
-                    continue
-                    
-                tracker_A = trackers[i]
-                tracker_B = trackers[j]
-
-                # Calculate distance threshold based on vehicle sizes
-                asize = pow(pow(tracker_A.vehicle_height, 2) + pow(tracker_A.vehicle_width, 2), 0.5) * .25
-                bsize = pow(pow(tracker_B.vehicle_height, 2) + pow(tracker_B.vehicle_width, 2), 0.5) * .25
-                distance_threshold = asize + bsize
-
-                # Check for collisions at different time points
-                if (self.checkDistance(tracker_A, tracker_B, 16, distance_threshold) or
-                    self.checkDistance(tracker_A, tracker_B, 19, distance_threshold) or
-                    self.checkDistance(tracker_A, tracker_B, 22, distance_threshold) or
-                    self.checkDistance(tracker_A, tracker_B, 25, distance_threshold) or
-                    self.checkDistance(tracker_A, tracker_B, 28, distance_threshold)):
-                
-                    # Handle crash detection based on configuration
-                    if Work_Crash_Estimation_Only:
-                        self.crashEstimation(crash_dimensions, tracker_A, tracker_B, frames)
-                    else:
-                        crash_dimensions.extend(self.predict(frames, [tracker_B, tracker_A]))
+        # Check the tracker pairs that may collide
+        for i, j in self.collidingPairs(tracks):
+            # Handle crash detection based on configuration
+            if Work_Crash_Estimation_Only:
+                self.crashEstimation(crash_dimensions, tracks, [i, j], frames.grayFrames())
+            else:
+                crash_dimensions.extend(self.predict(frames, tracks, [j, i]))
 
         # Combine crash areas if multiple crashes detected
         if len(crash_dimensions) > 0:
@@ -62,70 +83,65 @@ class Crashing:
 
         return crash_dimensions
 
-    def checkDistance(self, tracker_A, tracker_B, frame_no, distance_threshold):
-        """
-        Check if two trackers are in collision at a specific frame
-        
-        Args:
-            tracker_A, tracker_B: The two trackers to check
-            frame_no: The frame number to check
-            distance_threshold: Minimum distance for collision
-            
-        Returns:
-            bool: True if collision detected, False otherwise
+    def collidingPairs(self, tracks):
         """
-        # Skip if neither vehicle is moving fast enough
-        if not tracker_A.isAboveSpeedLimit(frame_no - 10, frame_no) and not tracker_B.isAboveSpeedLimit(frame_no - 10, frame_no):
-            return False
-
-        # Get predicted positions
-        xa, ya = tracker_A.estimationFutureCenter[frame_no]
-        xb, yb = tracker_B.estimationFutureCenter[frame_no]
-        
-        # Calculate distance between predicted positions
-        r = pow(pow(xa - xb, 2) + pow(ya - yb, 2), 0.5)
-
-        # Direct collision if distance is zero
-        if r == 0:
-            return True
-        # Not a collision if distance is greater than threshold
-        elif r > distance_threshold:
-            return False
-
-        # Get actual positions
-        if tracker_A.tracker_type == TrackerType.MOSSE:
-            xa_actual, ya_actual = tracker_A.tracker.centers[frame_no]
-            xb_actual, yb_actual = tracker_B.tracker.centers[frame_no]
-        else:
-            xa_actual, ya_actual = tracker_A.get_position(tracker_A.history[frame_no])
-            xb_actual, yb_actual = tracker_B.get_position(tracker_B.history[frame_no])
-            
-        # Calculate difference between actual and predicted positions
-        difference_trackerA_actual_to_estimate = pow(pow(xa_actual - xa, 2) + pow(ya_actual - ya, 2), 0.5)
-        difference_trackerB_actual_to_estimate = pow(pow(xb_actual - xb, 2) + pow(yb_actual - yb, 2), 0.5)
-        max_difference = max(difference_trackerA_actual_to_estimate, difference_trackerB_actual_to_estimate)
+        Pairs of tracks in collision at any of the PROBE_FRAMES
 
-        # If the difference is significant compared to the distance, consider it a collision
-        return max_difference / r > 0.5
+        Broad phase: each track's predicted centers over the probe frames,
+        grown by a quarter of its diagonal, make a box. Two tracks can only
+        be closer than the sum of their quarter diagonals if their boxes
+        overlap, so only pairs found together in a uniform grid of the boxes
+        are checked. Narrow phase: for all of those pairs and probe frames at
+        once, a collision is a predicted distance of zero, or one under the
+        threshold that is small next to how far the prediction is off,
+        while either vehicle is above the speed limit.
 
-    def predict(self, frames_RGB, trackers):
+        Returns:
+            (i, j) rows of the colliding tracks, i < j, in order
+        """
+        if len(tracks) < 2:
+            return []
+
+        estimated = tracks.predicted[:, PROBE_FRAMES]
+        size = tracks.vehicleSizes()
+        boxes = np.hstack([estimated.min(axis=1) - size[:, None], estimated.max(axis=1) + size[:, None]])
+        ia, ib = candidatePairs(boxes)
+        if len(ia) == 0:
+            return []
+
+        above_speed_limit = np.stack([tracks.isAboveSpeedLimit(frame_no - 10, frame_no) for frame_no in PROBE_FRAMES], axis=1)
+        actual = tracks.centers[:, PROBE_FRAMES].astype(np.float64)
+
+        r = np.linalg.norm(estimated[ia] - estimated[ib], axis=2)
+        distance_threshold = (size[ia] + size[ib])[:, None]
+        max_difference = np.maximum(np.linalg.norm(actual[ia] - estimated[ia], axis=2),
+                                    np.linalg.norm(actual[ib] - estimated[ib], axis=2))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            collision = (r == 0) | ((r <= distance_threshold) & (max_difference / r > 0.5))
+        collision &= above_speed_limit[ia] | above_speed_limit[ib]
+
+        colliding = collision.any(axis=1)
+        return list(zip(ia[colliding].tolist(), ib[colliding].tolist()))
+
+    def predict(self, frames, tracks, rows):
         """
         Use VIF model to predict if a crash occurred
         
         Args:
-            frames_RGB: List of color video frames
-            trackers: List of vehicle trackers
+            frames: FrameBatch of the video frames
+            tracks: TrackSet of the vehicle trackers
+            rows: rows of the tracks to check
             
         Returns:
             crash_dimensions: Coordinates of crash areas
         """
-        gray_frames = self.convertToGrayFrames(frames_RGB)
+        gray_frames = frames.grayFrames()
         no_crash = 0
         crash = 0
         crash_dimensions = []
         
-        for tracker in trackers:
-            tracker_frames, width, height, xmin, xmax, ymin, ymax = tracker.getFramesOfTracking(gray_frames)
+        for row in rows:
+            tracker_frames, width, height, xmin, xmax, ymin, ymax = tracks.framesOfTracking(row, gray_frames)
             crash_dimensions.append([xmin, ymin, xmax, ymax])
 
             # Skip if frames couldn't be extracted or frame is too small
@@ -146,7 +162,7 @@ class Crashing:
                 no_crash += 1
             else:
                 crash += 1
-                tracker.saveTracking(frames_RGB)
+                tracks.saveTracking(row, frames.colorFrames())
 
         # Return empty list if no crash detected
         if crash == 0:
@@ -154,32 +170,18 @@ class Crashing:
             
         return crash_dimensions
 
-    def convertToGrayFrames(self, frames_RGB):
-        """Convert RGB frames to grayscale"""
-        gray_frames = []
-        for frame in frames_RGB:
-            gray_frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
-        return gray_frames
-
-    def crashEstimation(self, crash_dimensions, tracker_A, tracker_B, frames):
+    def crashEstimation(self, crash_dimensions, tracks, rows, gray_frames):
         """
         Estimate crash dimensions based on trackers without using VIF model
         
         Args:
             crash_dimensions: List to store crash areas
-            tracker_A, tracker_B: The two trackers involved in crash
-            frames: List of video frames
+            tracks: TrackSet of the vehicle trackers
+            rows: rows of the two tracks involved in crash
+            gray_frames: Gray video frames
         """
-        # Process first tracker
-        tracker_frames, width, height, xmin, xmax, ymin, ymax = tracker_A.getFramesOfTracking(
-            self.convertToGrayFrames(frames))
-            
-        if not (xmax - xmin < 50 or ymax - ymin <= 28 or (ymax - ymin) / (xmax - xmin) < 0.35):
-            crash_dimensions.extend([[xmin, ymin, xmax, ymax]])
-            
-        # Process second tracker
-        tracker_frames, width, height, xmin, xmax, ymin, ymax = tracker_B.getFramesOfTracking(
-            self.convertToGrayFrames(frames))
-            
-        if not (xmax - xmin < 50 or ymax - ymin <= 28 or (ymax - ymin) / (xmax - xmin) < 0.35):
-            crash_dimensions.extend([[xmin, ymin, xmax, ymax]])
\ No newline at end of file
+        for row in rows:
+            tracker_frames, width, height, xmin, xmax, ymin, ymax = tracks.framesOfTracking(row, gray_frames)
+
+            if not (xmax - xmin < 50 or ymax - ymin <= 28 or (ymax - ymin) / (xmax - xmin) < 0.35):
+                crash_dimensions.extend([[xmin, ymin, xmax, ymax]])
@@ -1,19 +1,18 @@
-import cv2
-from PIL import Image
-
 class Detection:
     """
     Class responsible for vehicle detection using YOLO or file-based detection
     """
     
-    def __init__(self, yolo):
+    def __init__(self, yolo, batcher=None):
         """
         Initialize detector
         
         Args:
             yolo: YOLO model instance for detection
+            batcher: DetectionBatcher sharing the model runs between cameras
         """
         self.yolo = yolo
+        self.batcher = batcher
 
     def detect(self, frames, frame_width, frame_height, read_file, boxes_file=None, read_file_self=False, tf=True):
         """
@@ -29,7 +28,7 @@ class Detection:
             tf: Use TensorFlow model for detection
             
         Returns:
-            boxes: List of detected vehicle bounding boxes
+            boxes: [class, left, right, top, bottom, score] rows of the detected vehicles
         """
         boxes = []
         
@@ -37,10 +36,12 @@ class Detection:
         if read_file_self:
             # Use pre-determined boxes from file
             boxes = boxes_file
+        elif tf and self.batcher is not None:
+            # Batch the first frame with the other cameras' frames
+            boxes = self.batcher.submit(frames[0])
         elif tf:
-            # Use TensorFlow YOLO model for detection
-            img = Image.fromarray(frames[0])
-            _, boxes = self.yolo.detect_image(img)
+            # Use TensorFlow YOLO model for detection, without drawing the results
+            boxes = self.yolo.detect_array(frames[0])
         else:
             # This branch has been removed as PyTorch detection is not supported
             raise NotImplementedError("PyTorch detection has been removed")
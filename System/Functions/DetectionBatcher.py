@@ -0,0 +1,59 @@
+import queue
+import threading
+from concurrent.futures import Future
+from time import time
+
+from System.Data.CONSTANTS import DETECT_BATCH_SIZE, DETECT_BATCH_WINDOW
+
+
+class DetectionBatcher(threading.Thread):
+    """
+    Gathers the frames of several cameras into one YOLO run
+
+    Each Detect worker thread submits the first frame of its batch and waits.
+    The batcher takes whatever arrived within DETECT_BATCH_WINDOW seconds of
+    the first frame (up to DETECT_BATCH_SIZE frames), runs the model once on
+    all of them and hands every camera its own boxes back.
+    """
+
+    def __init__(self, yolo, batch_size=DETECT_BATCH_SIZE, window=DETECT_BATCH_WINDOW):
+        threading.Thread.__init__(self, daemon=True)
+        self.yolo = yolo
+        self.batch_size = min(batch_size, yolo.max_batch_size)
+        self.window = window
+        self.pending = queue.Queue()
+
+    def submit(self, frame):
+        """
+        Detect vehicles in one frame, sharing the model run with other cameras
+
+        Returns:
+            boxes: YOLO.detect_array rows of the frame
+        """
+        future = Future()
+        self.pending.put((frame, future))
+        return future.result()
+
+    def run(self):
+        while True:
+            batch = [self.pending.get()]
+            deadline = time() + self.window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            frames = [frame for frame, _ in batch]
+            try:
+                results = self.yolo.detect_batch(frames)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), boxes in zip(batch, results):
+                future.set_result(boxes)
@@ -1,38 +1,60 @@
 import os
+import threading
 import cv2
+import numpy as np
 from datetime import datetime
-import json
 
+from System.Connections.SharedFrameRing import SharedFrames
 from System.Controller.JsonEncoder import JsonEncoder
 from System.Data.CONSTANTS import *
-from System.Notifications.twilio_handler import TwilioHandler
+from System.Notifications.NotificationDispatcher import NotificationDispatcher, defaultSink
+from System.Storage.CrashStore import CrashStore
+from System.Storage.FrameCache import FrameCache
+from System.Storage.MjpegReader import readJpegFrames
+from System.Storage.SegmentStore import SegmentStore
+from System.Storage.ThumbnailCache import ThumbnailCache
+from System.Storage.WriterPool import WriterPool
 
 
 class Master:
+    _instance = None
+    _instance_lock = threading.Lock()
+
     def __init__(self):
-        # Replace database with in-memory storage
-        self.twilio_handler = TwilioHandler()
-        self.crash_records = []
-        self.saved_frames = {}  # camera_id -> {frame_id -> frames}
+        self.notifier = NotificationDispatcher(defaultSink())
+        self.notifier.start()
+        self.crash_store = CrashStore()
+        self.frame_store = SegmentStore()
+        self.frame_cache = FrameCache()
+        self.writers = WriterPool()
+        self.thumbnails = ThumbnailCache()
+        self.pid = os.getpid()
         
         # Create directory for saved videos if it doesn't exist
         if not os.path.exists('saved_crash_vid'):
             os.makedirs('saved_crash_vid')
-        if not os.path.exists('saved_frames_vid'):
-            os.makedirs('saved_frames_vid')
+
+    @classmethod
+    def getInstance(cls):
+        """The Master of this process, its frame store and crash records are shared by all the decoders"""
+        with cls._instance_lock:
+            if cls._instance is None or cls._instance.pid != os.getpid():
+                cls._instance = Master()
+            return cls._instance
 
     def saveFrames(self, camera_id, starting_frame_id, frames, frame_width, frame_height):
-        """Store frames in file system"""
-        self.write(camera_id, frames, starting_frame_id, frame_width, frame_height, False)
-        
-        # Store frame info in memory
-        if camera_id not in self.saved_frames:
-            self.saved_frames[camera_id] = {}
-        self.saved_frames[camera_id][starting_frame_id] = True
+        """Keep the frames in memory for crash clips and append them to the camera's segments in the background"""
+        if isinstance(frames, SharedFrames):
+            # the camera reuses the slot once the pipeline is done with it, the writer may run later
+            copied = frames.array.copy()
+            frames.check()
+            frames = copied
+        self.frame_cache.put(camera_id, starting_frame_id, frames)
+        self.writers.submit(camera_id, self.frame_store.append, camera_id, starting_frame_id, frames)
 
-    def write(self, camera_id, frames, starting_frame_id, frame_width, frame_height, is_crash=False):
-        """Write frames to video file"""
-        folder = "saved_crash_vid" if is_crash else "saved_frames_vid"
+    def write(self, camera_id, frames, starting_frame_id, frame_width, frame_height):
+        """Write crash frames to video file"""
+        folder = "saved_crash_vid"
 
         file_path = f'./{folder}/({camera_id}) {starting_frame_id}.avi'
         if not os.path.exists(folder):
@@ -45,10 +67,17 @@ class Master:
             
         out.release()
 
-    def getVideoFrames(self, camera_id, frame_id, is_crash=False):
-        """Retrieve frames from video file"""
-        folder = "saved_crash_vid" if is_crash else "saved_frames_vid"
-        file_path = f'./{folder}/({camera_id}) {frame_id}.avi'
+    def getVideoFrames(self, camera_id, frame_id, is_crash=False, count=BATCH_SIZE):
+        """Retrieve count frames from frame_id on, or the crash video starting at frame_id"""
+        if not is_crash:
+            frames = self.frame_cache.read(camera_id, frame_id, count)
+            if frames is None:
+                self.writers.flush(camera_id)
+                frames = self.frame_store.read(camera_id, frame_id, count)
+            return frames
+
+        self.writers.flush(camera_id)
+        file_path = f'./saved_crash_vid/({camera_id}) {frame_id}.avi'
         
         cap = cv2.VideoCapture(file_path)
         frames = []
@@ -63,20 +92,18 @@ class Master:
         return frames
 
     def recordCrash(self, camera_id, starting_frame_id, crash_dimensions):
-        """Record crash event with visual marking"""
-        new_frames = []
+        """Record crash event with visual marking, returns 0 if its frames can't be found"""
+        # Collect the frames of the batch and of up to PRE_FRAMES_NO batches of 30 before it
         from_no_of_times = PRE_FRAMES_NO
-
-        # Collect frames from previous segments
-        while from_no_of_times >= 0:
-            last_frames = from_no_of_times * 30
-            new_frames_id = starting_frame_id - last_frames
-            if new_frames_id > 0:
-                new_frames.extend(self.getVideoFrames(camera_id, new_frames_id, False))
-                frame_width = len(new_frames[0][0])
-                frame_height = len(new_frames[0])
-
+        while starting_frame_id - from_no_of_times * 30 <= 0:
             from_no_of_times -= 1
+        first_frame_id = starting_frame_id - from_no_of_times * 30
+        new_frames = self.getVideoFrames(camera_id, first_frame_id, False, starting_frame_id + 30 - first_frame_id)
+        if not new_frames:
+            print(f"No frames of camera {camera_id} from {first_frame_id} to record crash {starting_frame_id}")
+            return 0
+        frame_width = len(new_frames[0][0])
+        frame_height = len(new_frames[0])
 
         # Unpack crash dimensions
         xmin, ymin, xmax, ymax = crash_dimensions
@@ -102,8 +129,11 @@ class Master:
             cv2.rectangle(new_frames[i], (xmin, ymin), (xmax, ymax), (0, 0, 255), fill)
             cv2.putText(new_frames[i], "Crash!", (12, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 4)
 
-        # Save crash video
-        self.write(camera_id, new_frames, starting_frame_id, frame_width, frame_height, True)
+        # The thumbnail is the clip's frame 89 (or its last one), saved now so alerts don't wait for the clip
+        self.thumbnails.save(camera_id, starting_frame_id, new_frames[min(89, len(new_frames) - 1)])
+
+        # Save crash video in the background, readers of the clip flush the camera's writes first
+        self.writers.submit(camera_id, self.write, camera_id, new_frames, starting_frame_id, frame_width, frame_height)
         return no_of_frames
 
     def checkResult(self, camera_id, starting_frame_id, crash_dimentions, city, district_no):
@@ -112,8 +142,10 @@ class Master:
             return
             
         no_of_from_no = self.recordCrash(camera_id, starting_frame_id, crash_dimentions)
+        if no_of_from_no == 0:
+            return
         
-        # Store crash record in memory
+        # Store crash record
         crash_time = datetime.utcnow()
         crash_record = {
             'camera_id': camera_id,
@@ -123,85 +155,47 @@ class Master:
             'district': district_no,
             'crash_time': crash_time.strftime("%Y-%m-%d %H:%M:%S")
         }
-        self.crash_records.append(crash_record)
-        
-        # Save crash records for persistence
-        self._save_crash_records()
+        self.crash_store.add(crash_record)
         
         # Send notification
         self.sendNotification(camera_id, starting_frame_id, city, district_no)
 
-    def _save_crash_records(self):
-        """Save crash records to a JSON file"""
-        try:
-            with open('crash_records.json', 'w') as f:
-                json.dump(self.crash_records, f, indent=2)
-        except Exception as e:
-            print(f"Error saving crash records: {e}")
-            
-    def _load_crash_records(self):
-        """Load crash records from JSON file"""
-        try:
-            if os.path.exists('crash_records.json'):
-                with open('crash_records.json', 'r') as f:
-                    self.crash_records = json.load(f)
-        except Exception as e:
-            print(f"Error loading crash records: {e}")
-
     def sendNotification(self, camera_id, starting_frame_id, city, district_no):
         """Send notification about crash event"""
         jsonEncoder = JsonEncoder()
         date = f"{datetime.utcnow().date()} {str(datetime.utcnow().time()).split('.')[0]}"
         
         try:
-            crash_pic = self.getCrashPhoto(camera_id, starting_frame_id)
+            thumbnail = self.getCrashThumbnail(camera_id, starting_frame_id)
         except Exception as e:
             print(f"Error getting crash photo: {str(e)}")
-            crash_pic = None
+            thumbnail = None
         
-        # Send Twilio notification
-        self.twilio_handler.send_crash_alert(
-            camera_id=camera_id,
-            city=city,
-            district_no=district_no,
-            crash_pic=crash_pic
-        )
+        # Queue the SMS alert, the dispatcher sends it from its own thread
+        self.notifier.notify(camera_id, starting_frame_id, city, district_no, thumbnail)
         
-        # Send notification to GUI
+        # Send notification to GUI, decoded from the thumbnail loaded for the alert
+        crash_pic = None
+        if thumbnail is not None:
+            crash_pic = cv2.imdecode(np.frombuffer(thumbnail, dtype=np.uint8), cv2.IMREAD_COLOR)
         jsonEncoder.sendNotification(camera_id, starting_frame_id, city, district_no, date, crash_pic)
 
-    def executeQuery(self, start_date, end_date, start_time, end_time, city, district):
-        """Search crash records based on query parameters"""
-        # Load crash records if not already loaded
-        if not self.crash_records:
-            self._load_crash_records()
-            
+    def executeQuery(self, start_date, end_date, start_time, end_time, city, district, cursor=None, page_size=QUERY_PAGE_SIZE):
+        """
+        Search crash records based on query parameters, one page at a time
+
+        The reply carries NEXT_CURSOR: the GUI sends the same search again
+        with it as CURSOR for the next page, None means it was the last one.
+        """
         # Parse date and time for comparison
         start_datetime_str = self._format_datetime(start_date, start_time)
         end_datetime_str = self._format_datetime(end_date, end_time)
-        
-        # Filter crash records
-        filtered_records = []
-        for record in self.crash_records:
-            # Skip if city doesn't match
-            if city and record['city'] != city:
-                continue
-                
-            # Skip if district doesn't match
-            if district and record['district'] != district:
-                continue
-                
-            # Check if crash_time is in the requested range
-            if start_datetime_str and end_datetime_str:
-                if not (start_datetime_str <= record['crash_time'] <= end_datetime_str):
-                    continue
-                    
-            filtered_records.append(record)
-            
-        # Sort by crash_time (newest first)
-        filtered_records.sort(key=lambda x: x['crash_time'], reverse=True)
-        
-        self.replyQuery(filtered_records)
+
+        # Filter on the indexes, newest first
+        filtered_records, next_cursor = self.crash_store.page(start_datetime_str, end_datetime_str, city, district,
+                                                              cursor, page_size)
+
+        self.replyQuery(filtered_records, next_cursor)
         
     def _format_datetime(self, date_str, time_str):
         """Format date and time strings to standard format for comparison"""
@@ -237,8 +231,8 @@ class Master:
         except Exception:
             return None
 
-    def replyQuery(self, results):
-        """Process crash records and send to GUI"""
+    def replyQuery(self, results, next_cursor=None):
+        """Send a page of crash records to GUI, with their thumbnails as JPEG bytes"""
         list_results = []
         
         for crash in results:
@@ -248,7 +242,7 @@ class Master:
             district = crash['district']
             crash_time = crash['crash_time']
 
-            crash_pic = self.getCrashPhoto(camera_id, frame_id)
+            crash_pic = self.getCrashThumbnail(camera_id, frame_id)
             sending_msg = {
                 CAMERA_ID: camera_id,
                 STARTING_FRAME_ID: frame_id,
@@ -260,10 +254,18 @@ class Master:
             list_results.append(sending_msg)
 
         jsonEncoder = JsonEncoder()
-        jsonEncoder.replyQuery(list_results)
+        jsonEncoder.replyQuery(list_results, next_cursor)
+
+    def getCrashThumbnail(self, camera_id, starting_frame_id):
+        """JPEG bytes of a crash video's thumbnail"""
+        jpeg = self.thumbnails.get(camera_id, starting_frame_id)
+        if jpeg is None:
+            # the clip may still be queued, or predate thumbnails
+            self.writers.flush(camera_id)
+            jpeg = self.thumbnails.get(camera_id, starting_frame_id)
+        if jpeg is not None:
+            return jpeg
 
-    def getCrashPhoto(self, camera_id, starting_frame_id):
-        """Extract a frame from crash video for thumbnail"""
         file_path = f'./saved_crash_vid/({camera_id}) {starting_frame_id}.avi'
         cap = cv2.VideoCapture(file_path)
         
@@ -278,24 +280,34 @@ class Master:
         cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no)
         ret, photo = cap.read()
         cap.release()
-        return photo if ret else None
+        if not ret:
+            return None
+        return self.thumbnails.save(camera_id, starting_frame_id, photo)
 
     def sendVideoToGUI(self, camera_id, starting_frame_id):
-        """Send video frames to GUI for playback"""
-        video_frames = self.getVideoFrames(camera_id, starting_frame_id, True)
+        """
+        Stream a crash video to GUI in chunks of VIDEO_CHUNK_FRAMES JPEG frames
+
+        The GUI can start playing the first chunk while the rest arrive, the
+        last chunk is flagged with LAST_CHUNK (it is empty if the video is).
+        """
+        self.writers.flush(camera_id)
+        file_path = f'./saved_crash_vid/({camera_id}) {starting_frame_id}.avi'
         jsonEncoder = JsonEncoder()
-        jsonEncoder.replyVideo(video_frames)
+
+        chunk = []
+        chunk_no = 0
+        for jpeg in readJpegFrames(file_path):
+            if len(chunk) == VIDEO_CHUNK_FRAMES:
+                jsonEncoder.replyVideo(camera_id, starting_frame_id, chunk_no, chunk, False)
+                chunk = []
+                chunk_no += 1
+            chunk.append(jpeg)
+        jsonEncoder.replyVideo(camera_id, starting_frame_id, chunk_no, chunk, True)
 
     def sendRecentCrashesToGUI(self):
         """Send recent crashes to GUI"""
-        # Load crash records if not already loaded
-        if not self.crash_records:
-            self._load_crash_records()
-            
-        # Sort by crash_time (newest first)
-        recent_crashes = sorted(self.crash_records, key=lambda x: x['crash_time'], reverse=True)
-        
-        # Limit to 10 most recent
-        recent_crashes = recent_crashes[:10]
-        
+        # 10 most recent, newest first
+        recent_crashes = self.crash_store.recent(10)
+
         self.replyQuery(recent_crashes)
\ No newline at end of file
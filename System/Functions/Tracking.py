@@ -1,50 +1,141 @@
-import cv2
+import threading
 
+import numpy as np
+
+from Mosse_Tracker.MosseEngine import MosseEngine
 from Mosse_Tracker.TrackerManager import Tracker, TrackerType
-from System.Data.CONSTANTS import Work_Tracker_Type_Mosse
+from Mosse_Tracker.TrackSet import TrackSet
+from System.Data.CONSTANTS import Work_Tracker_Type_Mosse, Work_Tracker_Batched, BATCH_STEP, TRACK_IOU_THRESHOLD
+
+
+def iouMatrix(boxes_a, boxes_b):
+    """Intersection over union of every pair of [xmin, ymin, xmax, ymax] boxes"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)[:, None, :]
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)[None, :, :]
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-6)
+
+
+class TrackingSession:
+    """
+    Trackers of one camera, kept from one batch to the next
+
+    Batches overlap by all but BATCH_STEP frames, so the trackers of the
+    previous batch have already gone through the start of the new one. The
+    detections on its first frame are matched to them by IoU: a matched
+    tracker keeps its id and filter and only goes through the new frames, an
+    unmatched detection starts a new tracker, and trackers nobody matched are
+    dropped like before.
+    """
+
+    def __init__(self, frame_width, frame_height):
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.trackers = []
+        self.next_id = 1
+        self.last_starting_frame_id = None
+        self.engine = MosseEngine()
+        self.lock = threading.Lock()
+
+    def track(self, starting_frame_id, gray_frames, boxes):
+        with self.lock:
+            overlap = len(gray_frames) - BATCH_STEP
+            continued = []
+            if self.last_starting_frame_id is not None and starting_frame_id == self.last_starting_frame_id + BATCH_STEP:
+                continued, boxes = self.match(boxes, overlap)
+            self.last_starting_frame_id = starting_frame_id
+
+            # New trackers start on the first frame and go through all of them
+            created = []
+            for box in boxes:
+                created.append(self.newTracker(gray_frames[0], box))
+
+            first_frame = 1 if created else overlap
+            for i in range(first_frame, len(gray_frames)):
+                frame_gray = gray_frames[i]
+                trackers = created + continued if i >= overlap else created
+                if Work_Tracker_Batched:
+                    Tracker.updateAll(trackers, frame_gray, self.engine)
+                else:
+                    for tracker in trackers:
+                        tracker.update(frame_gray)
+
+            self.trackers = continued + created
+            for tracker in self.trackers:
+                tracker.trimHistory(len(gray_frames))
+            return TrackSet.fromTrackers(self.trackers, len(gray_frames))
+
+    def match(self, boxes, overlap):
+        """
+        Match the detections to the trackers' positions on the same frame
+
+        Returns:
+            the matched trackers, and the detections left unmatched
+        """
+        if len(self.trackers) == 0 or len(boxes) == 0:
+            return [], boxes
+
+        positions = [tracker.getHistory()[-overlap] for tracker in self.trackers]
+        detections = [[box[1], box[3], box[2], box[4]] for box in boxes]
+        iou = iouMatrix(positions, detections)
+
+        matched = []
+        used = set()
+        for index in np.argsort(-iou, axis=None):
+            t, d = np.unravel_index(index, iou.shape)
+            if iou[t, d] < TRACK_IOU_THRESHOLD:
+                break
+            if t in used or d + len(self.trackers) in used:
+                continue
+            used.add(t)
+            used.add(d + len(self.trackers))
+            matched.append(self.trackers[t])
+
+        unmatched = [box for d, box in enumerate(boxes) if d + len(self.trackers) not in used]
+        return matched, unmatched
+
+    def newTracker(self, frame_gray, box):
+        # Extract box coordinates
+        xmin = int(box[1])
+        xmax = int(box[2])
+        ymin = int(box[3])
+        ymax = int(box[4])
+
+        # Ensure coordinates are within frame boundaries
+        xmax = min(xmax, self.frame_width - 1)
+        ymax = min(ymax, self.frame_height - 1)
+
+        tracker_id = self.next_id
+        self.next_id += 1
+
+        # Create appropriate tracker type based on settings
+        tracker_type = TrackerType.MOSSE if Work_Tracker_Type_Mosse else TrackerType.DLIB
+        return Tracker(frame_gray, (xmin, ymin, xmax, ymax), self.frame_width, self.frame_height, tracker_id, tracker_type)
 
 
 class Tracking:
+    """Tracking sessions of the cameras, the Track node keeps one for its whole life"""
+
     def __init__(self):
-        pass
-
-    def track(self, frames, boxes, frame_width, frame_height):
-        trackers = []
-        trackerId = 0
-        frame = frames[0]
-        
-        # Initialize a tracker for each detected box
-        for _, box in enumerate(boxes):
-            # Extract box coordinates
-            xmin = int(box[1])
-            xmax = int(box[2])
-            ymin = int(box[3])
-            ymax = int(box[4])
-
-            # Convert to grayscale for tracking
-            frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            trackerId += 1
-            
-            # Ensure coordinates are within frame boundaries
-            xmax = min(xmax, frame_width - 1)
-            ymax = min(ymax, frame_height - 1)
-
-            # Create appropriate tracker type based on settings
-            if Work_Tracker_Type_Mosse:
-                trackers.append(Tracker(frame_gray, (xmin, ymin, xmax, ymax), 
-                                        frame_width, frame_height, trackerId, TrackerType.MOSSE))
-            else:
-                trackers.append(Tracker(frame_gray, (xmin, ymin, xmax, ymax), 
-                                        frame_width, frame_height, trackerId, TrackerType.DLIB))
-
-        # Update trackers for each subsequent frame
-        for i in range(1, len(frames)):
-            frame = frames[i]
-            frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-            # Update each tracker with the new frame
-            for tracker in trackers:
-                tracker.update(frame_gray)
-                tracker.futureFramePosition()
-
-        return trackers
\ No newline at end of file
+        self.sessions = {}  # camera_id -> TrackingSession
+        self.lock = threading.Lock()
+
+    def track(self, gray_frames, boxes, frame_width, frame_height, camera_id=None, starting_frame_id=None):
+        """
+        Track the detected vehicles over a batch of gray frames
+
+        Returns:
+            tracks: TrackSet of the camera's trackers, cut to the batch's frames
+        """
+        if camera_id is None:
+            return TrackingSession(frame_width, frame_height).track(starting_frame_id, gray_frames, boxes)
+
+        with self.lock:
+            session = self.sessions.get(camera_id)
+            if session is None:
+                session = self.sessions[camera_id] = TrackingSession(frame_width, frame_height)
+        return session.track(starting_frame_id, gray_frames, boxes)
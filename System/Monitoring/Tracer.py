@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep, time
+
+from System.Data.CONSTANTS import *
+
+
+SUB_BUCKET_BITS = 5  # 32 sub-buckets per power of two, values are kept within ~3%
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of latencies in microseconds
+
+    Values below 2 * SUB_BUCKETS get their own bucket, above that every power
+    of two is split in SUB_BUCKETS linear buckets, so the relative error stays
+    the same from microseconds up to minutes.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def bucketOf(value):
+        if value < 2 * SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+    @staticmethod
+    def valueOf(bucket):
+        """Highest value that falls in a bucket"""
+        if bucket < 2 * SUB_BUCKETS:
+            return bucket
+        shift = bucket // SUB_BUCKETS - 1
+        sub = bucket % SUB_BUCKETS + SUB_BUCKETS
+        return ((sub + 1) << shift) - 1
+
+    def record(self, microseconds):
+        value = max(int(microseconds), 0)
+        bucket = self.bucketOf(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percent):
+        if self.count == 0:
+            return None
+        target = self.count * percent / 100.0
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                return min(self.valueOf(bucket), self.max)
+        return self.max
+
+    def summary(self):
+        """Snapshot in milliseconds"""
+        if self.count == 0:
+            return {"count": 0}
+        return {"count": self.count,
+                "min": self.min / 1000.0,
+                "mean": self.total / self.count / 1000.0,
+                "p50": self.percentile(50) / 1000.0,
+                "p90": self.percentile(90) / 1000.0,
+                "p99": self.percentile(99) / 1000.0,
+                "p999": self.percentile(99.9) / 1000.0,
+                "max": self.max / 1000.0}
+
+
+class Tracer:
+    """
+    Per-process collector of pipeline spans
+
+    Every span is keyed by (camera_id, starting_frame_id) so a batch can be
+    followed across the stages, and feeds a histogram per span name. The
+    snapshot is written to TRACE_DIR periodically and can also be served over
+    a local HTTP endpoint.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.node = "node"
+        self.histograms = {}
+        self.batches = OrderedDict()  # (camera_id, starting_frame_id) -> {span: ms}
+        self.lock = threading.Lock()
+        self.started = False
+        self.pid = os.getpid()
+
+    @classmethod
+    def getInstance(cls):
+        with cls._instance_lock:
+            if cls._instance is None or cls._instance.pid != os.getpid():
+                cls._instance = Tracer()
+            return cls._instance
+
+    def record(self, span, camera_id, starting_frame_id, start, end):
+        """
+        Record one span of a batch
+
+        Args:
+            span: Stage name (queue_wait, deserialize, detect, track, crash, master_persist...)
+            camera_id, starting_frame_id: The batch the span belongs to
+            start, end: time() at the start and the end of the span
+        """
+        microseconds = (end - start) * 1e6
+        with self.lock:
+            histogram = self.histograms.get(span)
+            if histogram is None:
+                histogram = self.histograms[span] = LatencyHistogram()
+            histogram.record(microseconds)
+
+            if camera_id is None:
+                return
+            key = (camera_id, starting_frame_id)
+            spans = self.batches.get(key)
+            if spans is None:
+                spans = self.batches[key] = {}
+                if len(self.batches) > TRACE_RECENT_BATCHES:
+                    self.batches.popitem(last=False)
+            spans[span] = microseconds / 1000.0
+
+    def snapshot(self):
+        with self.lock:
+            return {"node": self.node,
+                    "pid": self.pid,
+                    "time": time(),
+                    "spans": {span: histogram.summary() for span, histogram in self.histograms.items()},
+                    "recent": [{"camera_id": camera_id, "starting_frame_id": frame_id, "spans": dict(spans)}
+                               for (camera_id, frame_id), spans in self.batches.items()]}
+
+    def export(self, path=None):
+        """Write the snapshot as JSON, next to the other nodes' files by default"""
+        if path is None:
+            path = os.path.join(TRACE_DIR, "%s-%d.json" % (self.node, self.pid))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2, default=str)
+        os.replace(temp_path, path)
+
+    def start(self, node, http_port=None):
+        """Name this process' spans and start the periodic file export (and the HTTP endpoint if a port is given)"""
+        self.node = node
+        if self.started:
+            return
+        self.started = True
+        threading.Thread(target=self.exportLoop, daemon=True).start()
+        if http_port is not None:
+            self.serve(http_port)
+
+    def exportLoop(self):
+        while True:
+            sleep(TRACE_EXPORT_INTERVAL)
+            try:
+                self.export()
+            except Exception as e:
+                print(f"Error exporting traces: {e}")
+
+    def serve(self, port):
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(tracer.snapshot(), default=str).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", int(port)), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
@@ -2,7 +2,9 @@ import threading
 
 # Using enum class create enumerations
 from System.Connections.ReceiverController import ReceiverController
-from System.Data.CONSTANTS import Work_Detect_Files
+from System.Data.CONSTANTS import Work_Detect_Files, Work_Crash_Process_Pool, Work_Trace_Http, TRACE_HTTP_PORT_OFFSET, \
+    DETECT_BATCH_SIZE
+from System.Monitoring.Tracer import Tracer
 from System.NodeType import NodeType
 
 
@@ -15,17 +17,22 @@ class Node(threading.Thread):
         self.node_type = node_type
 
     def run(self):
+        http_port = int(self.port) + TRACE_HTTP_PORT_OFFSET if Work_Trace_Http else None
+        Tracer.getInstance().start(self.node_type.name, http_port)
+
         if self.node_type == NodeType.Master:
             ReceiverController(self.port,type = NodeType.Master).run()
             pass
         elif self.node_type == NodeType.Detetion:
-            ReceiverController(self.port,type = NodeType.Detetion, read_file=Work_Detect_Files, tf=True).run()
+            # one worker per frame of a detection batch, so the batcher can fill it
+            ReceiverController(self.port,type = NodeType.Detetion, read_file=Work_Detect_Files, tf=True,
+                               workers=DETECT_BATCH_SIZE).run()
             pass
         elif self.node_type == NodeType.Tracking:
             ReceiverController(self.port,type = NodeType.Tracking).run()
             pass
         elif self.node_type == NodeType.Crashing:
-            ReceiverController(self.port,type = NodeType.Crashing).run()
+            ReceiverController(self.port,type = NodeType.Crashing, use_processes=Work_Crash_Process_Pool).run()
             pass
 
 
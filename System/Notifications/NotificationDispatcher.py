@@ -0,0 +1,162 @@
+import base64
+import json
+import os
+import threading
+import urllib.request
+from abc import ABC, abstractmethod
+from datetime import datetime
+from time import time
+
+from System.Data.CONSTANTS import *
+
+
+class NotificationSink(ABC):
+    """
+    Where crash alerts go
+
+    send_crash_alert returns True once the alert is delivered and False if it
+    never can be (e.g. the sink isn't configured). Raising means a transient
+    failure, and the dispatcher tries again later.
+    """
+
+    @abstractmethod
+    def send_crash_alert(self, camera_id, city, district_no, crash_pic=None, crashes=1):
+        pass
+
+
+class WebhookSink(NotificationSink):
+    """Posts the alerts as JSON to an HTTP endpoint, e.g. a local fake SMS gateway for tests"""
+
+    def __init__(self, url, timeout=NOTIFICATION_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def send_crash_alert(self, camera_id, city, district_no, crash_pic=None, crashes=1):
+        body = {"camera_id": camera_id,
+                "city": city,
+                "district": district_no,
+                "crashes": crashes,
+                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        if isinstance(crash_pic, bytes):
+            body["crash_pic"] = base64.b64encode(crash_pic).decode()
+
+        request = urllib.request.Request(self.url, data=json.dumps(body).encode(),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return 200 <= response.status < 300
+
+
+def defaultSink():
+    """The webhook in NOTIFICATION_WEBHOOK_URL when set, Twilio SMS otherwise"""
+    url = os.getenv('NOTIFICATION_WEBHOOK_URL')
+    if url:
+        return WebhookSink(url)
+    from System.Notifications.twilio_handler import TwilioHandler
+    return TwilioHandler()
+
+
+class CrashAlert:
+    def __init__(self, camera_id, starting_frame_id, city, district_no, crash_pic, due):
+        self.camera_id = camera_id
+        self.starting_frame_id = starting_frame_id
+        self.city = city
+        self.district_no = district_no
+        self.crash_pic = crash_pic
+        self.due = due
+        self.crashes = 1
+        self.attempts = 0
+
+
+class NotificationDispatcher(threading.Thread):
+    """
+    Sends crash alerts from its own thread, so the Master never waits on the sink
+
+    Crashes of a camera within NOTIFICATION_WINDOW seconds of its last alert
+    are coalesced into the next one. Alerts are rate limited with a token
+    bucket (NOTIFICATION_RATE per second, bursts of NOTIFICATION_BURST), and
+    a failed alert is tried again with exponential backoff.
+    """
+
+    def __init__(self, sink, window=NOTIFICATION_WINDOW, rate=NOTIFICATION_RATE, burst=NOTIFICATION_BURST,
+                 max_retries=NOTIFICATION_MAX_RETRIES, retry_delay=NOTIFICATION_RETRY_DELAY):
+        threading.Thread.__init__(self, daemon=True)
+        self.sink = sink
+        self.window = window
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self.pending = {}  # camera_id -> CrashAlert waiting to be sent
+        self.last_sent = {}  # camera_id -> time() of its last alert
+        self.tokens = burst
+        self.tokens_time = time()
+        self.condition = threading.Condition()
+
+    def notify(self, camera_id, starting_frame_id, city, district_no, crash_pic=None):
+        """Queue an alert for a crash, returns at once"""
+        with self.condition:
+            alert = self.pending.get(camera_id)
+            if alert is not None:
+                alert.crashes += 1
+                alert.starting_frame_id = starting_frame_id
+                if crash_pic is not None:
+                    alert.crash_pic = crash_pic
+                return
+
+            due = max(time(), self.last_sent.get(camera_id, 0) + self.window)
+            self.pending[camera_id] = CrashAlert(camera_id, starting_frame_id, city, district_no, crash_pic, due)
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                alert = self.nextAlert()
+            self.deliver(alert)
+
+    def nextAlert(self):
+        """Wait until an alert is due and a token is available, then take both"""
+        while True:
+            if not self.pending:
+                self.condition.wait()
+                continue
+
+            now = time()
+            self.tokens = min(self.burst, self.tokens + (now - self.tokens_time) * self.rate)
+            self.tokens_time = now
+            alert = min(self.pending.values(), key=lambda a: a.due)
+            wait = max(alert.due - now, (1 - self.tokens) / self.rate)
+            if wait > 0:
+                self.condition.wait(wait)
+                continue
+
+            self.tokens -= 1
+            del self.pending[alert.camera_id]
+            self.last_sent[alert.camera_id] = now
+            return alert
+
+    def deliver(self, alert):
+        try:
+            self.sink.send_crash_alert(alert.camera_id, alert.city, alert.district_no,
+                                       crash_pic=alert.crash_pic, crashes=alert.crashes)
+        except Exception as e:
+            alert.attempts += 1
+            if alert.attempts > self.max_retries:
+                print(f"Giving up crash alert of camera {alert.camera_id}: {e}")
+                return
+            print(f"Crash alert of camera {alert.camera_id} failed, retrying: {e}")
+            self.retry(alert)
+
+    def retry(self, alert):
+        with self.condition:
+            due = time() + self.retry_delay * 2 ** (alert.attempts - 1)
+            newer = self.pending.get(alert.camera_id)
+            if newer is not None:
+                # crashes arrived meanwhile, send them all together
+                newer.crashes += alert.crashes
+                newer.due = min(newer.due, due)
+                newer.attempts = alert.attempts
+            else:
+                alert.due = due
+                self.pending[alert.camera_id] = alert
+            self.condition.notify()
@@ -40,14 +40,24 @@ class TwilioHandler:
         return digits_only
 
     def _save_temp_image(self, image_data):
-        """Save numpy array image to temporary file"""
+        """Save numpy array image, or JPEG bytes, to temporary file"""
+        temp_path = "temp_crash.jpg"
         if isinstance(image_data, np.ndarray):
-            temp_path = "temp_crash.jpg"
             cv2.imwrite(temp_path, image_data)
             return temp_path
+        if isinstance(image_data, bytes):
+            with open(temp_path, "wb") as f:
+                f.write(image_data)
+            return temp_path
         return None
 
-    def send_crash_alert(self, camera_id, city, district_no, crash_pic=None):
+    def send_crash_alert(self, camera_id, city, district_no, crash_pic=None, crashes=1):
+        """
+        Send the SMS of a crash (or of several crashes of the camera coalesced together)
+
+        Returns False when it can't be sent at all, raises when sending failed
+        and may work later.
+        """
         if not self.client:
             print("Twilio client not initialized. Skipping notifications.")
             return False
@@ -59,6 +69,8 @@ class TwilioHandler:
             f"Location: {city}, {district_no}\n"
             f"Camera ID: {camera_id}"
         )
+        if crashes > 1:
+            message_body += f"\nCrashes: {crashes}"
 
         # Handle crash_pic if it's a numpy array
         media_url = None
@@ -80,6 +92,6 @@ class TwilioHandler:
                 return True
             except Exception as e:
                 print(f"Failed to send crash alert SMS: {str(e)}")
-                return False
+                raise
         
         return False
\ No newline at end of file
@@ -0,0 +1,109 @@
+import json
+import os
+import sqlite3
+import threading
+
+from System.Data.CONSTANTS import CRASH_DB, CRASH_RECORDS_JSON, QUERY_PAGE_SIZE
+
+
+COLUMNS = ("camera_id", "frame_id", "from_no", "city", "district", "crash_time")
+
+
+class CrashStore:
+    """
+    Crash records in SQLite, indexed by time, city and district
+
+    crash_time is kept as "%Y-%m-%d %H:%M:%S" text, which sorts like the time
+    itself, so range queries and the most recent crashes are index scans.
+    Records of an older crash_records.json are imported into an empty store.
+    """
+
+    def __init__(self, path=CRASH_DB, legacy_path=CRASH_RECORDS_JSON):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS crashes (
+                                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                   camera_id, frame_id INTEGER, from_no INTEGER,
+                                   city TEXT, district TEXT, crash_time TEXT)""")
+            self.db.execute("CREATE INDEX IF NOT EXISTS crashes_time ON crashes (crash_time)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS crashes_city ON crashes (city, crash_time)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS crashes_district ON crashes (district, crash_time)")
+        self.migrate(legacy_path)
+
+    def migrate(self, legacy_path):
+        if not os.path.exists(legacy_path):
+            return
+        with self.lock:
+            if self.db.execute("SELECT 1 FROM crashes LIMIT 1").fetchone() is not None:
+                return
+        try:
+            with open(legacy_path, 'r') as f:
+                records = json.load(f)
+        except Exception as e:
+            print(f"Error loading crash records: {e}")
+            return
+        with self.lock, self.db:
+            self.db.executemany("INSERT INTO crashes (%s) VALUES (?, ?, ?, ?, ?, ?)" % ", ".join(COLUMNS),
+                                [tuple(record.get(column) for column in COLUMNS) for record in records])
+
+    def add(self, record):
+        """Append one crash record, returns its id"""
+        with self.lock, self.db:
+            cursor = self.db.execute("INSERT INTO crashes (%s) VALUES (?, ?, ?, ?, ?, ?)" % ", ".join(COLUMNS),
+                                     tuple(record[column] for column in COLUMNS))
+            return cursor.lastrowid
+
+    def query(self, start_time=None, end_time=None, city=None, district=None, limit=None, cursor=None):
+        """
+        Crash records matching the filters, newest first
+
+        Args:
+            start_time, end_time: crash_time range, both ends included (ignored unless both are given)
+            city, district: exact matches, ignored when empty
+            limit: maximum number of records
+            cursor: (crash_time, id) of a record, only the records after it are returned
+        """
+        conditions = []
+        params = []
+        if cursor is not None:
+            conditions.append("(crash_time < ? OR (crash_time = ? AND id < ?))")
+            params.extend((cursor[0], cursor[0], cursor[1]))
+        if city:
+            conditions.append("city = ?")
+            params.append(city)
+        if district:
+            conditions.append("district = ?")
+            params.append(district)
+        if start_time and end_time:
+            conditions.append("crash_time BETWEEN ? AND ?")
+            params.extend((start_time, end_time))
+
+        sql = "SELECT id, %s FROM crashes" % ", ".join(COLUMNS)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY crash_time DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self.lock:
+            return [dict(row) for row in self.db.execute(sql, params)]
+
+    def page(self, start_time=None, end_time=None, city=None, district=None, cursor=None, page_size=QUERY_PAGE_SIZE):
+        """
+        One page of query results
+
+        Returns:
+            records, and the cursor of the next page (None after the last page)
+        """
+        records = self.query(start_time, end_time, city, district, page_size + 1, cursor)
+        if len(records) <= page_size:
+            return records, None
+        records = records[:page_size]
+        return records, (records[-1]["crash_time"], records[-1]["id"])
+
+    def recent(self, limit=10):
+        return self.query(limit=limit)
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from System.Data.CONSTANTS import FRAME_CACHE_BYTES, FRAME_CACHE_FRAMES
+
+
+class FrameCache:
+    """
+    The most recent frames of every camera, kept in memory for the crash clips
+
+    A camera keeps its last max_frames frames, and all the cameras together
+    stay under max_bytes: past that the oldest frames, whichever camera they
+    belong to, go first. Frames are copied in, since the batches may live in
+    shared memory slots the camera reuses, and copied out, since the crash
+    clips are drawn on.
+
+    A camera that starts over (its frame ids go back) begins a new run, the
+    frames of its earlier runs stay until they are evicted and are read when
+    the current run doesn't hold the frames asked for.
+    """
+
+    def __init__(self, max_frames=FRAME_CACHE_FRAMES, max_bytes=FRAME_CACHE_BYTES):
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()  # (camera_id, run, frame_id) -> frame, oldest first
+        self.frame_ids = {}  # camera_id -> (run, frame_id) of its cached frames, oldest first
+        self.last_frame_ids = {}  # camera_id -> newest frame id cached
+        self.runs = {}  # camera_id -> number of its current run
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def put(self, camera_id, starting_frame_id, frames):
+        with self.lock:
+            last_frame_id = self.last_frame_ids.get(camera_id, 0)
+            if starting_frame_id < last_frame_id - len(frames):
+                # the camera started over, its earlier frames are kept under the last run
+                self.runs[camera_id] = self.runs.get(camera_id, 0) + 1
+                last_frame_id = 0
+            run = self.runs.get(camera_id, 0)
+
+            for i, frame in enumerate(frames):
+                frame_id = starting_frame_id + i
+                if frame_id <= last_frame_id:
+                    continue
+                frame = np.array(frame)
+                self.frames[(camera_id, run, frame_id)] = frame
+                self.frame_ids.setdefault(camera_id, deque()).append((run, frame_id))
+                self.bytes += frame.nbytes
+                last_frame_id = frame_id
+
+                if len(self.frame_ids[camera_id]) > self.max_frames:
+                    self.evict((camera_id,) + self.frame_ids[camera_id][0])
+            self.last_frame_ids[camera_id] = last_frame_id
+
+            while self.bytes > self.max_bytes and self.frames:
+                self.evict(next(iter(self.frames)))
+
+    def read(self, camera_id, first_frame_id, count):
+        """
+        Copies of frames first_frame_id..first_frame_id+count-1, all from the newest run holding them
+
+        Returns:
+            the frames, or None if any of them is not cached anymore
+        """
+        with self.lock:
+            for run in sorted({run for run, _ in self.frame_ids.get(camera_id, ())}, reverse=True):
+                keys = [(camera_id, run, frame_id) for frame_id in range(first_frame_id, first_frame_id + count)]
+                if all(key in self.frames for key in keys):
+                    return [self.frames[key].copy() for key in keys]
+            return None
+
+    def evict(self, key):
+        """Remove a frame, always the oldest one of its camera"""
+        frame = self.frames.pop(key)
+        self.bytes -= frame.nbytes
+        self.frame_ids[key[0]].popleft()
@@ -0,0 +1,80 @@
+import struct
+
+import cv2
+
+from System.Data.CONSTANTS import THUMBNAIL_JPEG_QUALITY
+
+
+def readJpegFrames(file_path):
+    """
+    Yield the frames of an MJPG AVI as JPEG bytes, one at a time
+
+    The frames of the crash clips are JPEGs already, so they are taken out of
+    the AVI's movi list as they are. A file that can't be read that way is
+    decoded and its frames compressed again.
+    """
+    try:
+        frames = aviJpegFrames(file_path)
+        first = next(frames, None)
+    except (OSError, ValueError, struct.error):
+        first = None
+
+    if first is None:
+        yield from decodedJpegFrames(file_path)
+        return
+
+    yield first
+    yield from frames
+
+
+def aviJpegFrames(file_path):
+    with open(file_path, "rb") as f:
+        riff, size, form = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or form != b"AVI ":
+            raise ValueError("not an AVI file")
+        yield from chunkFrames(f, 12, 8 + size)
+
+        # files over 1 GB go on in RIFF AVIX parts, each after the one before
+        position = 8 + size + (size & 1)
+        while True:
+            f.seek(position)
+            header = f.read(12)
+            if len(header) < 12:
+                return
+            riff, size, form = struct.unpack("<4sI4s", header)
+            if riff != b"RIFF" or form != b"AVIX":
+                return
+            yield from chunkFrames(f, position + 12, position + 8 + size)
+            position += 8 + size + (size & 1)
+
+
+def chunkFrames(f, position, end):
+    """Walk the chunks between position and end, descending into the lists"""
+    while position + 8 <= end:
+        f.seek(position)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        chunk_id, size = struct.unpack("<4sI", header)
+        data_start = position + 8
+
+        if chunk_id == b"LIST":
+            yield from chunkFrames(f, data_start + 4, min(data_start + size, end))
+        elif chunk_id[2:] in (b"dc", b"db") and size > 0:
+            yield f.read(size)
+
+        position = data_start + size + (size & 1)
+
+
+def decodedJpegFrames(file_path):
+    cap = cv2.VideoCapture(file_path)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_JPEG_QUALITY])
+            if ok:
+                yield encoded.tobytes()
+    finally:
+        cap.release()
@@ -0,0 +1,212 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from System.Data.CONSTANTS import SEGMENT_DIR, SEGMENT_ENCODING, SEGMENT_FRAMES, SEGMENT_JPEG_QUALITY, SEGMENT_RETENTION
+
+
+# one stored frame: where its bytes are in the segment's data file
+INDEX_DTYPE = np.dtype([('frame_id', '<i8'), ('offset', '<i8'), ('length', '<i4'),
+                        ('height', '<i2'), ('width', '<i2')])
+
+
+class Segment:
+    """
+    Append-only file of frames plus its index
+
+    <n>.raw or <n>.jpg holds the frames back to back, <n>.idx one INDEX_DTYPE
+    record per frame. Both are only appended to, so after a crash the index is
+    trimmed to the frames the data file fully holds. Only the segment being
+    appended to keeps its files open, readers open the data file per read.
+    """
+
+    def __init__(self, folder, number, encoding):
+        self.number = number
+        self.encoding = encoding
+        self.data_path = os.path.join(folder, "%08d.%s" % (number, encoding))
+        self.index_path = os.path.join(folder, "%08d.idx" % number)
+
+        entries = np.zeros(0, dtype=INDEX_DTYPE)
+        if os.path.exists(self.index_path):
+            size = os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize
+            entries = np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=size)
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        entries = entries[entries['offset'] + entries['length'] <= data_size]
+
+        self.entries = {int(e['frame_id']): (int(e['offset']), int(e['length']), int(e['height']), int(e['width']))
+                        for e in entries}
+        self.size = int((entries['offset'] + entries['length']).max()) if len(entries) else 0
+        self.data = None
+        self.index = None
+
+    def openForWriting(self):
+        """Open the files to append to, cutting off what the index doesn't hold"""
+        self.data = open(self.data_path, "ab")
+        self.data.truncate(self.size)
+        self.index = open(self.index_path, "ab")
+        self.index.truncate(len(self.entries) * INDEX_DTYPE.itemsize)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, frame_id):
+        return frame_id in self.entries
+
+    def append(self, frame_id, frame):
+        if self.encoding == "jpg":
+            _, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, SEGMENT_JPEG_QUALITY])
+            data = encoded.data
+        else:
+            data = np.ascontiguousarray(frame).data
+        length = data.nbytes
+
+        height, width = frame.shape[:2]
+        record = np.array([(frame_id, self.size, length, height, width)], dtype=INDEX_DTYPE)
+        self.data.write(data)
+        self.index.write(record.tobytes())
+        self.entries[frame_id] = (self.size, length, height, width)
+        self.size += length
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+    def openReader(self):
+        return open(self.data_path, "rb", buffering=0)
+
+    def read(self, frame_id, reader):
+        """The frame, from a reader of the data file opened with openReader"""
+        offset, length, height, width = self.entries[frame_id]
+        if self.encoding == "jpg":
+            buffer = np.empty(length, dtype=np.uint8)
+            self.readInto(reader, buffer, offset)
+            return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        self.readInto(reader, frame, offset)
+        return frame
+
+    @staticmethod
+    def readInto(reader, array, offset):
+        reader.seek(offset)
+        reader.readinto(memoryview(array).cast("B"))
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.index.close()
+        self.data = None
+        self.index = None
+
+    def remove(self):
+        self.close()
+        os.remove(self.data_path)
+        os.remove(self.index_path)
+
+
+class CameraSegments:
+    """
+    Rolling segments of one camera, the newest one is appended to
+
+    A camera that starts over (its frame ids go back) starts a new segment,
+    its older segments are kept until they age out. Reads look for a frame id
+    from the newest segment back, so the current run's frames come first.
+    """
+
+    def __init__(self, folder, encoding):
+        self.folder = folder
+        self.encoding = encoding
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+        self.segments = []
+        for name in sorted(os.listdir(folder)):
+            number, extension = os.path.splitext(name)
+            if extension in (".raw", ".jpg"):
+                self.segments.append(Segment(folder, int(number), extension[1:]))
+        self.last_frame_id = max(self.segments[-1].entries, default=0) if self.segments else 0
+        self.rollover = False
+
+    def append(self, starting_frame_id, frames):
+        with self.lock:
+            if starting_frame_id < self.last_frame_id - len(frames):
+                # the camera started over, its frames go to a new segment
+                self.rollover = True
+                self.last_frame_id = 0
+
+            for i, frame in enumerate(frames):
+                frame_id = starting_frame_id + i
+                if frame_id <= self.last_frame_id:
+                    continue  # overlap with the previous batch, already stored
+                self.writable().append(frame_id, frame)
+                self.last_frame_id = frame_id
+
+            if self.segments and self.segments[-1].data is not None:
+                self.segments[-1].flush()
+
+    def writable(self):
+        segment = self.segments[-1] if self.segments else None
+        full = segment is None or len(segment) >= SEGMENT_FRAMES or segment.encoding != self.encoding
+        if full or (self.rollover and len(segment) > 0):
+            if segment is not None:
+                segment.close()
+            number = segment.number + 1 if segment is not None else 0
+            segment = Segment(self.folder, number, self.encoding)
+            self.segments.append(segment)
+            while len(self.segments) > SEGMENT_RETENTION:
+                self.segments.pop(0).remove()
+        self.rollover = False
+        if segment.data is None:
+            segment.openForWriting()
+        return segment
+
+    def read(self, first_frame_id, count):
+        with self.lock:
+            frames = []
+            readers = {}  # segment number -> its data file, open for this read only
+            try:
+                for frame_id in range(first_frame_id, first_frame_id + count):
+                    for segment in reversed(self.segments):
+                        if frame_id in segment:
+                            reader = readers.get(segment.number)
+                            if reader is None:
+                                reader = readers[segment.number] = segment.openReader()
+                            frames.append(segment.read(frame_id, reader))
+                            break
+            finally:
+                for reader in readers.values():
+                    reader.close()
+            return frames
+
+
+class SegmentStore:
+    """
+    Archive of every camera's frames, by frame id
+
+    Batches overlap, so only the frames newer than the last stored one are
+    appended. Each camera writes SEGMENT_FRAMES frames per segment and keeps
+    its SEGMENT_RETENTION newest segments, raw or as JPEG (SEGMENT_ENCODING).
+    """
+
+    def __init__(self, folder=SEGMENT_DIR, encoding=SEGMENT_ENCODING):
+        self.folder = folder
+        self.encoding = encoding
+        self.cameras = {}
+        self.lock = threading.Lock()
+
+    def camera(self, camera_id):
+        with self.lock:
+            segments = self.cameras.get(camera_id)
+            if segments is None:
+                segments = CameraSegments(os.path.join(self.folder, str(camera_id)), self.encoding)
+                self.cameras[camera_id] = segments
+            return segments
+
+    def append(self, camera_id, starting_frame_id, frames):
+        self.camera(camera_id).append(starting_frame_id, frames)
+
+    def read(self, camera_id, first_frame_id, count):
+        """Frames first_frame_id..first_frame_id+count-1 that are still stored, oldest first"""
+        return self.camera(camera_id).read(first_frame_id, count)
@@ -0,0 +1,66 @@
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+
+from System.Data.CONSTANTS import THUMBNAIL_CACHE_SIZE, THUMBNAIL_JPEG_QUALITY
+
+
+class ThumbnailCache:
+    """
+    JPEG thumbnails of the crash clips
+
+    A thumbnail is written next to its clip, "(<camera_id>) <frame_id>.jpg",
+    when the clip is saved. The JPEG bytes of the most recently used ones are
+    kept in memory, so listing crashes reads neither videos nor files.
+    """
+
+    def __init__(self, folder="saved_crash_vid", capacity=THUMBNAIL_CACHE_SIZE):
+        self.folder = folder
+        self.capacity = capacity
+        self.thumbnails = OrderedDict()  # (camera_id, frame_id) -> jpeg bytes
+        self.lock = threading.Lock()
+
+    def pathOf(self, camera_id, frame_id):
+        return f'./{self.folder}/({camera_id}) {frame_id}.jpg'
+
+    def save(self, camera_id, frame_id, photo):
+        """Compress a frame of the clip and keep it as the clip's thumbnail"""
+        ok, encoded = cv2.imencode(".jpg", photo, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_JPEG_QUALITY])
+        if not ok:
+            return None
+        jpeg = encoded.tobytes()
+
+        path = self.pathOf(camera_id, frame_id)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(jpeg)
+        os.replace(temp_path, path)
+
+        self.remember((camera_id, frame_id), jpeg)
+        return jpeg
+
+    def get(self, camera_id, frame_id):
+        """JPEG bytes of a clip's thumbnail, or None if it has none"""
+        key = (camera_id, frame_id)
+        with self.lock:
+            jpeg = self.thumbnails.get(key)
+            if jpeg is not None:
+                self.thumbnails.move_to_end(key)
+                return jpeg
+
+        path = self.pathOf(camera_id, frame_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            jpeg = f.read()
+        self.remember(key, jpeg)
+        return jpeg
+
+    def remember(self, key, jpeg):
+        with self.lock:
+            self.thumbnails[key] = jpeg
+            self.thumbnails.move_to_end(key)
+            while len(self.thumbnails) > self.capacity:
+                self.thumbnails.popitem(last=False)
@@ -0,0 +1,55 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from System.Data.CONSTANTS import WRITER_QUEUE_PER_CAMERA, WRITER_WORKERS
+
+
+class WriterPool:
+    """
+    Runs the Master's disk writes in the background
+
+    Every camera is bound to one single-threaded worker, so its writes run in
+    the order they were submitted while the cameras are spread over the pool.
+    flush waits for what a camera submitted so far, before its files are read.
+
+    Each job holds a copy of its frames, so a camera has at most queue_size
+    writes waiting or running: past that submit blocks until one is done,
+    and a disk slower than the cameras holds back the Master instead of
+    filling its memory.
+    """
+
+    def __init__(self, workers=WRITER_WORKERS, queue_size=WRITER_QUEUE_PER_CAMERA):
+        self.workers = [ThreadPoolExecutor(max_workers=1, thread_name_prefix="writer") for _ in range(workers)]
+        self.queue_size = queue_size
+        self.last = {}  # camera_id -> future of its last submitted write
+        self.pending = {}  # camera_id -> semaphore of its writes not done yet
+        self.lock = threading.Lock()
+
+    def submit(self, camera_id, function, *args):
+        worker = self.workers[hash(camera_id) % len(self.workers)]
+        with self.lock:
+            pending = self.pending.get(camera_id)
+            if pending is None:
+                pending = self.pending[camera_id] = threading.BoundedSemaphore(self.queue_size)
+        pending.acquire()
+        with self.lock:
+            future = worker.submit(self.runJob, pending, function, *args)
+            self.last[camera_id] = future
+        return future
+
+    @staticmethod
+    def runJob(pending, function, *args):
+        try:
+            return function(*args)
+        except Exception as e:
+            print(f"Error writing in background: {e}")
+            raise
+        finally:
+            pending.release()
+
+    def flush(self, camera_id):
+        """Wait until every write submitted for the camera is done"""
+        with self.lock:
+            future = self.last.get(camera_id)
+        if future is not None:
+            future.exception()  # waits, the error was already reported
@@ -1,30 +1,104 @@
+import os
+
+import numpy as np
+
+
+# one detection: the class is its index in coco_classes.txt, like the rows YOLO.detect_array returns
+BOX_DTYPE = np.dtype([('class', 'i2'), ('left', 'f4'), ('right', 'f4'),
+                      ('top', 'f4'), ('bottom', 'f4'), ('score', 'f4')])
+
+CLASSES_FILE = 'Car_Detection_TF/model_data/coco_classes.txt'
+
+
+class BoxesFile:
+    """
+    Detections of a whole video, indexed by frame
+
+    All boxes sit in one structured array and offsets[frame]:offsets[frame + 1]
+    is the slice of a frame, so a lookup builds no Python objects.
+    """
+
+    def __init__(self, boxes, offsets):
+        self.boxes = boxes
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, frame):
+        if frame < 0:
+            frame += len(self)
+        if frame < 0 or frame >= len(self):
+            raise IndexError('frame %d out of range' % frame)
+        return np.asarray(self.boxes[self.offsets[frame]:self.offsets[frame + 1]])
+
+
 def loadFile(videoName):
+    """
+    Load the detections recorded for a video
+
+    The text file is parsed once and compiled into <name>.boxes.npy and
+    <name>.index.npy next to it; later loads memory-map those instead.
+    """
     # Extract filename from path
     videoName = videoName.split('/')
     videoName = videoName[len(videoName) - 1]
-    
+
     # Construct path to boxes file
-    videoName = 'boxes/' + videoName.split('.')[0] + '.txt'
-    
+    base = 'boxes/' + videoName.split('.')[0]
+    text_path = base + '.txt'
+    boxes_path = base + '.boxes.npy'
+    index_path = base + '.index.npy'
+
+    if isCacheFresh(text_path, boxes_path, index_path):
+        return BoxesFile(np.load(boxes_path, mmap_mode='r'), np.load(index_path, mmap_mode='r'))
+
+    boxes, offsets = compileFile(text_path)
+    try:
+        saveAtomically(boxes_path, boxes)
+        saveAtomically(index_path, offsets)
+    except OSError as e:
+        print(f"Error caching boxes file: {e}")
+    return BoxesFile(boxes, offsets)
+
+
+def isCacheFresh(text_path, boxes_path, index_path):
+    if not (os.path.exists(boxes_path) and os.path.exists(index_path)):
+        return False
+    text_time = os.path.getmtime(text_path)
+    return os.path.getmtime(boxes_path) >= text_time and os.path.getmtime(index_path) >= text_time
+
+
+def saveAtomically(path, array):
+    # several cameras may replay the same video, never let one read a half written cache
+    temp_path = path + '.%d.tmp' % os.getpid()
+    with open(temp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(temp_path, path)
+
+
+def compileFile(text_path):
+    """Parse a boxes text file into the structured array and its per-frame offsets"""
+    class_ids = loadClassIds()
+
     # Read and parse file
-    with open(videoName, "r") as f:
+    with open(text_path, "r") as f:
         lines = f.readlines()
-    
+
     lines = [x.strip() for x in lines]
     lines.pop(0)  # Remove header line
 
-    temp = []
-    res = []
+    rows = []
+    offsets = [0]
 
     # Parse detection boxes
     for l in lines:
         if l == '--':
-            res.append(temp)
-            temp = []
+            offsets.append(len(rows))
             continue
-            
+
         x = l.split()
-        
+
         # Handle multi-word class names
         if x[0] in ['traffic', 'fire', 'stop', 'parking', 'sports',
                     'baseball', 'tennis', 'wine', 'hot', 'cell',
@@ -33,10 +107,17 @@ def loadFile(videoName):
             x.pop(1)
 
         # Format: [class, left, right, top, bottom, confidence]
-        temp.append([x[0], float(x[1]), float(x[2]), float(x[3]), float(x[4]), float(x[5])])
-        
+        rows.append((class_ids.get(x[0], -1), float(x[1]), float(x[2]), float(x[3]), float(x[4]), float(x[5])))
+
     # Add final batch if not empty
-    if temp:
-        res.append(temp)
-        
-    return res
\ No newline at end of file
+    if offsets[-1] != len(rows):
+        offsets.append(len(rows))
+
+    return np.array(rows, dtype=BOX_DTYPE), np.array(offsets, dtype=np.int64)
+
+
+def loadClassIds():
+    """Class name -> index in coco_classes.txt, spaces removed like in the boxes files"""
+    with open(CLASSES_FILE) as f:
+        names = [c.strip() for c in f.readlines()]
+    return {name.replace(' ', ''): i for i, name in enumerate(names)}
@@ -0,0 +1,84 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from boxes import yoloFiles
+from boxes.yoloFiles import loadClassIds, loadFile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A copy of one recorded boxes file, so the compiled cache isn't written into the repo"""
+    os.makedirs(tmp_path / 'boxes')
+    shutil.copy(os.path.join(REPO, 'boxes', '1500.txt'), tmp_path / 'boxes')
+    monkeypatch.setattr(yoloFiles, 'CLASSES_FILE', os.path.join(REPO, yoloFiles.CLASSES_FILE))
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def oldLoadFile(text_path):
+    """The list of lists parser loadFile replaced"""
+    with open(text_path) as f:
+        lines = [x.strip() for x in f.readlines()]
+    lines.pop(0)
+
+    temp = []
+    res = []
+    for l in lines:
+        if l == '--':
+            res.append(temp)
+            temp = []
+            continue
+        x = l.split()
+        if x[0] in ['traffic', 'fire', 'stop', 'parking', 'sports', 'baseball', 'tennis', 'wine', 'hot', 'cell',
+                    'teddy', 'hair']:
+            x[0] = x[0] + x[1]
+            x.pop(1)
+        temp.append([x[0], float(x[1]), float(x[2]), float(x[3]), float(x[4]), float(x[5])])
+    if temp:
+        res.append(temp)
+    return res
+
+
+def assertSameBoxes(boxes, old):
+    class_ids = loadClassIds()
+    assert len(boxes) == len(old)
+    for frame, rows in enumerate(old):
+        compiled = boxes[frame]
+        assert compiled['class'].tolist() == [class_ids[row[0]] for row in rows]
+        expected = np.array([row[1:] for row in rows], dtype=np.float32).reshape(-1, 5)
+        actual = np.stack([compiled[name] for name in ('left', 'right', 'top', 'bottom', 'score')], axis=1)
+        assert (actual == expected).all()
+
+
+def test_compiled_boxes_match_the_old_parser(workdir):
+    assertSameBoxes(loadFile('videos/1500.mp4'), oldLoadFile('boxes/1500.txt'))
+
+
+def test_later_loads_map_the_cached_arrays(workdir):
+    loadFile('videos/1500.mp4')
+    assert os.path.exists('boxes/1500.boxes.npy') and os.path.exists('boxes/1500.index.npy')
+
+    cached = loadFile('videos/1500.mp4')
+    assert isinstance(cached.boxes, np.memmap)
+    assertSameBoxes(cached, oldLoadFile('boxes/1500.txt'))
+
+
+def test_an_edited_text_file_is_compiled_again(workdir):
+    loadFile('videos/1500.mp4')
+    with open('boxes/1500.txt', 'a') as f:
+        f.write('car 1 2 3 4 0.5\n')
+    os.utime('boxes/1500.txt', (os.path.getmtime('boxes/1500.boxes.npy') + 10,) * 2)
+
+    assertSameBoxes(loadFile('videos/1500.mp4'), oldLoadFile('boxes/1500.txt'))
+
+
+def test_frames_out_of_range_raise(workdir):
+    boxes = loadFile('videos/1500.mp4')
+    assert len(boxes[-1]) == len(boxes[len(boxes) - 1])
+    with pytest.raises(IndexError):
+        boxes[len(boxes)]
@@ -0,0 +1,81 @@
+import time
+
+import numpy as np
+
+from System.CameraNode import FrameRing
+from System.Capture.CaptureReader import CaptureReader
+from System.Capture.Sources import FakeCameraSource, VideoSource, openSource
+
+
+class CountingSource(VideoSource):
+    """Frames filled with their index"""
+
+    def __init__(self, frames, live):
+        self.frames = frames
+        self.live = live
+        self.index = 0
+
+    def read(self):
+        if self.index >= self.frames:
+            return None
+        self.index += 1
+        return np.full((6, 8, 3), self.index, np.uint8)
+
+
+def readAll(reader, ring):
+    values = []
+    while True:
+        frame = reader.read()
+        if frame is None:
+            return values
+        values.append(int(frame[0, 0, 0]))
+        ring.push()
+
+
+def test_a_file_source_loses_no_frame():
+    ring = FrameRing(8, 6)
+    reader = CaptureReader(CountingSource(200, live=False), ring, queue_size=4)
+    reader.start()
+    assert readAll(reader, ring) == list(range(1, 201))
+    assert reader.dropped == 0
+
+
+def test_a_live_source_drops_the_oldest_frames():
+    ring = FrameRing(8, 6)
+    reader = CaptureReader(CountingSource(50, live=True), ring, queue_size=4)
+    reader.start()
+    deadline = time.time() + 5
+    while reader.dropped < 46 and time.time() < deadline:
+        time.sleep(0.01)  # nothing read meanwhile, the queue keeps the newest frames
+
+    assert readAll(reader, ring) == [47, 48, 49, 50]
+    assert reader.dropped == 46
+
+
+def test_a_fake_camera_is_read_through_the_ring():
+    source = openSource("fake://?frames=40&fps=1000&width=320&height=240")
+    assert isinstance(source, FakeCameraSource) and source.live
+
+    ring = FrameRing(480, 360)
+    reader = CaptureReader(source, ring)
+    reader.start()
+    count = 0
+    while True:
+        frame = reader.read()
+        if frame is None:
+            break
+        assert frame.shape == (360, 480, 3)
+        ring.push()
+        count += 1
+        time.sleep(0.002)
+    assert count + reader.dropped == 40
+
+
+def test_stop_unblocks_a_waiting_reader():
+    ring = FrameRing(8, 6)
+    reader = CaptureReader(CountingSource(1000, live=False), ring, queue_size=2)
+    reader.start()
+    time.sleep(0.05)
+    reader.stop()
+    reader.join(5)
+    assert not reader.is_alive()
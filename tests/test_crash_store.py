@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from System.Storage.CrashStore import CrashStore
+
+
+def record(camera_id, crash_time, city="Cairo", district="1"):
+    return {"camera_id": camera_id, "frame_id": 30, "from_no": 3, "city": city, "district": district,
+            "crash_time": crash_time}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CrashStore(str(tmp_path / "crashes.db"), str(tmp_path / "missing.json"))
+
+
+def test_json_records_are_imported_into_an_empty_store(tmp_path):
+    legacy = tmp_path / "crash_records.json"
+    legacy.write_text(json.dumps([record(1, "2020-01-01 10:00:00"), record(2, "2020-01-02 10:00:00")]))
+
+    store = CrashStore(str(tmp_path / "crashes.db"), str(legacy))
+    assert [r["camera_id"] for r in store.recent()] == [2, 1]
+
+    # opening it again imports nothing twice
+    store.db.close()
+    store = CrashStore(str(tmp_path / "crashes.db"), str(legacy))
+    assert len(store.recent()) == 2
+
+
+def test_an_unreadable_json_file_imports_nothing(tmp_path):
+    legacy = tmp_path / "crash_records.json"
+    legacy.write_text("[{")
+    assert CrashStore(str(tmp_path / "crashes.db"), str(legacy)).recent() == []
+
+
+def test_queries_filter_by_time_city_and_district(store):
+    store.add(record(1, "2020-01-01 10:00:00", city="Cairo", district="1"))
+    store.add(record(2, "2020-01-02 10:00:00", city="Giza", district="1"))
+    store.add(record(3, "2020-01-03 10:00:00", city="Cairo", district="2"))
+
+    assert [r["camera_id"] for r in store.query(city="Cairo")] == [3, 1]
+    assert [r["camera_id"] for r in store.query(district="1")] == [2, 1]
+    assert [r["camera_id"] for r in store.query("2020-01-02 00:00:00", "2020-01-03 10:00:00")] == [3, 2]
+    assert [r["camera_id"] for r in store.recent(limit=1)] == [3]
+
+
+def test_pages_follow_each_other_without_gaps_or_repeats(store):
+    # several crashes share a second, the cursor's id tells them apart
+    for i in range(7):
+        store.add(record(i, "2020-01-01 10:00:%02d" % (i // 3)))
+
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        records, cursor = store.page(cursor=cursor, page_size=3)
+        seen.extend(r["camera_id"] for r in records)
+        pages += 1
+        if cursor is None:
+            break
+    assert seen == [6, 5, 4, 3, 2, 1, 0]
+    assert pages == 3
+
+
+def test_a_full_last_page_has_no_next_cursor(store):
+    for i in range(3):
+        store.add(record(i, "2020-01-01 10:00:0%d" % i))
+    records, cursor = store.page(page_size=3)
+    assert len(records) == 3 and cursor is None
@@ -0,0 +1,34 @@
+from itertools import combinations
+
+import numpy as np
+
+from System.Functions.Crashing import candidatePairs
+
+
+def allPairs(boxes):
+    """Every overlapping pair, compared one by one"""
+    return [(i, j) for i, j in combinations(range(len(boxes)), 2)
+            if boxes[i, 0] <= boxes[j, 2] and boxes[j, 0] <= boxes[i, 2] and
+            boxes[i, 1] <= boxes[j, 3] and boxes[j, 1] <= boxes[i, 3]]
+
+
+def test_the_grid_finds_the_same_pairs_as_all_pairs():
+    rng = np.random.default_rng(11)
+    for _ in range(200):
+        n = rng.integers(0, 40)
+        corner = rng.uniform(-50, 500, (n, 2))
+        boxes = np.hstack([corner, corner + rng.uniform(0, 120, (n, 2))])
+
+        ia, ib = candidatePairs(boxes)
+        assert list(zip(ia.tolist(), ib.tolist())) == allPairs(boxes)
+
+
+def test_boxes_touching_at_an_edge_overlap():
+    boxes = np.array([[0, 0, 10, 10], [10, 0, 20, 10], [30, 30, 31, 31]], dtype=float)
+    ia, ib = candidatePairs(boxes)
+    assert list(zip(ia.tolist(), ib.tolist())) == [(0, 1)]
+
+
+def test_no_boxes_make_no_pairs():
+    ia, ib = candidatePairs(np.zeros((0, 4)))
+    assert len(ia) == 0 and len(ib) == 0
@@ -0,0 +1,68 @@
+import threading
+
+from System.Functions.DetectionBatcher import DetectionBatcher
+
+
+class CountingYolo:
+    """Detects each frame as [frame], recording the size of every run"""
+
+    max_batch_size = 4
+
+    def __init__(self, fail=False):
+        self.runs = []
+        self.fail = fail
+
+    def detect_batch(self, frames):
+        self.runs.append(len(frames))
+        if self.fail:
+            raise RuntimeError("model failed")
+        return [[frame] for frame in frames]
+
+
+def submitAll(batcher, frames):
+    results = {}
+    errors = {}
+
+    def submit(frame):
+        try:
+            results[frame] = batcher.submit(frame)
+        except Exception as e:
+            errors[frame] = e
+
+    threads = [threading.Thread(target=submit, args=(frame,)) for frame in frames]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def test_frames_within_the_window_share_one_run():
+    yolo = CountingYolo()
+    batcher = DetectionBatcher(yolo, batch_size=8, window=0.5)
+    batcher.start()
+
+    results, _ = submitAll(batcher, range(4))
+    assert results == {frame: [frame] for frame in range(4)}
+    assert yolo.runs == [4]
+
+
+def test_runs_are_capped_by_the_model_batch_size():
+    yolo = CountingYolo()
+    batcher = DetectionBatcher(yolo, batch_size=8, window=0.5)
+    assert batcher.batch_size == 4
+    batcher.start()
+
+    results, _ = submitAll(batcher, range(6))
+    assert results == {frame: [frame] for frame in range(6)}
+    assert sorted(yolo.runs) == [2, 4]
+
+
+def test_a_failed_run_fails_every_frame_of_it():
+    yolo = CountingYolo(fail=True)
+    batcher = DetectionBatcher(yolo, window=0.5)
+    batcher.start()
+
+    results, errors = submitAll(batcher, range(2))
+    assert results == {}
+    assert all(isinstance(e, RuntimeError) for e in errors.values()) and len(errors) == 2
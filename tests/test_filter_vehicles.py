@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("keras")
+
+from Car_Detection_TF.yolo import YOLO
+
+CLASS_NAMES = ['person', 'car', 'truck', 'bus']
+
+
+@pytest.fixture
+def yolo():
+    yolo = YOLO.__new__(YOLO)  # only the box filtering, no model
+    yolo.class_names = CLASS_NAMES
+    return yolo
+
+
+def overlaps(a, b, threshold=0.5):
+    """The per-pair test filterVehicles replaced"""
+    if (a[0] >= b[0] and a[1] >= b[1] and a[2] <= b[2] and a[3] <= b[3]) or \
+            (b[0] >= a[0] and b[1] >= a[1] and b[2] <= a[2] and b[3] <= a[3]):
+        return True
+    inter = max(min(a[3], b[3]) - max(a[1], b[1]), 0) * max(min(a[2], b[2]) - max(a[0], b[0]), 0)
+    if inter == 0:
+        return False
+    union = (a[3] - a[1]) * (a[2] - a[0]) + (b[3] - b[1]) * (b[2] - b[0]) - inter
+    return inter / union >= threshold
+
+
+def referenceFilter(boxes, classes, scores):
+    """The old loops, removing every box by its original index at the end"""
+    order = list(range(len(classes)))[::-1]
+    removed = {i for i in order if (boxes[i][2] - boxes[i][0]) * (boxes[i][3] - boxes[i][1]) > 0.75 * 480 * 360}
+    groups = {name: [i for i in order if CLASS_NAMES[classes[i]] == name] for name in ('car', 'truck', 'bus')}
+
+    for outer, inner, same in (('truck', 'car', False), ('truck', 'bus', False), ('bus', 'car', False), ('car', 'car', True)):
+        for i, a in enumerate(groups[outer]):
+            for j, b in enumerate(groups[inner]):
+                if same and i == j:
+                    continue
+                if overlaps(boxes[a], boxes[b]):
+                    removed.add(b if scores[a] > scores[b] else a)
+                    break
+
+    return [i for i in range(len(classes)) if i not in removed]
+
+
+def test_removed_boxes_keep_their_original_indices(yolo):
+    # the frame-sized box goes first, the chained deletes then removed the wrong car
+    boxes = np.array([[0, 0, 360, 480], [10, 10, 60, 90], [12, 12, 60, 90]], dtype=float)
+    classes = np.array([1, 1, 1])
+    scores = np.array([0.9, 0.8, 0.5])
+
+    out_boxes, out_classes, out_scores = yolo.filterVehicles(boxes, classes, scores)
+    assert out_boxes.tolist() == [boxes[1].tolist()]
+    assert out_scores.tolist() == [0.8]
+
+
+def test_matches_the_per_pair_loops(yolo):
+    rng = np.random.default_rng(3)
+    for _ in range(200):
+        n = rng.integers(0, 12)
+        top = rng.integers(0, 300, n)
+        left = rng.integers(0, 400, n)
+        boxes = np.stack([top, left, top + rng.integers(5, 120, n), left + rng.integers(5, 160, n)], axis=1).astype(float)
+        classes = rng.integers(0, len(CLASS_NAMES), n)
+        scores = rng.random(n)
+
+        keep = referenceFilter(boxes, classes, scores)
+        out_boxes, out_classes, out_scores = yolo.filterVehicles(boxes, classes, scores)
+        assert out_boxes.tolist() == boxes[keep].tolist()
+        assert out_classes.tolist() == classes[keep].tolist()
+        assert out_scores.tolist() == scores[keep].tolist()
@@ -0,0 +1,63 @@
+import numpy as np
+
+from System.Storage.FrameCache import FrameCache
+
+FRAME_BYTES = 6 * 8 * 3
+
+
+def frames(first, count, offset=0):
+    return [np.full((6, 8, 3), (first + i + offset) % 256, np.uint8) for i in range(count)]
+
+
+def values(read):
+    return [int(frame[0, 0, 0]) for frame in read]
+
+
+def test_frames_are_copied_in_and_out():
+    cache = FrameCache()
+    batch = frames(1, 30)
+    cache.put(1, 1, batch)
+    batch[0][:] = 200
+
+    read = cache.read(1, 1, 30)
+    assert values(read) == list(range(1, 31))
+    read[0][:] = 200
+    assert values(cache.read(1, 1, 1)) == [1]
+
+
+def test_overlapping_batches_are_cached_once():
+    cache = FrameCache()
+    cache.put(1, 1, frames(1, 30))
+    cache.put(1, 16, frames(16, 30))
+    assert values(cache.read(1, 1, 45)) == list(range(1, 46))
+    assert cache.bytes == 45 * FRAME_BYTES
+
+
+def test_a_missing_frame_reads_none():
+    cache = FrameCache(max_frames=40)
+    cache.put(1, 1, frames(1, 30))
+    cache.put(1, 16, frames(16, 30))
+    assert cache.read(1, 1, 30) is None
+    assert values(cache.read(1, 6, 40)) == list(range(6, 46))
+    assert cache.read(2, 1, 1) is None
+
+
+def test_the_oldest_frames_of_any_camera_go_past_max_bytes():
+    cache = FrameCache(max_bytes=50 * FRAME_BYTES)
+    cache.put(1, 1, frames(1, 30))
+    cache.put(2, 1, frames(1, 30))
+
+    assert cache.bytes == 50 * FRAME_BYTES
+    assert cache.read(1, 1, 10) is None
+    assert values(cache.read(1, 11, 20)) == list(range(11, 31))
+    assert values(cache.read(2, 1, 30)) == list(range(1, 31))
+
+
+def test_a_restarted_camera_reads_its_newest_run_first():
+    cache = FrameCache()
+    cache.put(1, 1, frames(1, 60))
+    cache.put(1, 1, frames(1, 30, offset=100))  # frame ids went back
+
+    assert values(cache.read(1, 1, 30)) == list(range(101, 131))
+    # only the earlier run holds all of these
+    assert values(cache.read(1, 21, 20)) == list(range(21, 41))
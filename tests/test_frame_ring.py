@@ -0,0 +1,44 @@
+import numpy as np
+
+from System.CameraNode import FrameRing
+from System.Data.CONSTANTS import BATCH_SIZE, BATCH_STEP
+
+
+def frame(index):
+    return np.full((6, 8, 3), index % 256, np.uint8)
+
+
+def test_batches_are_the_last_frames_across_the_wrap():
+    ring = FrameRing(8, 6)
+    batches = 0
+    for index in range(ring.capacity * 3):
+        ring.write(index, frame(index))
+        ring.push()
+        if ring.isBatchReady():
+            batch = ring.lastBatch()
+            assert batch.shape == (BATCH_SIZE, 6, 8, 3)
+            assert batch[:, 0, 0, 0].tolist() == [i % 256 for i in range(index + 1 - BATCH_SIZE, index + 1)]
+            batches += 1
+    assert batches == (ring.capacity * 3 - BATCH_SIZE) // BATCH_STEP + 1
+
+
+def test_the_first_segment_is_mirrored_after_the_last():
+    ring = FrameRing(8, 6)
+    for index in range(BATCH_SIZE - BATCH_STEP):
+        ring.write(index, frame(index + 1))
+    assert (ring.buffer[ring.capacity:] == ring.buffer[:BATCH_SIZE - BATCH_STEP]).all()
+
+
+def test_batches_are_views_of_the_ring():
+    ring = FrameRing(8, 6)
+    for index in range(BATCH_SIZE):
+        ring.write(index, frame(index))
+        ring.push()
+    assert np.shares_memory(ring.lastBatch(), ring.buffer)
+
+
+def test_frames_of_another_size_are_resized_into_their_slot():
+    ring = FrameRing(8, 6)
+    slot = ring.write(3, np.full((12, 16, 3), 50, np.uint8))
+    assert slot.shape == (6, 8, 3) and (slot == 50).all()
+    assert (ring.slot(3 + ring.capacity) == 50).all()
@@ -0,0 +1,72 @@
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from System.Storage.MjpegReader import aviJpegFrames, readJpegFrames
+
+
+def decode(jpeg):
+    return cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+
+
+@pytest.fixture
+def clip(tmp_path):
+    """An MJPG clip like the saved crash videos, and its frames"""
+    path = str(tmp_path / "clip.avi")
+    frames = [np.full((48, 64, 3), 40 * i, np.uint8) for i in range(5)]
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'), 30, (64, 48))
+    for frame in frames:
+        out.write(frame)
+    out.release()
+    return path, frames
+
+
+def test_the_jpegs_are_taken_out_of_the_clip_as_they_are(clip):
+    path, frames = clip
+    jpegs = list(readJpegFrames(path))
+    assert len(jpegs) == len(frames)
+    assert all(jpeg[:2] == b"\xff\xd8" for jpeg in jpegs)
+
+    cap = cv2.VideoCapture(path)
+    for jpeg in jpegs:
+        ret, frame = cap.read()
+        # the same JPEG, give or take the decoders' rounding
+        assert ret and np.abs(decode(jpeg).astype(int) - frame).max() <= 2
+    cap.release()
+
+
+def test_a_file_that_is_no_avi_is_decoded_instead(tmp_path):
+    path = str(tmp_path / "clip.mkv")
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'), 30, (64, 48))
+    for i in range(3):
+        out.write(np.full((48, 64, 3), 60 * i, np.uint8))
+    out.release()
+
+    with pytest.raises(ValueError):
+        next(aviJpegFrames(path))
+    jpegs = list(readJpegFrames(path))
+    assert len(jpegs) == 3
+    assert all(decode(jpeg).shape == (48, 64, 3) for jpeg in jpegs)
+
+
+def test_a_missing_file_reads_no_frames(tmp_path):
+    assert list(readJpegFrames(str(tmp_path / "missing.avi"))) == []
+
+
+def chunk(chunk_id, data):
+    return struct.pack("<4sI", chunk_id, len(data)) + data + (b"\0" if len(data) & 1 else b"")
+
+
+def test_frames_of_the_avix_parts_follow_the_first_riff(clip):
+    path, _ = clip
+    jpegs = list(readJpegFrames(path))
+
+    # an OpenDML file goes on in top level RIFF AVIX chunks after the first RIFF
+    for part in (jpegs[:2], jpegs[2:]):
+        movi = chunk(b"LIST", b"movi" + b"".join(chunk(b"00dc", jpeg) for jpeg in part))
+        with open(path, "ab") as f:
+            f.write(struct.pack("<4sI4s", b"RIFF", 4 + len(movi), b"AVIX") + movi)
+
+    assert list(readJpegFrames(path)) == jpegs + jpegs
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from Mosse_Tracker.Mosse import MOSSE
+from Mosse_Tracker.MosseEngine import MIN_GROUP_SIZE, MosseEngine
+
+BOXES = [(20, 20, 60, 60), (120, 30, 160, 70), (40, 140, 80, 180), (200, 150, 240, 190), (260, 40, 300, 80)]
+
+
+def scene(step):
+    """Gray frame of textured squares, each moving its own way"""
+    rng = np.random.default_rng(7)
+    frame = np.full((240, 320), 90, np.uint8)
+    for i, (xmin, ymin, xmax, ymax) in enumerate(BOXES):
+        texture = rng.integers(0, 255, (ymax - ymin, xmax - xmin), dtype=np.uint8)
+        x, y = xmin + step * (i % 3 - 1) * 2, ymin + step * (i % 2) * 2
+        frame[y:y + ymax - ymin, x:x + xmax - xmin] = texture
+    return frame
+
+
+def trackers(boxes=BOXES):
+    np.random.seed(3)  # the initial training rotates the first image at random
+    return [MOSSE(scene(0), box) for box in boxes]
+
+
+def assertSameTracks(engine_trackers, single_trackers):
+    for engine_tracker, single in zip(engine_trackers, single_trackers):
+        assert engine_tracker.dx == single.dx
+        assert engine_tracker.dy == single.dy
+        assert engine_tracker.centers == single.centers
+        assert engine_tracker.psr == pytest.approx(single.psr, rel=1e-3)
+        # float32 stacks round a little differently from cv2's per-tracker spectra
+        np.testing.assert_allclose(engine_tracker.H, single.H, rtol=1e-2, atol=1e-3)
+
+
+def test_a_group_moves_like_the_trackers_one_by_one():
+    assert len(BOXES) >= MIN_GROUP_SIZE
+    engine = MosseEngine()
+    batched, single = trackers(), trackers()
+
+    for step in range(1, 10):
+        frame = scene(step)
+        dx, dy, psr = engine.update(batched, frame)
+        for tracker in single:
+            tracker.updateTracking(frame, False)
+        assert dx.tolist() == [tracker.dx[-1] for tracker in single]
+        assert dy.tolist() == [tracker.dy[-1] for tracker in single]
+
+    assertSameTracks(batched, single)
+    assert any(tracker.dx[-1] != 0 for tracker in single)
+    assert len(engine.groups) == 1
+
+
+def test_lone_and_stopped_trackers_are_updated_on_their_own():
+    engine = MosseEngine()
+    batched, single = trackers(BOXES[:2]), trackers(BOXES[:2])
+    stopped = [True, False]
+
+    for step in range(1, 6):
+        frame = scene(step)
+        engine.update(batched, frame, stopped)
+        for tracker, is_stopped in zip(single, stopped):
+            tracker.updateTracking(frame, is_stopped)
+
+    assertSameTracks(batched, single)
+    assert engine.groups == {}
@@ -0,0 +1,113 @@
+import threading
+from time import time
+
+import pytest
+
+from System.Notifications.NotificationDispatcher import NotificationDispatcher, NotificationSink
+
+
+class RecordingSink(NotificationSink):
+    def __init__(self, failures=0):
+        self.alerts = []
+        self.failures = failures
+        self.sent = threading.Event()
+
+    def send_crash_alert(self, camera_id, city, district_no, crash_pic=None, crashes=1):
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("gateway down")
+        self.alerts.append((camera_id, crashes, crash_pic))
+        self.sent.set()
+        return True
+
+
+def take(dispatcher):
+    with dispatcher.condition:
+        return dispatcher.nextAlert()
+
+
+def test_sinks_must_send_alerts():
+    with pytest.raises(TypeError):
+        NotificationSink()
+
+
+def test_crashes_waiting_together_make_one_alert():
+    sink = RecordingSink()
+    dispatcher = NotificationDispatcher(sink)
+    dispatcher.notify(1, 30, "Cairo", "1")
+    dispatcher.notify(1, 60, "Cairo", "1", crash_pic=b"jpeg")
+    dispatcher.notify(2, 30, "Giza", "2")
+
+    dispatcher.deliver(take(dispatcher))
+    dispatcher.deliver(take(dispatcher))
+    assert sorted(sink.alerts) == [(1, 2, b"jpeg"), (2, 1, None)]
+
+
+def test_a_camera_alerts_again_only_after_the_window():
+    dispatcher = NotificationDispatcher(RecordingSink(), window=30)
+    dispatcher.notify(1, 30, "Cairo", "1")
+    sent = take(dispatcher)
+
+    dispatcher.notify(1, 60, "Cairo", "1")
+    assert dispatcher.pending[1].due == pytest.approx(dispatcher.last_sent[1] + 30)
+    assert dispatcher.pending[1].due > sent.due
+
+
+def test_alerts_beyond_the_burst_wait_for_a_token():
+    dispatcher = NotificationDispatcher(RecordingSink(), rate=20, burst=2)
+    for camera_id in range(3):
+        dispatcher.notify(camera_id, 30, "Cairo", "1")
+
+    start = time()
+    take(dispatcher)
+    take(dispatcher)
+    assert time() - start < 0.04
+    take(dispatcher)
+    assert time() - start >= 0.04
+
+
+def test_failed_alerts_are_retried_with_backoff():
+    sink = RecordingSink(failures=2)
+    dispatcher = NotificationDispatcher(sink, retry_delay=10)
+    dispatcher.notify(1, 30, "Cairo", "1")
+
+    alert = take(dispatcher)
+    dispatcher.deliver(alert)
+    first = dispatcher.pending[1].due - time()
+    dispatcher.pending[1].due = 0
+    dispatcher.deliver(take(dispatcher))
+    second = dispatcher.pending[1].due - time()
+
+    assert first == pytest.approx(10, abs=1) and second == pytest.approx(20, abs=1)
+    dispatcher.pending[1].due = 0
+    dispatcher.deliver(take(dispatcher))
+    assert sink.alerts == [(1, 1, None)]
+
+
+def test_crashes_during_a_retry_go_with_it():
+    sink = RecordingSink(failures=1)
+    dispatcher = NotificationDispatcher(sink, retry_delay=10)
+    dispatcher.notify(1, 30, "Cairo", "1")
+    alert = take(dispatcher)
+    dispatcher.notify(1, 60, "Cairo", "1")
+
+    dispatcher.deliver(alert)
+    assert dispatcher.pending[1].crashes == 2
+
+
+def test_an_alert_is_given_up_after_max_retries():
+    dispatcher = NotificationDispatcher(RecordingSink(failures=10), max_retries=1)
+    dispatcher.notify(1, 30, "Cairo", "1")
+    dispatcher.deliver(take(dispatcher))
+    dispatcher.pending[1].due = 0
+    dispatcher.deliver(take(dispatcher))
+    assert dispatcher.pending == {}
+
+
+def test_the_thread_sends_the_alerts():
+    sink = RecordingSink()
+    dispatcher = NotificationDispatcher(sink)
+    dispatcher.start()
+    dispatcher.notify(1, 30, "Cairo", "1")
+    assert sink.sent.wait(5)
+    assert sink.alerts == [(1, 1, None)]
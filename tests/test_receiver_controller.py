@@ -0,0 +1,95 @@
+import importlib
+import pickle
+import sys
+import types
+
+import pytest
+
+from System.Data.CONSTANTS import BUSY, CAMERA_ID, RECEIVER_PARK_TIMEOUT, RECEIVER_PARKED_PER_CAMERA, \
+    RECEIVER_QUEUE_PER_CAMERA
+
+
+class RecordingDecoder:
+    """Stands in for the node's JsonDecoder, whose models aren't loaded here"""
+
+    decoded = []
+
+    def __init__(self, type=None, read_file=False, tf=False):
+        pass
+
+    def run(self, message):
+        self.decoded.append(message)
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.replies = []
+
+    def send_multipart(self, parts):
+        identity, _, payload = parts
+        self.replies.append((identity, pickle.loads(payload)))
+
+
+@pytest.fixture
+def receiver(monkeypatch):
+    decoder = types.ModuleType("System.Controller.JsonDecoder")
+    decoder.JsonDecoder = RecordingDecoder
+    monkeypatch.setitem(sys.modules, "System.Controller.JsonDecoder", decoder)
+    monkeypatch.delitem(sys.modules, "System.Connections.ReceiverController", raising=False)
+    module = importlib.import_module("System.Connections.ReceiverController")
+
+    receiver = module.ReceiverController(0, workers=1)
+    receiver.socket = RecordingSocket()
+    yield receiver
+    if receiver.threads is not None:
+        receiver.threads.shutdown()
+    sys.modules.pop("System.Connections.ReceiverController", None)
+
+
+def message(camera_id=1):
+    return {CAMERA_ID: camera_id}
+
+
+def fill(receiver, camera_id=1):
+    """One message running and the camera's queue full, all acked"""
+    for i in range(1 + RECEIVER_QUEUE_PER_CAMERA):
+        receiver.admit(b"full%d" % i, message(camera_id))
+    assert [reply for _, reply in receiver.socket.replies] == [""] * (1 + RECEIVER_QUEUE_PER_CAMERA)
+    receiver.socket.replies.clear()
+
+
+def test_a_full_queue_holds_the_ack_until_a_message_is_done(receiver):
+    fill(receiver)
+    receiver.admit(b"late", message())
+    assert receiver.socket.replies == []
+
+    receiver.release(receiver.finished.get(timeout=5))  # the running message is done
+    assert receiver.socket.replies == [(b"late", "")]
+
+
+def test_other_cameras_are_not_held_back(receiver):
+    fill(receiver, camera_id=1)
+    receiver.admit(b"other", message(camera_id=2))
+    assert receiver.socket.replies == [(b"other", "")]
+
+
+def test_held_messages_are_bounded(receiver):
+    fill(receiver)
+    for i in range(RECEIVER_PARKED_PER_CAMERA):
+        receiver.admit(b"held%d" % i, message())
+    receiver.admit(b"extra", message())
+
+    assert receiver.socket.replies == [(b"extra", BUSY)]
+    assert len(receiver.parked[1]) == RECEIVER_PARKED_PER_CAMERA
+
+
+def test_messages_held_too_long_are_answered_busy(receiver):
+    fill(receiver)
+    receiver.admit(b"held", message())
+    parked_time = receiver.parked[1][0][2]
+
+    receiver.expire(parked_time + RECEIVER_PARK_TIMEOUT / 2)
+    assert receiver.socket.replies == []
+    receiver.expire(parked_time + RECEIVER_PARK_TIMEOUT + 1)
+    assert receiver.socket.replies == [(b"held", BUSY)]
+    assert not receiver.parked[1]
@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pytest
+
+from System.Storage import SegmentStore as segment_module
+from System.Storage.SegmentStore import SegmentStore
+
+
+def frames(first, count, offset=0):
+    return [np.full((6, 8, 3), (first + i + offset) % 256, np.uint8) for i in range(count)]
+
+
+def values(read):
+    return [int(frame[0, 0, 0]) for frame in read]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SegmentStore(str(tmp_path), "raw")
+
+
+def test_overlapping_batches_are_stored_once(store):
+    store.append(1, 1, frames(1, 30))
+    store.append(1, 16, frames(16, 30))
+    assert values(store.read(1, 1, 45)) == list(range(1, 46))
+    assert len(store.camera(1).segments[-1]) == 45
+
+
+def test_jpeg_segments_decode_close_to_the_frames(tmp_path):
+    store = SegmentStore(str(tmp_path), "jpg")
+    store.append(1, 1, frames(100, 5))
+    read = store.read(1, 1, 5)
+    assert all(abs(int(frame[3, 4, 0]) - value) <= 2 for frame, value in zip(read, range(100, 105)))
+
+
+def test_a_restarted_camera_starts_a_new_segment(store):
+    store.append(1, 1, frames(1, 60))
+    store.append(1, 1, frames(1, 30, offset=100))  # frame ids went back
+
+    segments = store.camera(1).segments
+    assert len(segments) == 2
+    # the current run's frames come first, the older run still holds the rest
+    assert values(store.read(1, 1, 30)) == list(range(101, 131))
+    assert values(store.read(1, 31, 30)) == list(range(31, 61))
+
+
+def test_a_reopened_store_goes_on_with_its_segments(tmp_path, store):
+    store.append(1, 1, frames(1, 30))
+    store.camera(1).segments[-1].close()
+
+    reopened = SegmentStore(str(tmp_path), "raw")
+    reopened.append(1, 16, frames(16, 30))
+    assert len(reopened.camera(1).segments) == 1
+    assert values(reopened.read(1, 1, 45)) == list(range(1, 46))
+
+
+def test_a_reopened_store_rolls_over_a_restarted_camera(tmp_path, store):
+    store.append(1, 1, frames(1, 60))
+    store.camera(1).segments[-1].close()
+
+    reopened = SegmentStore(str(tmp_path), "raw")
+    reopened.append(1, 1, frames(1, 30, offset=100))
+    assert len(reopened.camera(1).segments) == 2
+    assert values(reopened.read(1, 1, 30)) == list(range(101, 131))
+
+
+def test_a_torn_write_is_cut_off_on_reopen(tmp_path, store):
+    store.append(1, 1, frames(1, 10))
+    segment = store.camera(1).segments[-1]
+    segment.close()
+    with open(segment.data_path, "r+b") as f:
+        f.truncate(os.path.getsize(segment.data_path) - 1)
+
+    reopened = SegmentStore(str(tmp_path), "raw")
+    assert values(reopened.read(1, 1, 10)) == list(range(1, 10))
+    reopened.append(1, 10, frames(10, 2))
+    assert values(reopened.read(1, 1, 11)) == list(range(1, 12))
+
+
+def test_only_the_newest_segments_are_kept(monkeypatch, store):
+    monkeypatch.setattr(segment_module, "SEGMENT_FRAMES", 10)
+    monkeypatch.setattr(segment_module, "SEGMENT_RETENTION", 2)
+    store.append(1, 1, frames(1, 50))
+
+    assert [segment.number for segment in store.camera(1).segments] == [3, 4]
+    assert values(store.read(1, 1, 50)) == list(range(31, 51))
@@ -0,0 +1,93 @@
+import pickle
+import threading
+
+import numpy as np
+import pytest
+import zmq
+
+from System.Connections import SenderController as sender_module
+from System.Connections.FrameSerializer import unpackMessage
+from System.Connections.SenderController import ConnectionManager, SenderController
+from System.Connections.SharedFrameRing import SharedFrameRing
+from System.Data.CONSTANTS import BUSY, CAMERA_ID, FRAMES
+
+
+@pytest.fixture(autouse=True)
+def fast_timeouts(monkeypatch):
+    monkeypatch.setattr(sender_module, "SENDER_ACK_TIMEOUT", 300)
+    monkeypatch.setattr(sender_module, "SENDER_BUSY_DELAY", 0.01)
+
+
+@pytest.fixture
+def context():
+    context = zmq.Context()
+    yield context
+    context.destroy(linger=0)
+
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing.create("sender", 2, 4, 4, slots=1)
+    yield ring
+    ring.taken[:] = 0
+    ring.close()
+
+
+def router(context):
+    socket = context.socket(zmq.ROUTER)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.RCVTIMEO = 2000
+    port = socket.bind_to_random_port("tcp://127.0.0.1")
+    return socket, port
+
+
+def answer(socket, replies):
+    """Receive one message per reply and answer it, returning the messages"""
+    received = []
+    for reply in replies:
+        identity, _, *parts = socket.recv_multipart()
+        received.append(unpackMessage(parts))
+        if reply is not None:
+            socket.send_multipart([identity, b"", pickle.dumps(reply)])
+    return received
+
+
+def test_busy_messages_are_sent_again_until_taken(context):
+    socket, port = router(context)
+    received = []
+    receiver = threading.Thread(target=lambda: received.extend(answer(socket, [BUSY, BUSY, ""])))
+    receiver.start()
+
+    sender = SenderController(context, "127.0.0.1", port)
+    frames = [np.arange(12, dtype=np.uint8).reshape(2, 2, 3)]
+    assert sender.deliver({CAMERA_ID: 1, FRAMES: frames})
+    receiver.join()
+
+    assert len(received) == 3
+    assert all((message[FRAMES][0] == frames[0]).all() for message in received)
+    sender.close()
+
+
+def test_a_missing_answer_leaves_the_slot_to_the_receiver(context, ring):
+    socket, port = router(context)
+    receiver = threading.Thread(target=answer, args=(socket, [None]))
+    receiver.start()
+
+    frames = ring.write(ring.acquire(), np.zeros((2, 4, 4, 3), np.uint8))
+    assert not SenderController(context, "127.0.0.1", port).deliver({CAMERA_ID: 1, FRAMES: frames})
+    receiver.join()
+    assert not ring.isIdle()
+
+
+def test_a_message_that_never_left_releases_its_slot(context, ring):
+    # nothing listens there, the send itself times out
+    frames = ring.write(ring.acquire(), np.zeros((2, 4, 4, 3), np.uint8))
+    assert not SenderController(context, "127.0.0.1", 1).deliver({CAMERA_ID: 1, FRAMES: frames})
+    assert ring.isIdle()
+
+
+def test_connection_manager_pools_one_sender_per_destination():
+    manager = ConnectionManager.getInstance()
+    assert manager is ConnectionManager.getInstance()
+    assert manager.getSender("127.0.0.1", 1) is manager.getSender("127.0.0.1", "1")
+    assert manager.getSender("127.0.0.1", 1) is not manager.getSender("127.0.0.1", 2)
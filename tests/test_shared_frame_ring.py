@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from System.Connections.FrameBatch import FrameBatch
+from System.Connections.SharedFrameRing import SharedFrameRing, StaleFrames
+
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing.create("test", 4, 8, 6, slots=2)
+    yield ring
+    ring.taken[:] = 0
+    ring.close()
+
+
+def batch(value):
+    return np.full((4, 8, 6, 3), value, np.uint8)
+
+
+def test_release_frees_the_slot_of_the_current_batch(ring):
+    frames = ring.write(ring.acquire(), batch(1))
+    assert not ring.isIdle()
+    frames.release()
+    assert ring.isIdle()
+
+
+def test_late_release_of_a_reused_slot_frees_nothing(ring):
+    slot = ring.acquire()
+    old = ring.write(slot, batch(1))
+    old.release()
+    assert ring.acquire() == slot
+    new = ring.write(slot, batch(2))
+
+    old.release()
+    assert ring.taken[slot] != 0
+    new.release()
+    assert ring.isIdle()
+
+
+def test_check_raises_once_the_slot_is_reused(ring):
+    slot = ring.acquire()
+    old = ring.write(slot, batch(1))
+    old.check()
+    old.release()
+    ring.acquire()
+
+    with pytest.raises(StaleFrames):
+        old.check()
+    with pytest.raises(StaleFrames):
+        FrameBatch(old).check()
+
+
+def test_acquire_gives_up_when_every_slot_is_taken(ring):
+    assert ring.acquire() is not None
+    assert ring.acquire() is not None
+    assert ring.acquire(timeout=0.01) is None
+
+
+def test_gray_frames_are_converted_once_into_the_slot(ring):
+    frames = ring.write(ring.acquire(), batch(200))
+    gray = frames.grayFrames()
+    assert gray.shape == (4, 8, 6)
+    assert ring.gray_count[frames.slot] == 4
+
+    gray[:] = 7  # a second reader gets the stack from the slot, not a new conversion
+    assert (frames.grayFrames() == 7).all()
+
+
+def test_pickled_frames_keep_their_generation(ring):
+    # another process reattaches by the description instead of copying the frames
+    frames = ring.write(ring.acquire(), batch(3))
+    rebuild, (description,) = frames.__reduce__()
+    assert description == (ring.name, 2, 4, 8, 6, frames.slot, 4, frames.generation)
@@ -0,0 +1,47 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from Mosse_Tracker.TrackerManager import Tracker
+from Mosse_Tracker.TrackSet import TrackSet
+
+
+def scene(step):
+    """Gray frame of two textured cars driving apart"""
+    rng = np.random.default_rng(5)
+    frame = np.full((240, 320), 80, np.uint8)
+    for x, y, vx in ((40, 60, 3), (200, 140, -2)):
+        frame[y:y + 40, x + step * vx:x + step * vx + 48] = rng.integers(0, 255, (40, 48), dtype=np.uint8)
+    return frame
+
+
+@pytest.fixture
+def trackers():
+    """Trackers created on a batch's first frame and updated over the rest, like Tracking does"""
+    np.random.seed(1)
+    trackers = [Tracker(scene(0), (40, 60, 88, 100), 320, 240, tracker_id=1),
+                Tracker(scene(0), (200, 140, 248, 180), 320, 240, tracker_id=2)]
+    for step in range(1, 30):
+        for tracker in trackers:
+            tracker.update(scene(step))
+            tracker.futureFramePosition()
+    return trackers
+
+
+def test_future_centers_are_the_trackers_predictions(trackers):
+    tracks = TrackSet.fromTrackers(trackers)
+    assert tracks.predicted.shape == (2, 31, 2)
+
+    for row, tracker in enumerate(trackers):
+        for frame_no in range(15, 31):
+            assert tracks.predicted[row, frame_no] == pytest.approx(tracker.estimationFutureCenter[frame_no])
+        assert np.isnan(tracks.predicted[row, :15]).all()
+        assert tracks.avgSpeeds(10, 20)[row] == pytest.approx(tracker.getAvgSpeed(10, 20))
+
+
+def test_pickled_tracks_predict_the_same(trackers):
+    tracks = TrackSet.fromTrackers(trackers)
+    copy = pickle.loads(pickle.dumps(tracks))
+    np.testing.assert_array_equal(copy.predicted, tracks.predicted)
+    np.testing.assert_array_equal(copy.avgSpeeds(0, 10), tracks.avgSpeeds(0, 10))